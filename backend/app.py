@@ -2,19 +2,38 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import Config
-from database import init_db, create_admin_user, check_db_connection, get_db_stats, db
+from database import init_db, create_admin_user, check_db_connection, db
 from database import User, ParkingLot, ParkingSpot, Reservation
 from extensions import redis_client, REDIS_AVAILABLE
 from routes.auth import auth_bp
 from routes.admin import admin_bp
 from routes.user import user_bp
+from routes.health import health_bp, get_cached_readiness
 from tasks.celery_app import make_celery
+from utils.log import init_request_logging
+from utils.revocation import is_token_revoked
+from utils.metrics import init_metrics
+from utils.query_stats import init_query_stats
+from utils.profiling import init_profiling
+from utils.compression import init_compression
+from utils.json_provider import init_json
+from utils.lot_import import init_import_cli
+from utils.db_maintenance import init_db_maintenance_cli
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # orjson-backed JSON provider (stdlib fallback) for every jsonify()
+    init_json(app)
+    
+    # Structured JSON logging (queue-based, off the request thread) + request ids
+    init_request_logging(app)
+    
     # Initialize database FIRST (before other extensions)
     init_db(app)
     
@@ -25,63 +44,95 @@ def create_app(config_class=Config):
     @jwt.unauthorized_loader
     def missing_loader(err_msg):
         # No JWT present in request
-        print(f"JWT unauthorized: {err_msg}")
+        logger.info("JWT unauthorized: %s", err_msg)
         return jsonify({'message': 'Missing Authorization Header'}), 401
 
     @jwt.invalid_token_loader
     def invalid_token_loader(err_msg):
-        print(f"JWT invalid token: {err_msg}")
+        logger.info("JWT invalid token: %s", err_msg)
         return jsonify({'message': f'Invalid token: {err_msg}'}), 422
 
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
-        print(f"JWT expired for payload: {jwt_payload}")
+        logger.info("JWT expired for user %s", jwt_payload.get('sub'))
         return jsonify({'message': 'Token has expired'}), 401
 
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return is_token_revoked(jwt_payload)
+
     @jwt.revoked_token_loader
     def revoked_token_callback(jwt_header, jwt_payload):
-        print(f"JWT revoked for payload: {jwt_payload}")
+        logger.info("JWT revoked for user %s", jwt_payload.get('sub'))
         return jsonify({'message': 'Token has been revoked'}), 401
 
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=['X-Total-Count'])
+    
+    # Request latency/size metrics and the /metrics endpoint
+    init_metrics(app)
+    
+    # Per-request SQL query count/time (Server-Timing header)
+    init_query_stats(app)
+    
+    # Opt-in sampling profiler (?__profile=1 with an admin token)
+    init_profiling(app)
+    
+    # gzip/brotli response compression negotiated from Accept-Encoding
+    init_compression(app)
     
     # Initialize Celery
     try:
         celery = make_celery(app)
         app.celery = celery
     except Exception as e:
-        print(f"Warning: Celery initialization failed: {str(e)}")
+        logger.warning("Celery initialization failed: %s", e)
+    
+    # `flask import-lots FILE` bulk import command
+    init_import_cli(app)
+    init_db_maintenance_cli(app)
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(user_bp, url_prefix='/api/user')
+    app.register_blueprint(health_bp)
     
     # Root route - API information
     @app.route('/')
     def index():
-        db_status = check_db_connection()
+        # Report the last readiness result instead of querying the database
+        readiness = get_cached_readiness()
+        db_check = (readiness or {}).get('checks', {}).get('database', {})
+        db_status = {'up': 'connected', 'down': 'disconnected'}.get(db_check.get('status'), 'unknown')
         return jsonify({
             'message': 'VPMS API Server',
             'version': '1.0.0',
             'database': {
-                'status': 'connected' if db_status else 'disconnected',
+                'status': db_status,
                 'path': os.path.join(os.path.dirname(__file__), 'vpms.db')
             },
             'redis': {
                 'status': 'available' if REDIS_AVAILABLE else 'unavailable'
             },
             'endpoints': {
+                'monitoring': {
+                    'GET /health/live': 'Liveness probe (no I/O)',
+                    'GET /health/ready': 'Readiness probe (cached DB/Redis/broker checks)',
+                    'GET /metrics': 'Prometheus metrics (all workers)'
+                },
                 'authentication': {
                     'POST /api/user/register': 'Register new user',
                     'POST /api/user/login': 'User login',
-                    'POST /api/admin/login': 'Admin login'
+                    'POST /api/admin/login': 'Admin login',
+                    'POST /api/logout': 'Revoke the current token'
                 },
                 'admin': {
                     'GET /api/admin/stats': 'Dashboard statistics',
                     'GET /api/admin/parking-lots': 'List parking lots',
                     'POST /api/admin/parking-lots': 'Create parking lot',
-                    'GET /api/admin/users': 'List all users'
+                    'POST /api/admin/parking-lots/import': 'Bulk-create lots and spots from CSV',
+                    'GET /api/admin/users': 'List all users',
+                    'GET /api/admin/system/stats': 'Database and dependency statistics'
                 },
                 'user': {
                     'GET /api/user/stats': 'User dashboard statistics',
@@ -95,24 +146,12 @@ def create_app(config_class=Config):
             }
         }), 200
     
-    # Health check endpoint
-    @app.route('/health')
-    def health():
-        db_status = check_db_connection()
-        stats = get_db_stats() if db_status else {}
-        return jsonify({
-            'status': 'healthy' if db_status else 'unhealthy',
-            'database': 'connected' if db_status else 'disconnected',
-            'redis': 'available' if REDIS_AVAILABLE else 'unavailable',
-            'stats': stats
-        }), 200 if db_status else 503
-    
     # Create admin user after database is initialized
     with app.app_context():
         if check_db_connection():
             create_admin_user()
         else:
-            print("❌ Database connection failed. Admin user not created.")
+            logger.error("Database connection failed. Admin user not created.")
     
     return app
 
@@ -0,0 +1,59 @@
+"""
+Cached value size per encoding
+
+Encodes the listing payloads from json_bench.py (shaped like
+all_users_with_stats, lot_{id}_spots, user_{id}_bookings and the lot list)
+with every cache_codec combination and reports the stored size and the
+encode/decode time, next to the plain JSON text the cache used to hold.
+
+    cd backend
+    python benchmarks/cache_size.py [--rows 5000]
+"""
+import argparse
+import os
+import sys
+import timeit
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from utils import cache_codec  # noqa: E402
+from utils.json_provider import dumps_bytes  # noqa: E402
+from json_bench import build_payloads  # noqa: E402
+
+ENCODINGS = [
+    ('json', 'none'),
+    ('json', 'zlib'),
+    ('msgpack', 'none'),
+    ('msgpack', 'zlib'),
+    ('msgpack', 'lz4'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.rows)
+    print(f'rows={args.rows}  msgpack={"yes" if cache_codec.msgpack else "no"}  lz4={"yes" if cache_codec.lz4 else "no"}')
+    print(f'{"payload":<15} {"encoding":<14} {"bytes":>10} {"vs json":>8} {"encode":>10} {"decode":>10}')
+    for name, payload in payloads.items():
+        plain = len(dumps_bytes(payload))
+        print(f'{name:<15} {"legacy json":<14} {plain:>10} {1.0:>7.1f}x')
+        for codec, compression in ENCODINGS:
+            with mock.patch.object(Config, 'CACHE_CODEC', codec), \
+                    mock.patch.object(Config, 'CACHE_COMPRESSION', compression):
+                encoded = cache_codec.encode(payload)
+                assert cache_codec.decode(encoded) == cache_codec.decode(cache_codec.encode(payload))
+                encode_s = min(timeit.repeat(lambda: cache_codec.encode(payload), number=1, repeat=args.repeat))
+            decode_s = min(timeit.repeat(lambda: cache_codec.decode(encoded), number=1, repeat=args.repeat))
+            label = f'{codec}+{compression}'
+            print(f'{name:<15} {label:<14} {len(encoded):>10} {plain / len(encoded):>7.1f}x '
+                  f'{encode_s * 1000:>7.2f} ms {decode_s * 1000:>7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+JSON encode/decode benchmark for the large listing endpoints
+
+Builds payloads shaped like the biggest responses (admin users-with-stats,
+a lot's spot grid, a user's booking history, the parking lot list) from
+transient model instances, then times Flask's default provider (on rows with
+pre-formatted timestamps, as to_dict used to return them) against
+FastJSONProvider with and without orjson. Decoding is timed the way the cache
+layer does it (loads of the cached body).
+
+    cd backend
+    python benchmarks/json_bench.py [--rows 5000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from database import User, ParkingLot, ParkingSpot, Reservation  # noqa: E402
+from utils import json_provider  # noqa: E402
+
+
+def build_payloads(rows):
+    """Listing payloads of roughly `rows` items each, built from model to_dict()"""
+    now = datetime(2024, 5, 17, 18, 30, 15, 123456)
+    users = []
+    for i in range(rows):
+        user = User(id=i + 1, username=f'user{i}', email=f'user{i}@example.com', role='user',
+                    created_at=now - timedelta(days=i % 400), updated_at=now)
+        users.append({**user.to_dict(), 'total_bookings': i % 37, 'active_bookings': i % 2,
+                      'total_spent': round(i * 12.75, 2)})
+
+    spots = [ParkingSpot(id=i + 1, lot_id=1, spot_number=f'A-{i + 1:04d}', status='O' if i % 3 else 'A',
+                         created_at=now).to_dict() for i in range(rows)]
+
+    bookings = []
+    for i in range(rows):
+        parked = now - timedelta(hours=i)
+        reservation = Reservation(id=i + 1, spot_id=i % 200 + 1, user_id=1, vehicle_number=f'KA01AB{i:04d}',
+                                  parking_timestamp=parked, leaving_timestamp=parked + timedelta(hours=2),
+                                  parking_cost=40.0, price_per_hour=20.0,
+                                  closeout_requested=False, created_at=parked, updated_at=parked)
+        bookings.append(reservation.to_dict())
+
+    lots = [ParkingLot(id=i + 1, prime_location_name=f'Lot {i}', address=f'{i} Main Road, Bengaluru',
+                       pin_code='560001', price=20.0 + i % 10, number_of_spots=100, max_stay_hours=None,
+                       created_at=now, updated_at=now).to_dict() for i in range(max(rows // 20, 1))]
+
+    return {
+        'admin users': users,
+        'lot spots': spots,
+        'user bookings': bookings,
+        'parking lots': lots,
+    }
+
+
+def stringify_datetimes(rows):
+    """Rows as the models used to return them, with datetimes already isoformat()ted"""
+    return [{key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+            for row in rows]
+
+
+def _time(fn, repeat):
+    """Best-of-repeat seconds per call"""
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default = DefaultJSONProvider(app)
+    fast = json_provider.FastJSONProvider(app)
+    orjson = json_provider.orjson
+    payloads = build_payloads(args.rows)
+
+    def stdlib_fallback(fn):
+        """Run fn with FastJSONProvider forced onto the standard library"""
+        def run():
+            json_provider.orjson = None
+            try:
+                return fn()
+            finally:
+                json_provider.orjson = orjson
+        return run
+
+    print(f'FastJSONProvider backend: {json_provider.backend_name()}  rows={args.rows}  best of {args.repeat}')
+    print(f'{"payload":<15} {"op":<7} {"flask default":>14} {"fast/stdlib":>12} {"fast":>10} {"speedup":>8}')
+    with app.app_context():
+        for name, payload in payloads.items():
+            legacy = stringify_datetimes(payload)
+            body = fast.dumps(payload)
+            encoded = default.dumps(legacy)
+            cases = {
+                'encode': (lambda: default.dumps(legacy),
+                           stdlib_fallback(lambda: json_provider.dumps_bytes(payload)),
+                           lambda: json_provider.dumps_bytes(payload)),
+                'decode': (lambda: json.loads(encoded),
+                           stdlib_fallback(lambda: json_provider.loads(body)),
+                           lambda: json_provider.loads(body)),
+            }
+            for op, (baseline, fallback, candidate) in cases.items():
+                base_s = _time(baseline, args.repeat)
+                fallback_s = _time(fallback, args.repeat)
+                fast_s = _time(candidate, args.repeat)
+                print(f'{name:<15} {op:<7} {base_s * 1000:>11.2f} ms {fallback_s * 1000:>9.2f} ms '
+                      f'{fast_s * 1000:>7.2f} ms {base_s / fast_s:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -9,10 +9,28 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///vpms.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read/write routing: read_only routes use a separate engine and pool.
+    # DATABASE_READ_URL points at a replica; unset, the SQLite file is opened read-only (mode=ro)
+    DB_READ_ROUTING_ENABLED = os.environ.get('DB_READ_ROUTING_ENABLED', 'true').lower() in ['true', 'on', '1']
+    DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL')
+    DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE') or 5)
+    DB_READ_MAX_OVERFLOW = int(os.environ.get('DB_READ_MAX_OVERFLOW') or 10)
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', 'true').lower() in ['true', 'on', '1']
+    
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_ALGORITHM = 'HS256'
+
+    # JWT Revocation (logout) Configuration
+    REVOCATION_BLOOM_CAPACITY = int(os.environ.get('REVOCATION_BLOOM_CAPACITY') or 100000)
+    REVOCATION_BLOOM_ERROR_RATE = float(os.environ.get('REVOCATION_BLOOM_ERROR_RATE') or 0.001)
+    REVOCATION_BLOOM_REBUILD_SECONDS = int(os.environ.get('REVOCATION_BLOOM_REBUILD_SECONDS') or 3600)
+
+    # Password Hashing Configuration
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1)  # 0 = hash inline
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)  # seconds
     
     # Redis Configuration
     REDIS_HOST = os.environ.get('REDIS_HOST') or 'localhost'
@@ -23,12 +41,97 @@ class Config:
     # Celery Configuration
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or REDIS_URL
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or REDIS_URL
+    CELERY_RESULT_EXPIRES = int(os.environ.get('CELERY_RESULT_EXPIRES') or 3600)  # seconds results are kept
+    # Unacked (acks_late) tasks are redelivered after this; must exceed the longest task
+    CELERY_VISIBILITY_TIMEOUT = int(os.environ.get('CELERY_VISIBILITY_TIMEOUT') or 4 * 3600)
     
     # Cache Configuration
     CACHE_TYPE = 'redis'
     CACHE_REDIS_URL = REDIS_URL
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
+    CACHE_CODEC = os.environ.get('CACHE_CODEC') or 'msgpack'  # 'msgpack' or 'json'
+    CACHE_COMPRESSION = os.environ.get('CACHE_COMPRESSION') or 'lz4'  # 'lz4', 'zlib' or 'none'
+    CACHE_COMPRESS_MIN_SIZE = int(os.environ.get('CACHE_COMPRESS_MIN_SIZE') or 1024)  # bytes
     
+    # Metrics Configuration
+    METRICS_PUSH_INTERVAL = int(os.environ.get('METRICS_PUSH_INTERVAL') or 10)  # seconds
+    METRICS_SNAPSHOT_TTL = int(os.environ.get('METRICS_SNAPSHOT_TTL') or 86400)  # seconds
+
+    # Request Profiling Configuration
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() in ['true', 'on', '1']
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0.0)  # fraction of requests, 0 = admin-triggered only
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS') or 5)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP') or 200)
+
+    # Slow Query Log Configuration
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS') or 100)
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'slow_queries.log'))
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES') or 10 * 1024 * 1024)
+    SLOW_QUERY_LOG_BACKUPS = int(os.environ.get('SLOW_QUERY_LOG_BACKUPS') or 5)
+
+    # Logging Configuration
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_LEVELS = os.environ.get('LOG_LEVELS') or ''  # per-module overrides, e.g. "routes=DEBUG,sqlalchemy.engine=WARNING"
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE') or 10000)
+    LOG_ERROR_RATE_LIMIT = int(os.environ.get('LOG_ERROR_RATE_LIMIT') or 20)  # identical errors per window, 0 = unlimited
+    LOG_ERROR_RATE_WINDOW = int(os.environ.get('LOG_ERROR_RATE_WINDOW') or 60)  # seconds
+
+    # Health Check Configuration
+    HEALTH_READY_INTERVAL = int(os.environ.get('HEALTH_READY_INTERVAL') or 5)  # seconds between background checks
+    HEALTH_CHECK_TIMEOUT = float(os.environ.get('HEALTH_CHECK_TIMEOUT') or 2)  # seconds per dependency
+    HEALTH_CRITICAL_CHECKS = os.environ.get('HEALTH_CRITICAL_CHECKS') or 'database'  # checks that gate readiness
+
+    # Overstay Sweeper Configuration
+    OVERSTAY_SWEEP_INTERVAL_MINUTES = int(os.environ.get('OVERSTAY_SWEEP_INTERVAL_MINUTES') or 5)
+    OVERSTAY_SWEEP_BATCH_SIZE = int(os.environ.get('OVERSTAY_SWEEP_BATCH_SIZE') or 1000)
+
+    # Booking counter reconciliation (daily at COUNTER_RECONCILE_HOUR:30 UTC)
+    COUNTER_RECONCILE_HOUR = int(os.environ.get('COUNTER_RECONCILE_HOUR') or 3)
+    COUNTER_RECONCILE_BATCH_SIZE = int(os.environ.get('COUNTER_RECONCILE_BATCH_SIZE') or 1000)
+
+    # Reservation archive (daily at ARCHIVE_HOUR:00 UTC)
+    ARCHIVE_HORIZON_DAYS = int(os.environ.get('ARCHIVE_HORIZON_DAYS') or 180)  # archive sessions completed before this
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE') or 1000)
+    ARCHIVE_MAX_BATCHES = int(os.environ.get('ARCHIVE_MAX_BATCHES') or 500)  # per run; the next run continues
+    ARCHIVE_HOUR = int(os.environ.get('ARCHIVE_HOUR') or 4)
+
+    # SQLite maintenance: ANALYZE, incremental vacuum and online backup (daily at DB_MAINTENANCE_HOUR:15 UTC)
+    DB_MAINTENANCE_HOUR = int(os.environ.get('DB_MAINTENANCE_HOUR') or 5)
+    DB_MAINTENANCE_BUSY_TIMEOUT = float(os.environ.get('DB_MAINTENANCE_BUSY_TIMEOUT') or 30)  # seconds
+    DB_ANALYZE_LIMIT = int(os.environ.get('DB_ANALYZE_LIMIT') or 1000)  # rows sampled per index, 0 = all
+    DB_VACUUM_BATCH_PAGES = int(os.environ.get('DB_VACUUM_BATCH_PAGES') or 256)
+    DB_VACUUM_MAX_PAGES = int(os.environ.get('DB_VACUUM_MAX_PAGES') or 25600)  # per run
+    DB_VACUUM_CONVERT = os.environ.get('DB_VACUUM_CONVERT', 'false').lower() in ['true', 'on', '1']  # one full VACUUM
+    DB_BACKUP_ENABLED = os.environ.get('DB_BACKUP_ENABLED', 'true').lower() in ['true', 'on', '1']
+    DB_BACKUP_DIR = os.environ.get('DB_BACKUP_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
+    DB_BACKUP_PAGES_PER_STEP = int(os.environ.get('DB_BACKUP_PAGES_PER_STEP') or 256)
+    DB_BACKUP_STEP_PAUSE = float(os.environ.get('DB_BACKUP_STEP_PAUSE') or 0.05)  # seconds between steps
+    DB_BACKUP_KEEP = int(os.environ.get('DB_BACKUP_KEEP') or 7)
+
+    # Bulk CSV import of parking lots (POST /api/admin/parking-lots/import, flask import-lots)
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE') or 500)  # lots per transaction
+    IMPORT_MAX_SPOTS_PER_LOT = int(os.environ.get('IMPORT_MAX_SPOTS_PER_LOT') or 10000)
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS') or 1000)  # row errors kept in the summary
+    IMPORT_INLINE_MAX_BYTES = int(os.environ.get('IMPORT_INLINE_MAX_BYTES') or 256 * 1024)  # larger files run in Celery
+    IMPORT_UPLOAD_DIR = os.environ.get('IMPORT_UPLOAD_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imports')
+
+    # Booking event outbox (relayed to a Redis Stream, consumed by consumer groups)
+    OUTBOX_STREAM = os.environ.get('OUTBOX_STREAM') or 'booking_events'
+    OUTBOX_STREAM_MAXLEN = int(os.environ.get('OUTBOX_STREAM_MAXLEN') or 100000)  # approximate trim
+    OUTBOX_RELAY_INTERVAL = float(os.environ.get('OUTBOX_RELAY_INTERVAL') or 2)  # seconds between relay/consume runs
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE') or 500)
+    OUTBOX_MAX_BATCHES = int(os.environ.get('OUTBOX_MAX_BATCHES') or 20)  # per consumer run
+    OUTBOX_CLAIM_IDLE_SECONDS = int(os.environ.get('OUTBOX_CLAIM_IDLE_SECONDS') or 60)  # reclaim unacked entries after
+    OUTBOX_RETENTION_HOURS = int(os.environ.get('OUTBOX_RETENTION_HOURS') or 24)  # keep published rows
+
+    # Response compression (gzip, or brotli when the Brotli package is installed)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() in ['true', 'on', '1']
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE') or 1024)  # bytes
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL') or 6)
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY') or 5)
+    COMPRESSION_VARIANT_TTL = int(os.environ.get('COMPRESSION_VARIANT_TTL') or 600)  # seconds
+
     # Email Configuration (for monthly reports)
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
@@ -39,9 +142,27 @@ class Config:
     # Google Chat Webhook (for daily reminders)
     GOOGLE_CHAT_WEBHOOK_URL = os.environ.get('GOOGLE_CHAT_WEBHOOK_URL') or ''
 
+    # Webhook delivery: concurrency, per-attempt timeout and retry/backoff on 429/5xx
+    WEBHOOK_MAX_WORKERS = int(os.environ.get('WEBHOOK_MAX_WORKERS') or 8)
+    WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT') or 5)  # seconds
+    WEBHOOK_MAX_RETRIES = int(os.environ.get('WEBHOOK_MAX_RETRIES') or 3)
+    WEBHOOK_BACKOFF_BASE = float(os.environ.get('WEBHOOK_BACKOFF_BASE') or 0.5)  # seconds
+    WEBHOOK_BACKOFF_MAX = float(os.environ.get('WEBHOOK_BACKOFF_MAX') or 30)  # seconds, also caps Retry-After
+    # Digest mode: merge up to this many messages per post (0/1 = one post per message)
+    WEBHOOK_DIGEST_SIZE = int(os.environ.get('WEBHOOK_DIGEST_SIZE') or 0)
+    WEBHOOK_DIGEST_MAX_CHARS = int(os.environ.get('WEBHOOK_DIGEST_MAX_CHARS') or 4000)
+
     # Daily Reminder Time Configuration (students can choose)
     REMINDER_HOUR = int(os.environ.get('REMINDER_HOUR') or 18)  # Default: 6 PM
     REMINDER_MINUTE = int(os.environ.get('REMINDER_MINUTE') or 0)  # Default: 0 minutes
 
+    # Reminder/report fan-out: users per chunk subtask and how long Redis checkpoints live
+    FANOUT_CHUNK_SIZE = int(os.environ.get('FANOUT_CHUNK_SIZE') or 500)
+    FANOUT_MARKER_TTL = int(os.environ.get('FANOUT_MARKER_TTL') or 40 * 24 * 3600)  # seconds
+
+    # Scheduled job locks: expiry (seconds) of the Redis lock, after which a
+    # 'running' run-ledger entry is also considered abandoned
+    TASK_LOCK_TTL = int(os.environ.get('TASK_LOCK_TTL') or 600)
+
 
 
@@ -2,18 +2,56 @@
 Database Configuration and Models for VPMS
 SQLite Database with Flask-SQLAlchemy
 """
+import logging
 import os
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+from utils.hashing import hash_password, verify_password, needs_rehash
+
+logger = logging.getLogger(__name__)
+
+# Bind key of the read-only engine used by read_only routes and tasks
+READ_BIND_KEY = 'read'
+
+
+class RoutingSession(Session):
+    """
+    Session that sends statements issued while g.db_read_only is set (see
+    utils.decorators.read_only) to the read-only engine. Flushes and
+    INSERT/UPDATE/DELETE statements always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not getattr(clause, 'is_dml', False)
+                and has_app_context() and g.get('db_read_only')):
+            engine = self._db.engines.get(READ_BIND_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 
 # Initialize SQLAlchemy
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Database Configuration
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'vpms.db')
 DATABASE_URI = f'sqlite:///{DATABASE_PATH}'
 
+
+def read_database_uri():
+    """
+    URL of the read-only engine: DATABASE_READ_URL (e.g. a replica), else the
+    primary SQLite file opened with mode=ro; None when routing is disabled
+    """
+    if not Config.DB_READ_ROUTING_ENABLED:
+        return None
+    if Config.DATABASE_READ_URL:
+        return Config.DATABASE_READ_URL
+    return f'sqlite:///file:{DATABASE_PATH}?mode=ro&uri=true'
+
 def init_db(app):
     """
     Initialize database with Flask app
@@ -22,17 +60,75 @@ def init_db(app):
     app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SQLALCHEMY_ECHO'] = False  # Set to True for SQL query logging
+    read_uri = read_database_uri()
+    if read_uri:
+        app.config['SQLALCHEMY_BINDS'] = {
+            READ_BIND_KEY: {
+                'url': read_uri,
+                'pool_size': Config.DB_READ_POOL_SIZE,
+                'max_overflow': Config.DB_READ_MAX_OVERFLOW,
+                'pool_pre_ping': True
+            }
+        }
     
     db.init_app(app)
     
     with app.app_context():
+        # Lets the maintenance task reclaim free pages in batches (only takes
+        # effect on a new file; utils.db_maintenance converts existing ones)
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+        
+        # WAL lets readers (including the read-only pool) run alongside the writer
+        if db.engine.dialect.name == 'sqlite' and Config.SQLITE_WAL:
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+        
         # Create all tables
         db.create_all()
-        print(f"✅ Database initialized: {DATABASE_PATH}")
-        print(f"✅ All tables created successfully")
+        added_columns = apply_schema_updates()
+        if 'users.total_bookings' in added_columns:
+            # Counter columns start at zero on existing rows; fill them from reservations
+            from utils.user_counters import reconcile_user_counters
+            reconcile_user_counters()
+        logger.info("Database initialized: %s", DATABASE_PATH)
     
     return db
 
+def apply_schema_updates():
+    """
+    Add columns and indexes introduced after a table was first created
+    (create_all() only creates missing tables; there is no migration tool).
+    Returns the added columns as 'table.column' names.
+    """
+    engine = db.engine
+    inspector = db.inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}'
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += f" DEFAULT {default.text if hasattr(default, 'text') else repr(str(default))}"
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+                conn.execute(db.text(ddl))
+                added.append(f'{table.name}.{column.name}')
+                logger.info("Added column %s.%s", table.name, column.name)
+            existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    logger.info("Created index %s", index.name)
+    return added
+
 def reset_db(app):
     """
     Reset database - DROP ALL TABLES and recreate
@@ -41,12 +137,28 @@ def reset_db(app):
     with app.app_context():
         db.drop_all()
         db.create_all()
-        print("✅ Database reset complete")
+        logger.info("Database reset complete")
 
 # ============================================================================
 # DATABASE MODELS
 # ============================================================================
 
+def compute_parking_cost(parking_timestamp, leaving_timestamp, price):
+    """
+    Parking cost rule shared by Reservation.calculate_cost and batch close-outs:
+    duration rounded up to the next whole hour (minimum 1 hour) times price
+    """
+    if not price:
+        return 0.0
+    
+    # Calculate duration in hours
+    duration = (leaving_timestamp - parking_timestamp).total_seconds() / 3600
+    
+    # Round up to nearest hour (minimum 1 hour)
+    hours = max(1, int(duration) + (1 if duration % 1 > 0 else 0))
+    
+    return round(hours * price, 2)
+
 class User(db.Model):
     """
     User Model - Stores admin and regular users
@@ -64,6 +176,13 @@ class User(db.Model):
     # Role: 'admin' or 'user'
     role = db.Column(db.String(20), default='user', nullable=False, index=True)
     
+    # Booking counters, kept in step by utils/user_counters.py
+    total_bookings = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))
+    active_booking_id = db.Column(db.Integer, nullable=True)  # open reservation, if any
+    total_spent = db.Column(db.Float, nullable=False, default=0.0, server_default=db.text('0'))
+    month_bookings = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))
+    month_key = db.Column(db.String(7), nullable=True)  # 'YYYY-MM' month_bookings counts
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -73,11 +192,15 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Verify password"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True if the stored hash uses outdated algorithm or cost parameters"""
+        return needs_rehash(self.password_hash)
     
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
@@ -86,8 +209,8 @@ class User(db.Model):
             'username': self.username,
             'email': self.email,
             'role': self.role,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def __repr__(self):
@@ -114,6 +237,9 @@ class ParkingLot(db.Model):
     # Capacity
     number_of_spots = db.Column(db.Integer, nullable=False, default=0)
     
+    # Maximum stay before the overstay sweeper closes a session (None = unlimited)
+    max_stay_hours = db.Column(db.Float, nullable=True)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -121,10 +247,14 @@ class ParkingLot(db.Model):
     # Relationships
     spots = db.relationship('ParkingSpot', backref='parking_lot', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        """Convert to dictionary with available spots count"""
-        available_spots = len([s for s in self.spots if s.status == 'A'])
-        occupied_spots = len([s for s in self.spots if s.status == 'O'])
+    def to_dict(self, available_spots=None, occupied_spots=None):
+        """
+        Convert to dictionary with available spots count; pass counts that
+        were already aggregated to avoid loading every spot
+        """
+        if available_spots is None or occupied_spots is None:
+            available_spots = len([s for s in self.spots if s.status == 'A'])
+            occupied_spots = len([s for s in self.spots if s.status == 'O'])
         
         return {
             'id': self.id,
@@ -135,8 +265,9 @@ class ParkingLot(db.Model):
             'number_of_spots': self.number_of_spots,
             'available_spots': available_spots,
             'occupied_spots': occupied_spots,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'max_stay_hours': self.max_stay_hours,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def __repr__(self):
@@ -175,7 +306,7 @@ class ParkingSpot(db.Model):
             'status': self.status,
             'spot_number': self.spot_number,
             'status_text': 'Available' if self.status == 'A' else 'Occupied',
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
     
     def __repr__(self):
@@ -207,10 +338,20 @@ class Reservation(db.Model):
     remarks = db.Column(db.Text, nullable=True)
     vehicle_number = db.Column(db.String(20), nullable=True)  # Vehicle registration number
     
+    # Set by an admin to have the overstay sweeper close this session
+    closeout_requested = db.Column(db.Boolean, nullable=False, default=False, server_default=db.text('0'))
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Partial index over active sessions only (booking checks, overstay sweeps)
+        db.Index('ix_reservations_active', 'parking_timestamp',
+                 sqlite_where=db.text('leaving_timestamp IS NULL'),
+                 postgresql_where=db.text('leaving_timestamp IS NULL')),
+    )
+    
     def calculate_cost(self, price_per_hour=None):
         """
         Calculate parking cost based on time
@@ -220,16 +361,7 @@ class Reservation(db.Model):
             return 0.0
         
         price = price_per_hour or self.price_per_hour or 0.0
-        if price == 0.0:
-            return 0.0
-        
-        # Calculate duration in hours
-        duration = (self.leaving_timestamp - self.parking_timestamp).total_seconds() / 3600
-        
-        # Round up to nearest hour (minimum 1 hour)
-        hours = max(1, int(duration) + (1 if duration % 1 > 0 else 0))
-        
-        return round(hours * price, 2)
+        return compute_parking_cost(self.parking_timestamp, self.leaving_timestamp, price)
     
     def get_duration_hours(self):
         """Get parking duration in hours"""
@@ -246,22 +378,157 @@ class Reservation(db.Model):
             'id': self.id,
             'spot_id': self.spot_id,
             'user_id': self.user_id,
-            'parking_timestamp': self.parking_timestamp.isoformat() if self.parking_timestamp else None,
-            'leaving_timestamp': self.leaving_timestamp.isoformat() if self.leaving_timestamp else None,
+            'parking_timestamp': self.parking_timestamp,
+            'leaving_timestamp': self.leaving_timestamp,
             'parking_cost': self.parking_cost,
             'price_per_hour': self.price_per_hour,
             'remarks': self.remarks,
             'vehicle_number': self.vehicle_number,
             'duration_hours': self.get_duration_hours(),
             'status': 'active' if not self.leaving_timestamp else 'completed',
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'closeout_requested': bool(self.closeout_requested),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def __repr__(self):
         return f'<Reservation {self.id} - User {self.user_id} - Spot {self.spot_id}>'
 
 
+class ReservationArchive(db.Model):
+    """
+    ReservationArchive Model - Completed reservations moved out of
+    reservations by the archiver (utils.archive); ids are kept, and there are
+    no foreign keys so history outlives deleted spots
+    """
+    __tablename__ = 'reservations_archive'
+    
+    # Primary Key (the id the reservation had in reservations)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    
+    spot_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    
+    # Timestamps
+    parking_timestamp = db.Column(db.DateTime, nullable=False, index=True)
+    leaving_timestamp = db.Column(db.DateTime, nullable=False)
+    
+    # Cost Information
+    parking_cost = db.Column(db.Float, default=0.0, nullable=False)
+    price_per_hour = db.Column(db.Float, nullable=True)
+    
+    # Additional Information
+    remarks = db.Column(db.Text, nullable=True)
+    vehicle_number = db.Column(db.String(20), nullable=True)
+    closeout_requested = db.Column(db.Boolean, nullable=False, default=False, server_default=db.text('0'))
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        # Per-user history, newest first (bookings, exports, monthly reports)
+        db.Index('ix_reservations_archive_user_parked', 'user_id', 'parking_timestamp'),
+    )
+    
+    get_duration_hours = Reservation.get_duration_hours
+    to_dict = Reservation.to_dict
+    
+    def __repr__(self):
+        return f'<ReservationArchive {self.id} - User {self.user_id} - Spot {self.spot_id}>'
+
+
+class TaskRun(db.Model):
+    """
+    TaskRun Model - Ledger of scheduled job runs, one row per (task, period)
+    """
+    __tablename__ = 'task_runs'
+    
+    # Primary Key
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    
+    # Run identity, e.g. ('tasks.send_monthly_reports', '2024-05')
+    task_name = db.Column(db.String(100), nullable=False)
+    period = db.Column(db.String(20), nullable=False)
+    
+    # Status: 'running', 'dispatched', 'completed' or 'failed'
+    status = db.Column(db.String(20), nullable=False, default='running')
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    result = db.Column(db.Text, nullable=True)  # JSON summary or error message
+    
+    # Timestamps
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('task_name', 'period', name='uq_task_runs_task_period'),
+    )
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'task_name': self.task_name,
+            'period': self.period,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': self.result,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+    
+    def __repr__(self):
+        return f'<TaskRun {self.task_name} {self.period} - {self.status}>'
+
+
+class BookingEvent(db.Model):
+    """
+    BookingEvent Model - Transactional outbox of reservation changes, written
+    in the same transaction as the change and relayed to a Redis Stream
+    """
+    __tablename__ = 'booking_events'
+    
+    # Primary Key (also the relay order)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    
+    # Event type: 'booked', 'released' or 'closed' (by the overstay sweeper)
+    event_type = db.Column(db.String(20), nullable=False)
+    reservation_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    lot_id = db.Column(db.Integer, nullable=True)
+    spot_id = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.Text, nullable=True)  # JSON details, e.g. the cost
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    published_at = db.Column(db.DateTime, nullable=True)  # set by the relay
+    
+    __table_args__ = (
+        # The relay only ever scans unpublished events
+        db.Index('ix_booking_events_unpublished', 'id',
+                 sqlite_where=db.text('published_at IS NULL'),
+                 postgresql_where=db.text('published_at IS NULL')),
+    )
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'reservation_id': self.reservation_id,
+            'user_id': self.user_id,
+            'lot_id': self.lot_id,
+            'spot_id': self.spot_id,
+            'payload': self.payload,
+            'created_at': self.created_at,
+            'published_at': self.published_at
+        }
+    
+    def __repr__(self):
+        return f'<BookingEvent {self.id} {self.event_type} - Reservation {self.reservation_id}>'
+
+
 # ============================================================================
 # DATABASE UTILITIES
 # ============================================================================
@@ -282,14 +549,10 @@ def create_admin_user():
         db.session.add(admin)
         db.session.commit()
         
-        print("=" * 60)
-        print("✅ Admin user created successfully!")
-        print(f"   Username: admin")
-        print(f"   Password: admin123")
-        print("=" * 60)
+        logger.info("Default admin user created (username: admin)")
         return admin
     else:
-        print("ℹ️  Admin user already exists")
+        logger.debug("Admin user already exists")
         return admin
 
 def get_db_stats():
@@ -301,6 +564,7 @@ def get_db_stats():
         'parking_lots': ParkingLot.query.count(),
         'parking_spots': ParkingSpot.query.count(),
         'reservations': Reservation.query.count(),
+        'archived_reservations': ReservationArchive.query.count(),
         'available_spots': ParkingSpot.query.filter_by(status='A').count(),
         'occupied_spots': ParkingSpot.query.filter_by(status='O').count(),
         'active_reservations': Reservation.query.filter_by(leaving_timestamp=None).count()
@@ -315,18 +579,23 @@ def check_db_connection():
         db.session.execute(db.text('SELECT 1'))
         return True
     except Exception as e:
-        print(f"❌ Database connection error: {str(e)}")
+        logger.error("Database connection error: %s", e)
         return False
 
 # Export all models
 __all__ = [
     'db',
     'init_db',
+    'apply_schema_updates',
+    'compute_parking_cost',
     'reset_db',
     'User',
     'ParkingLot',
     'ParkingSpot',
     'Reservation',
+    'ReservationArchive',
+    'TaskRun',
+    'BookingEvent',
     'create_admin_user',
     'get_db_stats',
     'check_db_connection',
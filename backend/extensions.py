@@ -1,12 +1,16 @@
+import logging
 import redis
 
 # Redis client with error handling
 try:
     redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True, socket_connect_timeout=2)
     redis_client.ping()  # Test connection
+    # Same server, raw bytes (compressed response variants, binary cache values)
+    redis_binary_client = redis.Redis(host='localhost', port=6379, db=0, socket_connect_timeout=2)
     REDIS_AVAILABLE = True
 except (redis.ConnectionError, redis.TimeoutError, Exception):
     REDIS_AVAILABLE = False
     redis_client = None
-    print("Warning: Redis is not available. Caching will be disabled.")
+    redis_binary_client = None
+    logging.getLogger(__name__).warning("Redis is not available. Caching will be disabled.")
 
@@ -1,17 +1,29 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from database import User, ParkingLot, ParkingSpot, Reservation, db
+from database import User, ParkingLot, ParkingSpot, Reservation, TaskRun, db, get_db_stats
 from extensions import redis_client, REDIS_AVAILABLE
 from datetime import datetime, timedelta
-from utils.decorators import admin_required
+from utils.decorators import admin_required, read_only
 from utils.cache import cache_response, get_cached, set_cached
-import traceback
+from utils.archive import history_subquery
+from utils.lot_import import ImportAborted, import_lots, parse_max_stay_hours, text_stream
+from utils.hashing import get_hash_metrics
+from utils.profiling import list_profiles, profile_file
+from utils.slow_queries import get_slow_query_report, reset_slow_query_stats
+from tasks.instrumentation import get_task_stats
+from routes.health import get_readiness
+from config import Config
+import logging
+import os
+import uuid
 
 admin_bp = Blueprint('admin', __name__)
+logger = logging.getLogger(__name__)
 
 @admin_bp.route('/stats', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only
 def get_stats():
     """Get admin dashboard statistics"""
     try:
@@ -43,36 +55,124 @@ def get_stats():
         
         return jsonify(stats), 200
     except Exception as e:
-        print(f"Error in get_stats: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in get_stats")
         return jsonify({'message': f'Error fetching stats: {str(e)}'}), 500
 
+@admin_bp.route('/hash-metrics', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_password_hash_metrics():
+    """Get password hashing latency metrics for this worker"""
+    return jsonify(get_hash_metrics()), 200
+
+@admin_bp.route('/profiles', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_profiles():
+    """List recent request profiles (newest first)"""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(list_profiles(limit)), 200
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def download_profile(profile_id):
+    """Download a profile in collapsed-stack format (speedscope / flamegraph.pl)"""
+    path = profile_file(profile_id)
+    if not path:
+        return jsonify({'message': 'Profile not found'}), 404
+    return send_file(path, mimetype='text/plain', as_attachment=True,
+                     download_name=f'{profile_id}.collapsed')
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_slow_queries():
+    """Slow statements grouped by fingerprint with p50/p99 and captured plans"""
+    order_by = request.args.get('order_by', 'p99_ms')
+    if order_by not in ('p99_ms', 'p50_ms', 'max_ms', 'total_ms', 'count', 'slow_count'):
+        return jsonify({'message': 'Invalid order_by'}), 400
+    limit = request.args.get('limit', 50, type=int)
+    slow_only = request.args.get('all', 'false').lower() not in ['true', '1']
+    return jsonify(get_slow_query_report(order_by, limit, slow_only)), 200
+
+@admin_bp.route('/slow-queries', methods=['DELETE'])
+@jwt_required()
+@admin_required
+def clear_slow_queries():
+    """Reset the slow-query statistics of this worker"""
+    reset_slow_query_stats()
+    return jsonify({'message': 'Slow query statistics cleared'}), 200
+
+@admin_bp.route('/tasks/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_celery_task_stats():
+    """Per-task queue wait, run time, retries and result size across workers"""
+    try:
+        return jsonify(get_task_stats()), 200
+    except Exception as e:
+        return jsonify({'message': f'Error fetching task stats: {str(e)}'}), 500
+
+@admin_bp.route('/tasks/runs', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only
+def get_task_runs():
+    """Recent scheduled job runs from the run ledger"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        runs = TaskRun.query.order_by(TaskRun.started_at.desc()).limit(limit).all()
+        return jsonify([run.to_dict() for run in runs]), 200
+    except Exception as e:
+        return jsonify({'message': f'Error fetching task runs: {str(e)}'}), 500
+
+@admin_bp.route('/system/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only
+def get_system_stats():
+    """Detailed database counts plus the latest dependency checks"""
+    try:
+        return jsonify({
+            'database': get_db_stats(),
+            'readiness': get_readiness(current_app._get_current_object())
+        }), 200
+    except Exception as e:
+        logger.exception("Error in get_system_stats")
+        return jsonify({'message': f'Error fetching system stats: {str(e)}'}), 500
+
 @admin_bp.route('/recent-activity', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only
 def get_recent_activity():
     """Get recent parking activity"""
     try:
         limit = request.args.get('limit', 10, type=int)
         
-        reservations = Reservation.query.order_by(
+        rows = db.session.query(
+            Reservation, User.username, ParkingLot.prime_location_name
+        ).outerjoin(
+            User, User.id == Reservation.user_id
+        ).outerjoin(
+            ParkingSpot, ParkingSpot.id == Reservation.spot_id
+        ).outerjoin(
+            ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+        ).order_by(
             Reservation.parking_timestamp.desc()
         ).limit(limit).all()
         
         activity = []
-        for res in reservations:
-            spot = ParkingSpot.query.get(res.spot_id)
-            lot = ParkingLot.query.get(spot.lot_id) if spot else None
-            user = User.query.get(res.user_id)
-            
+        for res, username, lot_name in rows:
             activity.append({
                 'id': res.id,
-                'username': user.username if user else 'Unknown',
-                'lot_name': lot.prime_location_name if lot else 'Unknown',
+                'username': username or 'Unknown',
+                'lot_name': lot_name or 'Unknown',
                 'spot_id': res.spot_id,
                 'status': 'O' if not res.leaving_timestamp else 'A',
-                'parking_timestamp': res.parking_timestamp.isoformat() if res.parking_timestamp else None,
-                'leaving_timestamp': res.leaving_timestamp.isoformat() if res.leaving_timestamp else None,
+                'parking_timestamp': res.parking_timestamp,
+                'leaving_timestamp': res.leaving_timestamp,
                 'cost': res.parking_cost
             })
         
@@ -83,6 +183,7 @@ def get_recent_activity():
 @admin_bp.route('/parking-lots', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only
 def get_parking_lots():
     """Get all parking lots"""
     try:
@@ -123,13 +224,19 @@ def create_parking_lot():
         except ValueError:
             return jsonify({'message': 'Invalid numeric value for price or number_of_spots'}), 400
 
+        try:
+            max_stay_hours = parse_max_stay_hours(data.get('max_stay_hours'))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'max_stay_hours must be a positive number or null'}), 400
+
         # Create parking lot
         lot = ParkingLot(
             prime_location_name=data['prime_location_name'],
             address=data['address'],
             pin_code=data['pin_code'],
             price=price,
-            number_of_spots=number_of_spots
+            number_of_spots=number_of_spots,
+            max_stay_hours=max_stay_hours
         )
 
         # Set updated timestamp
@@ -157,16 +264,74 @@ def create_parking_lot():
         except Exception:
             pass
 
-        print(f"✅ Created parking lot '{lot.prime_location_name}' with {lot.number_of_spots} spots")
+        logger.info("Created parking lot %r with %d spots", lot.prime_location_name, lot.number_of_spots)
         return jsonify(lot.to_dict()), 201
 
     except Exception as e:
-        print(f"❌ Error in create_parking_lot: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in create_parking_lot")
         db.session.rollback()
         return jsonify({'message': f'Error creating parking lot: {str(e)}'}), 500
 
 
+@admin_bp.route('/parking-lots/import', methods=['POST'])
+@jwt_required()
+@admin_required
+def import_parking_lots():
+    """
+    Bulk-create lots and spots from an uploaded CSV (multipart field 'file').
+    Files up to IMPORT_INLINE_MAX_BYTES are imported in the request (200 with
+    the summary); larger ones, or ?async=1, run as a Celery job (202 with a
+    task_id for GET /parking-lots/import/<task_id>).
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'message': 'file is required'}), 400
+
+        run_async = request.args.get('async', '').lower() in ['1', 'true']
+        if not run_async and (request.content_length or 0) <= Config.IMPORT_INLINE_MAX_BYTES:
+            summary = import_lots(text_stream(upload.stream))
+            return jsonify(summary), 200
+
+        from tasks.import_tasks import import_parking_lots_task
+        os.makedirs(Config.IMPORT_UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(Config.IMPORT_UPLOAD_DIR, f'{uuid.uuid4().hex}.csv')
+        upload.save(path)
+        task = import_parking_lots_task.delay(path)
+        return jsonify({'message': 'Import started', 'task_id': task.id, 'status': 'processing'}), 202
+    except ImportAborted as e:
+        # Chunks before the error stay committed; report them with the error
+        if not e.bad_input:
+            logger.exception("Error in import_parking_lots")
+        return jsonify({'message': f'Import stopped: {str(e)}', **e.summary}), 400 if e.bad_input else 500
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error in import_parking_lots")
+        db.session.rollback()
+        return jsonify({'message': f'Error importing parking lots: {str(e)}'}), 500
+
+
+@admin_bp.route('/parking-lots/import/<task_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_import_status(task_id):
+    """State of a background import; rows/lots so far while it runs, the summary when done"""
+    try:
+        from celery.result import AsyncResult
+        from tasks.celery_app import celery_app
+        task = AsyncResult(task_id, app=celery_app)
+        if task.state == 'PROGRESS':
+            return jsonify({'status': 'processing', **(task.info or {})}), 200
+        if task.state == 'SUCCESS':
+            return jsonify(task.result), 200
+        if task.state == 'FAILURE':
+            return jsonify({'status': 'failed', 'error': str(task.info)}), 200
+        return jsonify({'status': task.state.lower()}), 200
+    except Exception as e:
+        return jsonify({'message': f'Error checking import status: {str(e)}'}), 500
+
+
 @admin_bp.route('/parking-lots/<int:lot_id>', methods=['PUT'])
 @jwt_required()
 @admin_required
@@ -186,6 +351,13 @@ def update_parking_lot(lot_id):
         if 'pin_code' in data:
             lot.pin_code = data['pin_code']
 
+        # Maximum stay enforced by the overstay sweeper (null disables it)
+        if 'max_stay_hours' in data:
+            try:
+                lot.max_stay_hours = parse_max_stay_hours(data['max_stay_hours'])
+            except (TypeError, ValueError):
+                return jsonify({"message": "max_stay_hours must be a positive number or null"}), 400
+
         # Validate & update price
         if 'price' in data:
             try:
@@ -246,7 +418,7 @@ def update_parking_lot(lot_id):
 
     except Exception as e:
         db.session.rollback()
-        print("❌ Error updating parking lot:", str(e))
+        logger.exception("Error updating parking lot %s", lot_id)
         return jsonify({'message': f'Error updating parking lot: {str(e)}'}), 500
 
 @admin_bp.route('/parking-lots/<int:lot_id>', methods=['DELETE'])
@@ -284,6 +456,7 @@ def delete_parking_lot(lot_id):
 @admin_bp.route('/parking-lots/<int:lot_id>/spots', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only
 def get_parking_spots(lot_id):
     """Get all spots for a parking lot"""
     try:
@@ -303,44 +476,181 @@ def get_parking_spots(lot_id):
     except Exception as e:
         return jsonify({'message': f'Error fetching spots: {str(e)}'}), 500
 
-@admin_bp.route('/users', methods=['GET'])
+@admin_bp.route('/reservations/<int:reservation_id>/close', methods=['POST'])
 @jwt_required()
 @admin_required
-def get_users():
-    """Get all users"""
+def request_reservation_closeout(reservation_id):
+    """Flag an active reservation for close-out by the next overstay sweep"""
     try:
-        # Try to get from cache
-        cache_key = 'all_users_with_stats'
-        cached = get_cached(cache_key)
-        if cached:
-            return jsonify(cached), 200
+        reservation = Reservation.query.get_or_404(reservation_id)
+        if reservation.leaving_timestamp is not None:
+            return jsonify({'message': 'Reservation is already closed'}), 400
 
-        users = User.query.filter_by(role='user').all()
-
-        user_list = []
-        for user in users:
-            total_bookings = Reservation.query.filter_by(user_id=user.id).count()
-            active_bookings = Reservation.query.filter_by(
-                user_id=user.id,
-                leaving_timestamp=None
-            ).count()
-
-            total_spent = db.session.query(
-                db.func.sum(Reservation.parking_cost)
-            ).filter_by(user_id=user.id).scalar() or 0
-
-            user_data = user.to_dict()
-            user_data.update({
-                'total_bookings': total_bookings,
-                'active_bookings': active_bookings,
-                'total_spent': round(total_spent, 2)
-            })
-            user_list.append(user_data)
+        reservation.closeout_requested = True
+        db.session.commit()
 
-        # Cache for 5 minutes (user list changes rarely)
-        set_cached(cache_key, user_list, timeout=300)
+        return jsonify({
+            'message': 'Reservation flagged for close-out',
+            'reservation': reservation.to_dict()
+        }), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error flagging reservation: {str(e)}'}), 500
+
+@admin_bp.route('/overstays/sweep', methods=['POST'])
+@jwt_required()
+@admin_required
+def trigger_overstay_sweep():
+    """Run the overstay sweeper now instead of waiting for the next beat"""
+    try:
+        from tasks.sweeper_tasks import sweep_overstays
+        task = sweep_overstays.delay()
+        return jsonify({'message': 'Overstay sweep started', 'task_id': task.id}), 202
+    except Exception as e:
+        return jsonify({'message': f'Error starting overstay sweep: {str(e)}'}), 500
 
-        return jsonify(user_list), 200
+@admin_bp.route('/users/counters/reconcile', methods=['POST'])
+@jwt_required()
+@admin_required
+def trigger_counter_reconciliation():
+    """Check every user's booking counters against reservations now"""
+    try:
+        from tasks.maintenance_tasks import reconcile_user_counters_task
+        task = reconcile_user_counters_task.delay()
+        return jsonify({'message': 'Counter reconciliation started', 'task_id': task.id}), 202
+    except Exception as e:
+        return jsonify({'message': f'Error starting counter reconciliation: {str(e)}'}), 500
+
+@admin_bp.route('/reservations/archive', methods=['POST'])
+@jwt_required()
+@admin_required
+def trigger_reservation_archive():
+    """Archive completed reservations now; optional JSON body: horizon_days"""
+    try:
+        data = request.get_json(silent=True) or {}
+        horizon_days = data.get('horizon_days')
+        if horizon_days is not None and (type(horizon_days) is not int or horizon_days < 0):
+            return jsonify({'message': 'horizon_days must be a non-negative integer'}), 400
+        from tasks.maintenance_tasks import archive_reservations_task
+        task = archive_reservations_task.delay(horizon_days)
+        return jsonify({'message': 'Reservation archiving started', 'task_id': task.id}), 202
+    except Exception as e:
+        return jsonify({'message': f'Error starting reservation archiving: {str(e)}'}), 500
+
+@admin_bp.route('/database/maintenance', methods=['POST'])
+@jwt_required()
+@admin_required
+def trigger_database_maintenance():
+    """Run ANALYZE, incremental vacuum and a backup now; optional JSON body: backup (bool)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        backup = data.get('backup')
+        if backup is not None and not isinstance(backup, bool):
+            return jsonify({'message': 'backup must be a boolean'}), 400
+        from tasks.maintenance_tasks import database_maintenance_task
+        # A run key of its own, so a manual run does not use up the nightly one
+        run_key = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+        task = database_maintenance_task.delay(run_key, backup)
+        return jsonify({'message': 'Database maintenance started', 'task_id': task.id, 'run': run_key}), 202
+    except Exception as e:
+        return jsonify({'message': f'Error starting database maintenance: {str(e)}'}), 500
+
+USER_SORT_COLUMNS = ('id', 'username', 'email', 'created_at', 'total_bookings', 'active_bookings', 'total_spent')
+
+
+def users_with_stats_query():
+    """
+    Regular users with their booking aggregates over active and archived
+    reservations, in one LEFT JOIN ... GROUP BY
+    """
+    history = history_subquery()
+    total_bookings = db.func.count(history.c.id).label('total_bookings')
+    active_bookings = db.func.coalesce(db.func.sum(db.case(
+        (db.and_(history.c.id.isnot(None), history.c.leaving_timestamp.is_(None)), 1),
+        else_=0
+    )), 0).label('active_bookings')
+    total_spent = db.func.coalesce(db.func.sum(history.c.parking_cost), 0).label('total_spent')
+    query = (
+        db.session.query(User, total_bookings, active_bookings, total_spent)
+        .outerjoin(history, history.c.user_id == User.id)
+        .filter(User.role == 'user')
+        .group_by(User.id)
+    )
+    columns = {
+        'id': User.id,
+        'username': User.username,
+        'email': User.email,
+        'created_at': User.created_at,
+        'total_bookings': total_bookings,
+        'active_bookings': active_bookings,
+        'total_spent': total_spent
+    }
+    return query, columns
+
+
+def user_stats_row(user, total_bookings, active_bookings, total_spent):
+    user_data = user.to_dict()
+    user_data.update({
+        'total_bookings': total_bookings,
+        'active_bookings': int(active_bookings),
+        'total_spent': round(total_spent, 2)
+    })
+    return user_data
+
+
+@admin_bp.route('/users', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only
+def get_users():
+    """
+    Users with booking totals. Optional: q (username/email prefix),
+    order_by (USER_SORT_COLUMNS), order (asc/desc), page and per_page.
+    The body is the list of users; X-Total-Count has the number of matches.
+    """
+    try:
+        prefix = (request.args.get('q') or '').strip()
+        order_by = request.args.get('order_by', 'id')
+        order = request.args.get('order', 'asc').lower()
+        page = request.args.get('page', type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
+        if order_by not in USER_SORT_COLUMNS:
+            return jsonify({'message': f'Invalid order_by, expected one of: {", ".join(USER_SORT_COLUMNS)}'}), 400
+        if order not in ('asc', 'desc'):
+            return jsonify({'message': 'Invalid order, expected asc or desc'}), 400
+        if (page is not None and page < 1) or per_page < 1:
+            return jsonify({'message': 'page and per_page must be positive integers'}), 400
+
+        # Only the plain full listing is cached; filtered/sorted pages are one query anyway
+        cache_key = 'all_users_with_stats'
+        default_listing = not prefix and order_by == 'id' and order == 'asc' and page is None
+        if default_listing:
+            cached = get_cached(cache_key)
+            if cached is not None:
+                return jsonify(cached), 200, {'X-Total-Count': str(len(cached))}
+
+        query, columns = users_with_stats_query()
+        if prefix:
+            query = query.filter(db.or_(
+                User.username.startswith(prefix, autoescape=True),
+                User.email.startswith(prefix, autoescape=True)
+            ))
+        sort_column = columns[order_by]
+        query = query.order_by(sort_column.desc() if order == 'desc' else sort_column.asc(), User.id.asc())
+
+        if page is None:
+            rows = query.all()
+            total = len(rows)
+        else:
+            total = query.order_by(None).count()
+            rows = query.offset((page - 1) * per_page).limit(per_page).all()
+
+        user_list = [user_stats_row(*row) for row in rows]
+        if default_listing:
+            # Cache for 5 minutes (user list changes rarely)
+            set_cached(cache_key, user_list, timeout=300)
+
+        return jsonify(user_list), 200, {'X-Total-Count': str(total)}
     except Exception as e:
         return jsonify({'message': f'Error fetching users: {str(e)}'}), 500
 
@@ -1,9 +1,23 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt
 from database import User, db
+from utils.revocation import revoke_token
 from datetime import datetime
+import logging
 
 auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
+
+def rehash_password_if_needed(user, password):
+    """Upgrade a stored hash to the current method/cost after a successful login"""
+    if not user.password_needs_rehash():
+        return
+    try:
+        user.set_password(password)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Password rehash failed for user %s: %s", user.id, e)
 
 @auth_bp.route('/user/register', methods=['POST'])
 def register_user():
@@ -58,6 +72,8 @@ def login_user():
         if not user or not user.check_password(password):
             return jsonify({'message': 'Invalid username or password'}), 401
         
+        rehash_password_if_needed(user, password)
+        
         # Create access token - ensure 'sub' (identity) is a string to satisfy JWT libraries
         access_token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
         
@@ -85,6 +101,8 @@ def login_admin():
         if not admin or not admin.check_password(password):
             return jsonify({'message': 'Invalid admin credentials'}), 401
         
+        rehash_password_if_needed(admin, password)
+        
         # Create access token - ensure 'sub' (identity) is a string to satisfy JWT libraries
         access_token = create_access_token(identity=str(admin.id), additional_claims={'role': admin.role})
         
@@ -97,3 +115,13 @@ def login_admin():
         return jsonify({'message': f'Login failed: {str(e)}'}), 500
 
 
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Revoke the current access token"""
+    try:
+        revoke_token(get_jwt())
+        return jsonify({'message': 'Logged out successfully'}), 200
+    except Exception as e:
+        return jsonify({'message': f'Logout failed: {str(e)}'}), 500
@@ -0,0 +1,146 @@
+"""
+Liveness and readiness probes
+
+/health/live answers without any I/O. /health/ready reports the result of the
+last dependency check (DB SELECT 1, Redis ping, Celery broker connection),
+which a background thread refreshes every HEALTH_READY_INTERVAL seconds, so
+probe traffic from load balancers never reaches the database directly.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from flask import Blueprint, jsonify, current_app
+import redis
+from kombu import Connection
+from config import Config
+from database import db
+
+health_bp = Blueprint('health', __name__)
+logger = logging.getLogger(__name__)
+
+_state = {'result': None, 'checked_at': 0.0}
+_state_lock = threading.Lock()
+_refresher_pid = None
+
+
+def _check_database():
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        return True, None
+    except Exception as e:
+        return False, str(e)
+    finally:
+        db.session.remove()
+
+
+def _check_redis():
+    try:
+        client = redis.Redis.from_url(Config.REDIS_URL, socket_connect_timeout=Config.HEALTH_CHECK_TIMEOUT,
+                                      socket_timeout=Config.HEALTH_CHECK_TIMEOUT)
+        client.ping()
+        client.close()
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+
+def _check_broker():
+    try:
+        with Connection(Config.CELERY_BROKER_URL, connect_timeout=Config.HEALTH_CHECK_TIMEOUT) as conn:
+            conn.ensure_connection(max_retries=1, interval_start=0, interval_step=0)
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+
+CHECKS = {
+    'database': _check_database,
+    'redis': _check_redis,
+    'broker': _check_broker,
+}
+
+
+def run_readiness_checks(app):
+    """Run every dependency check once and store the result"""
+    checks = {}
+    with app.app_context():
+        for name, check in CHECKS.items():
+            start = time.perf_counter()
+            ok, error = check()
+            checks[name] = {
+                'status': 'up' if ok else 'down',
+                'latency_ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+            if error:
+                checks[name]['error'] = error
+    critical = [name.strip() for name in Config.HEALTH_CRITICAL_CHECKS.split(',') if name.strip()]
+    ready = all(checks.get(name, {}).get('status') == 'up' for name in critical)
+    result = {
+        'status': 'ready' if ready else 'not_ready',
+        'checks': checks,
+        'checked_at': datetime.utcnow()
+    }
+    with _state_lock:
+        _state['result'] = result
+        _state['checked_at'] = time.monotonic()
+    return result
+
+
+def _refresh_loop(app):
+    while True:
+        time.sleep(Config.HEALTH_READY_INTERVAL)
+        try:
+            run_readiness_checks(app)
+        except Exception:
+            logger.exception("Readiness refresh failed")
+
+
+def _ensure_refresher(app):
+    """Start the background refresher once per process (fork-safe)"""
+    global _refresher_pid
+    pid = os.getpid()
+    if _refresher_pid == pid:
+        return
+    with _state_lock:
+        if _refresher_pid == pid:
+            return
+        _refresher_pid = pid
+    threading.Thread(target=_refresh_loop, args=(app,), name='readiness-refresher', daemon=True).start()
+
+
+def get_cached_readiness():
+    """Last readiness result without triggering any check (None if never run)"""
+    with _state_lock:
+        return _state['result']
+
+
+def get_readiness(app):
+    _ensure_refresher(app)
+    with _state_lock:
+        result = _state['result']
+        age = time.monotonic() - _state['checked_at']
+    # Only the very first probe (or one after the refresher stalled) runs checks inline
+    if result is None or age > Config.HEALTH_READY_INTERVAL * 3:
+        result = run_readiness_checks(app)
+    return result
+
+
+@health_bp.route('/health/live')
+def live():
+    """Liveness: the process is up and serving requests (no I/O)"""
+    return jsonify({'status': 'alive'}), 200
+
+
+@health_bp.route('/health/ready')
+def ready():
+    """Readiness: cached dependency checks"""
+    result = get_readiness(current_app._get_current_object())
+    return jsonify(result), 200 if result['status'] == 'ready' else 503
+
+
+@health_bp.route('/health')
+def health():
+    """Backwards-compatible alias of /health/ready"""
+    return ready()
@@ -1,11 +1,16 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from database import db, User, ParkingLot, ParkingSpot, Reservation
-from extensions import redis_client, REDIS_AVAILABLE
+from extensions import REDIS_AVAILABLE
 from datetime import datetime
-from utils.decorators import user_required
+from utils.decorators import user_required, read_only
 from utils.cache import get_cached, set_cached
-import traceback
+from utils.user_counters import record_booking, record_release, user_stats
+from utils.outbox import record_event
+from utils.archive import reservation_history
+import logging
+
+logger = logging.getLogger(__name__)
 
 try:
     from tasks.celery_app import celery_app
@@ -13,7 +18,7 @@ try:
     CELERY_AVAILABLE = True
 except ImportError:
     CELERY_AVAILABLE = False
-    print("Warning: Celery not available. CSV export will not work.")
+    logger.warning("Celery not available. CSV export will not work.")
 
 user_bp = Blueprint('user', __name__)
 
@@ -24,39 +29,11 @@ user_bp = Blueprint('user', __name__)
 def get_user_stats():
     try:
         user_id = int(get_jwt_identity())
-        cache_key = f'user_stats_{user_id}'
-        cached = get_cached(cache_key) if REDIS_AVAILABLE else None
-
-        if cached:
-            return jsonify(cached), 200
-
-        total_bookings = Reservation.query.filter_by(user_id=user_id).count()
-        active_bookings = Reservation.query.filter_by(
-            user_id=user_id,
-            leaving_timestamp=None
-        ).count()
-
-        total_spent = db.session.query(
-            db.func.sum(Reservation.parking_cost)
-        ).filter_by(user_id=user_id).scalar() or 0
-
-        start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_bookings = Reservation.query.filter(
-            Reservation.user_id == user_id,
-            Reservation.parking_timestamp >= start_of_month
-        ).count()
-
-        stats = {
-            'totalBookings': total_bookings,
-            'activeBookings': active_bookings,
-            'totalSpent': round(total_spent, 2),
-            'monthlyBookings': monthly_bookings
-        }
-
-        if REDIS_AVAILABLE:
-            set_cached(cache_key, stats, timeout=120)
-
-        return jsonify(stats), 200
+        # Counters are maintained by book/release, so this is one primary-key read
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'message': 'User not found'}), 404
+        return jsonify(user_stats(user)), 200
 
     except Exception as e:
         return jsonify({'message': f'Error fetching stats: {str(e)}'}), 500
@@ -69,18 +46,23 @@ def get_user_stats():
 def get_active_booking():
     try:
         user_id = int(get_jwt_identity())
-        reservation = Reservation.query.filter_by(user_id=user_id, leaving_timestamp=None).first()
+        # The reservation and its lot in one joined query
+        row = (
+            db.session.query(Reservation, ParkingLot.prime_location_name, ParkingLot.address)
+            .outerjoin(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+            .outerjoin(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+            .filter(Reservation.user_id == user_id, Reservation.leaving_timestamp.is_(None))
+            .first()
+        )
 
-        if not reservation:
+        if not row:
             return jsonify(None), 200
 
-        spot = ParkingSpot.query.get(reservation.spot_id)
-        lot = ParkingLot.query.get(spot.lot_id) if spot else None
-
+        reservation, lot_name, address = row
         booking_data = reservation.to_dict()
         booking_data.update({
-            'lot_name': lot.prime_location_name if lot else 'Unknown',
-            'address': lot.address if lot else 'Unknown'
+            'lot_name': lot_name or 'Unknown',
+            'address': address or 'Unknown'
         })
 
         return jsonify(booking_data), 200
@@ -90,9 +72,25 @@ def get_active_booking():
 
 
 # ----------------- AVAILABLE PARKING LOTS -----------------
+def lots_with_spot_counts_query():
+    """
+    Parking lots with their available and occupied spot counts, in one
+    LEFT JOIN ... GROUP BY; returns the query and both count columns
+    """
+    available_spots = db.func.coalesce(db.func.sum(db.case((ParkingSpot.status == 'A', 1), else_=0)), 0)
+    occupied_spots = db.func.coalesce(db.func.sum(db.case((ParkingSpot.status == 'O', 1), else_=0)), 0)
+    query = (
+        db.session.query(ParkingLot, available_spots.label('available_spots'), occupied_spots.label('occupied_spots'))
+        .outerjoin(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)
+        .group_by(ParkingLot.id)
+    )
+    return query, available_spots, occupied_spots
+
+
 @user_bp.route('/parking-lots/available', methods=['GET'])
 @jwt_required()
 @user_required
+@read_only
 def get_available_parking_lots():
     try:
         cache_key = 'available_lots'
@@ -101,15 +99,11 @@ def get_available_parking_lots():
         if cached:
             return jsonify(cached), 200
 
-        lots = ParkingLot.query.all()
-        available_lots = []
-
-        for lot in lots:
-            available_spots_count = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-            if available_spots_count > 0:
-                lot_dict = lot.to_dict()
-                lot_dict['available_spots'] = available_spots_count
-                available_lots.append(lot_dict)
+        query, available_spots, _ = lots_with_spot_counts_query()
+        available_lots = [
+            lot.to_dict(available, occupied)
+            for lot, available, occupied in query.having(available_spots > 0).order_by(ParkingLot.id)
+        ]
 
         if REDIS_AVAILABLE:
             set_cached(cache_key, available_lots, timeout=60)
@@ -162,16 +156,12 @@ def book_parking():
         available_spot.status = 'O'
 
         db.session.add(reservation)
+        db.session.flush()
+        record_booking(user_id, reservation.id, reservation.parking_timestamp)
+        # Cache invalidation and other side effects run off the booking event
+        record_event('booked', reservation, lot_id=lot.id)
         db.session.commit()
 
-        if redis_client:
-            redis_client.delete('available_lots')
-            redis_client.delete(f'user_stats_{user_id}')
-            redis_client.delete(f'user_{user_id}_bookings')
-            redis_client.delete('admin_stats')
-            redis_client.delete(f'lot_{lot.id}_spots')
-            redis_client.delete('all_users_with_stats')
-
         booking_data = reservation.to_dict()
         booking_data.update({
             'lot_name': lot.prime_location_name,
@@ -180,12 +170,11 @@ def book_parking():
             'spot_number': available_spot.id
         })
 
-        print(f"✅ User {user_id} booked spot {available_spot.id} in lot {lot_id}")
+        logger.info("User %s booked spot %s in lot %s", user_id, available_spot.id, lot_id)
         return jsonify(booking_data), 201
 
     except Exception as e:
-        print(f"❌ Error in book_parking: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in book_parking")
         db.session.rollback()
         return jsonify({'message': f'Error booking parking: {str(e)}'}), 500
 
@@ -194,6 +183,7 @@ def book_parking():
 @user_bp.route('/bookings', methods=['GET'])
 @jwt_required()
 @user_required
+@read_only
 def get_user_bookings():
     try:
         user_id = int(get_jwt_identity())
@@ -204,16 +194,22 @@ def get_user_bookings():
         if cached:
             return jsonify(cached), 200
 
-        reservations = Reservation.query.filter_by(user_id=user_id).order_by(Reservation.parking_timestamp.desc()).all()
+        # Single joined query over active and archived bookings
+        history = reservation_history(lambda table: [table.c.user_id == user_id])
+        rows = db.session.query(
+            history, ParkingLot.prime_location_name, ParkingLot.address
+        ).outerjoin(
+            ParkingSpot, ParkingSpot.id == history.c.spot_id
+        ).outerjoin(
+            ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+        ).order_by(history.c.parking_timestamp.desc()).all()
 
         bookings = []
-        for res in reservations:
-            spot = ParkingSpot.query.get(res.spot_id)
-            lot = ParkingLot.query.get(spot.lot_id) if spot else None
+        for res, lot_name, address in rows:
             booking_data = res.to_dict()
             booking_data.update({
-                'lot_name': lot.prime_location_name if lot else 'Unknown',
-                'address': lot.address if lot else 'Unknown'
+                'lot_name': lot_name or 'Unknown',
+                'address': address or 'Unknown'
             })
             bookings.append(booking_data)
 
@@ -250,24 +246,17 @@ def release_parking(booking_id):
         reservation.parking_cost = reservation.calculate_cost(lot.price)
 
         spot.status = 'A'
+        record_release(user_id, reservation.id, reservation.parking_cost)
+        record_event('released', reservation, lot_id=lot.id, cost=reservation.parking_cost)
         db.session.commit()
 
-        if redis_client:
-            redis_client.delete('available_lots')
-            redis_client.delete(f'user_stats_{user_id}')
-            redis_client.delete(f'user_{user_id}_bookings')
-            redis_client.delete('admin_stats')
-            redis_client.delete(f'lot_{lot.id}_spots')
-            redis_client.delete('all_users_with_stats')
-
         reservation_data = reservation.to_dict()
         reservation_data['cost'] = reservation.parking_cost
-        print(f"✅ User {user_id} released spot {spot.id}, cost: ₹{reservation.parking_cost}")
+        logger.info("User %s released spot %s, cost: %.2f", user_id, spot.id, reservation.parking_cost)
         return jsonify(reservation_data), 200
 
     except Exception as e:
-        print(f"Error in release_parking: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in release_parking")
         db.session.rollback()
         return jsonify({'message': f'Error releasing parking: {str(e)}'}), 500
 
@@ -276,6 +265,7 @@ def release_parking(booking_id):
 @user_bp.route('/export-csv', methods=['GET'])
 @jwt_required()
 @user_required
+@read_only
 def export_csv():
     try:
         import csv
@@ -283,10 +273,15 @@ def export_csv():
 
         user_id = int(get_jwt_identity())
 
-        # Get user's reservations
-        reservations = Reservation.query.filter_by(user_id=user_id).order_by(
-            Reservation.parking_timestamp.desc()
-        ).all()
+        # Get user's reservations (archived ones included) with their lot details in one query
+        history = reservation_history(lambda table: [table.c.user_id == user_id])
+        rows = db.session.query(
+            history, ParkingLot.prime_location_name, ParkingLot.address
+        ).outerjoin(
+            ParkingSpot, ParkingSpot.id == history.c.spot_id
+        ).outerjoin(
+            ParkingLot, ParkingLot.id == ParkingSpot.lot_id
+        ).order_by(history.c.parking_timestamp.desc()).all()
 
         # Create CSV in memory
         output = io.StringIO()
@@ -307,15 +302,12 @@ def export_csv():
         ])
 
         # Write data
-        for res in reservations:
-            spot = ParkingSpot.query.get(res.spot_id)
-            lot = ParkingLot.query.get(spot.lot_id) if spot else None
-
+        for res, lot_name, address in rows:
             writer.writerow([
                 res.id,
                 res.spot_id,
-                lot.prime_location_name if lot else 'Unknown',
-                lot.address if lot else 'Unknown',
+                lot_name or 'Unknown',
+                address or 'Unknown',
                 res.parking_timestamp.isoformat() if res.parking_timestamp else '',
                 res.leaving_timestamp.isoformat() if res.leaving_timestamp else 'Active',
                 res.get_duration_hours() if hasattr(res, 'get_duration_hours') else 0,
@@ -328,16 +320,15 @@ def export_csv():
         output.seek(0)
         filename = f'parking-history-{user_id}-{datetime.now().strftime("%Y%m%d")}.csv'
 
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8')),
+        # Buffered (not streamed) so the compression hook can gzip it
+        return Response(
+            output.getvalue().encode('utf-8'),
             mimetype='text/csv',
-            as_attachment=True,
-            download_name=filename
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
 
     except Exception as e:
-        print(f"Error in export_csv: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in export_csv")
         return jsonify({'message': f'Error exporting CSV: {str(e)}'}), 500
 
 
@@ -379,8 +370,7 @@ def export_csv_async():
         }), 202  # 202 Accepted
 
     except Exception as e:
-        print(f"Error in export_csv_async: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error in export_csv_async")
         return jsonify({'message': f'Error starting export: {str(e)}'}), 500
 
 
@@ -429,6 +419,6 @@ def check_csv_export_status(task_id):
         return jsonify(response), 200
 
     except Exception as e:
-        print(f"Error checking task status: {str(e)}")
+        logger.exception("Error checking task status")
         return jsonify({'message': f'Error checking status: {str(e)}'}), 500
 
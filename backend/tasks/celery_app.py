@@ -1,5 +1,70 @@
-from celery import Celery
+from celery import Celery, Task
+from flask import has_app_context
+from celery.signals import setup_logging
+from kombu import Queue
 from config import Config
+from utils.log import configure_logging
+# Registers the publish/prerun/postrun/retry signal handlers
+import tasks.instrumentation  # noqa: F401
+
+# Queues. Task modules route themselves with **queue_options(...) on the
+# task decorator, so a task's queue is declared next to its code.
+INTERACTIVE_QUEUE = 'interactive'  # user-triggered work someone is waiting for (CSV export)
+DEFAULT_QUEUE = 'default'          # short maintenance tasks (overstay sweeper)
+BULK_QUEUE = 'bulk'                # mail fan-out and long data jobs (reminders, reports, lot imports)
+
+# Redis transport priorities: 0 is the highest. Within a queue this orders
+# messages; across queues a worker consuming several of them drains them in
+# the order listed in task_queues (queue_order_strategy='priority').
+QUEUE_PRIORITIES = {
+    INTERACTIVE_QUEUE: 0,
+    DEFAULT_QUEUE: 3,
+    BULK_QUEUE: 9,
+}
+
+# Worker launch profiles. Give interactive work its own worker so a bulk run
+# can never occupy every process; -O fair plus prefetch 1 stops a busy child
+# from reserving messages another child could start right away.
+WORKER_PROFILES = {
+    # Low-latency exports: small pool, nothing else on it
+    'interactive': 'celery -A tasks.celery_app:celery_app worker -Q interactive '
+                   '-n interactive@%h --concurrency=2 -O fair',
+    # Scheduled mail and maintenance: long tasks, may fall behind without hurting users
+    'bulk': 'celery -A tasks.celery_app:celery_app worker -Q bulk,default '
+            '-n bulk@%h --concurrency=4 -O fair',
+    # Single-box development: one worker, queues drained in priority order
+    'all': 'celery -A tasks.celery_app:celery_app worker -Q interactive,default,bulk '
+           '-n all@%h -O fair',
+}
+
+
+def queue_options(queue):
+    """Routing options for @celery_app.task(...)"""
+    return {'queue': queue, 'priority': QUEUE_PRIORITIES[queue]}
+
+
+CELERY_CONFIG = dict(
+    task_serializer='json',
+    accept_content=['json'],
+    result_serializer='json',
+    timezone='UTC',
+    enable_utc=True,
+    # Routing
+    task_queues=tuple(Queue(name, routing_key=name) for name in QUEUE_PRIORITIES),
+    task_default_queue=DEFAULT_QUEUE,
+    task_default_routing_key=DEFAULT_QUEUE,
+    task_default_priority=QUEUE_PRIORITIES[DEFAULT_QUEUE],
+    broker_transport_options={
+        'queue_order_strategy': 'priority',
+        'priority_steps': sorted(set(QUEUE_PRIORITIES.values())),
+        'visibility_timeout': Config.CELERY_VISIBILITY_TIMEOUT,
+    },
+    # Reserve one message per process at a time (long tasks use acks_late)
+    worker_prefetch_multiplier=1,
+    # Results are only read by the export status endpoint; drop them after this
+    result_expires=Config.CELERY_RESULT_EXPIRES,
+)
+
 
 def make_celery(app):
     celery = Celery(
@@ -8,13 +73,7 @@ def make_celery(app):
         backend=app.config['CELERY_RESULT_BACKEND']
     )
     
-    celery.conf.update(
-        task_serializer='json',
-        accept_content=['json'],
-        result_serializer='json',
-        timezone='UTC',
-        enable_utc=True,
-    )
+    celery.conf.update(CELERY_CONFIG)
     
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
@@ -24,18 +83,47 @@ def make_celery(app):
     celery.Task = ContextTask
     return celery
 
+_flask_app = None
+
+def get_flask_app():
+    """Flask app used to give worker-side tasks an application context"""
+    global _flask_app
+    if _flask_app is None:
+        from app import create_app
+        _flask_app = create_app()
+    return _flask_app
+
+class AppContextTask(Task):
+    """Runs every task inside a Flask app context (reuses one if already active)"""
+    def __call__(self, *args, **kwargs):
+        if has_app_context():
+            return super().__call__(*args, **kwargs)
+        with get_flask_app().app_context():
+            return super().__call__(*args, **kwargs)
+
 # Standalone celery app for tasks (used when Flask app context is not available)
 celery_app = Celery(
     'vpms',
     broker=Config.CELERY_BROKER_URL,
-    backend=Config.CELERY_RESULT_BACKEND
+    backend=Config.CELERY_RESULT_BACKEND,
+    task_cls=AppContextTask
 )
 
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
-    timezone='UTC',
-    enable_utc=True,
+    CELERY_CONFIG,
+    # Task modules loaded by workers and beat
+    imports=(
+        'tasks.export_tasks',
+        'tasks.fanout',
+        'tasks.import_tasks',
+        'tasks.maintenance_tasks',
+        'tasks.outbox_tasks',
+        'tasks.scheduled_tasks',
+        'tasks.sweeper_tasks',
+    ),
 )
 
+# Use the same queue-based JSON logging in workers instead of Celery's own setup
+@setup_logging.connect
+def _configure_worker_logging(**kwargs):
+    configure_logging()
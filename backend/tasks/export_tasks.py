@@ -1,17 +1,21 @@
-from tasks.celery_app import celery_app
-from database import Reservation, ParkingSpot, ParkingLot, User, db
+from tasks.celery_app import celery_app, queue_options, INTERACTIVE_QUEUE
+from database import ParkingSpot, ParkingLot, User, db
 from config import Config
 import csv
 import io
 from datetime import datetime
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+from utils.email_templates import build_message
+from utils.decorators import read_only
+from utils.archive import reservation_history
 import os
+import logging
 
-@celery_app.task(name='tasks.export_user_csv')
+logger = logging.getLogger(__name__)
+
+# Interactive: a user is waiting for this. acks_late so a worker crash redelivers it.
+@celery_app.task(name='tasks.export_user_csv', acks_late=True, **queue_options(INTERACTIVE_QUEUE))
+@read_only
 def export_user_csv_task(user_id):
     """
     Asynchronous task to export user booking history as CSV and send via email.
@@ -31,10 +35,9 @@ def export_user_csv_task(user_id):
                 'error': 'User not found'
             }
 
-        # Get all reservations for the user
-        reservations = Reservation.query.filter_by(user_id=user_id).order_by(
-            Reservation.parking_timestamp.desc()
-        ).all()
+        # Get all reservations for the user, archived ones included
+        history = reservation_history(lambda table: [table.c.user_id == user_id])
+        reservations = db.session.query(history).order_by(history.c.parking_timestamp.desc()).all()
 
         # Create CSV in memory
         output = io.StringIO()
@@ -106,100 +109,19 @@ def export_user_csv_task(user_id):
         # Send email with CSV attachment
         if user.email and Config.MAIL_USERNAME and Config.MAIL_PASSWORD:
             try:
-                # Create email
-                msg = MIMEMultipart()
-                msg['Subject'] = f'VPMS - Your Parking History Export'
-                msg['From'] = Config.MAIL_USERNAME
-                msg['To'] = user.email
-
-                # Email body
-                body = f"""
-                <html>
-                <head>
-                    <style>
-                        body {{
-                            font-family: Arial, sans-serif;
-                            line-height: 1.6;
-                            color: #333;
-                        }}
-                        .container {{
-                            max-width: 600px;
-                            margin: 0 auto;
-                            padding: 20px;
-                        }}
-                        .header {{
-                            background-color: #667eea;
-                            color: white;
-                            padding: 20px;
-                            text-align: center;
-                            border-radius: 5px;
-                        }}
-                        .content {{
-                            padding: 20px;
-                            background-color: #f9f9f9;
-                            margin-top: 20px;
-                            border-radius: 5px;
-                        }}
-                        .stats {{
-                            background-color: white;
-                            padding: 15px;
-                            margin: 10px 0;
-                            border-left: 4px solid #667eea;
-                        }}
-                        .footer {{
-                            text-align: center;
-                            margin-top: 20px;
-                            font-size: 12px;
-                            color: #666;
-                        }}
-                    </style>
-                </head>
-                <body>
-                    <div class="container">
-                        <div class="header">
-                            <h2>🅿️ VPMS - Parking History Export</h2>
-                        </div>
-                        <div class="content">
-                            <p>Hello <strong>{user.username}</strong>,</p>
-                            <p>Your parking history export is ready! Please find the CSV file attached to this email.</p>
-
-                            <div class="stats">
-                                <h3>Export Summary:</h3>
-                                <ul>
-                                    <li><strong>Total Bookings:</strong> {total_bookings}</li>
-                                    <li><strong>Total Hours:</strong> {total_hours:.2f} hours</li>
-                                    <li><strong>Total Spent:</strong> ₹{total_cost:.2f}</li>
-                                    <li><strong>Export Date:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</li>
-                                </ul>
-                            </div>
-
-                            <p>The attached CSV file contains:</p>
-                            <ul>
-                                <li>Complete booking history with timestamps</li>
-                                <li>Parking lot details and addresses</li>
-                                <li>Duration and cost information</li>
-                                <li>Summary statistics</li>
-                            </ul>
-
-                            <p>You can open this file in Excel, Google Sheets, or any spreadsheet application.</p>
-                        </div>
-                        <div class="footer">
-                            <p>© {datetime.now().year} Vehicle Parking Management System</p>
-                            <p>This is an automated email. Please do not reply.</p>
-                        </div>
-                    </div>
-                </body>
-                </html>
-                """
-
-                msg.attach(MIMEText(body, 'html'))
-
-                # Attach CSV file
-                attachment = MIMEBase('text', 'csv')
-                attachment.set_payload(csv_content.encode('utf-8'))
-                encoders.encode_base64(attachment)
-                attachment.add_header('Content-Disposition', f'attachment; filename={filename}')
-                msg.attach(attachment)
+                msg = build_message(
+                    'export_ready',
+                    'VPMS - Your Parking History Export',
+                    Config.MAIL_USERNAME,
+                    user.email,
+                    attachments=[(filename, 'csv', csv_content.encode('utf-8'))],
+                    username=user.username,
+                    total_bookings=total_bookings,
+                    total_hours=total_hours,
+                    total_cost=total_cost,
+                    export_date=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    year=datetime.now().year
+                )
 
                 # Send email
                 with smtplib.SMTP(Config.MAIL_SERVER, Config.MAIL_PORT) as server:
@@ -207,7 +129,7 @@ def export_user_csv_task(user_id):
                     server.login(Config.MAIL_USERNAME, Config.MAIL_PASSWORD)
                     server.send_message(msg)
 
-                print(f"✅ CSV export sent to {user.username} ({user.email})")
+                logger.info("CSV export sent to %s (%s)", user.username, user.email)
 
                 return {
                     'status': 'completed',
@@ -219,7 +141,7 @@ def export_user_csv_task(user_id):
                 }
 
             except Exception as e:
-                print(f"❌ Failed to send CSV to {user.email}: {str(e)}")
+                logger.error("Failed to send CSV to %s: %s", user.email, e)
                 # Still return the CSV content even if email fails
                 return {
                     'status': 'completed_no_email',
@@ -237,9 +159,7 @@ def export_user_csv_task(user_id):
             }
 
     except Exception as e:
-        print(f"❌ Error in export_user_csv_task: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in export_user_csv_task")
         return {
             'status': 'failed',
             'error': str(e)
@@ -0,0 +1,125 @@
+"""
+Chunked fan-out for per-user batch jobs
+
+A coordinator splits user ids into fixed-size ranges and runs one subtask per
+range as a chord; the callback sums the counters the chunks return. Chunks
+checkpoint in Redis: a done marker per (job, run, chunk) holds the chunk's
+counters, and a sent marker per (user, channel) is written after each
+delivery, so a retried or re-dispatched chunk never mails anyone twice.
+"""
+import json
+import logging
+from celery import chord
+from sqlalchemy import func
+from config import Config
+from database import User, db
+from extensions import redis_client, REDIS_AVAILABLE
+from tasks.celery_app import celery_app, queue_options, BULK_QUEUE
+from tasks.ledger import finish_run
+
+logger = logging.getLogger(__name__)
+
+MARKER_PREFIX = 'fanout'
+
+# Options for chunk subtasks: results must be stored for the chord callback,
+# and a failed chunk is retried (its checkpoints make that safe)
+CHUNK_TASK_OPTIONS = dict(
+    acks_late=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=3,
+    **queue_options(BULK_QUEUE)
+)
+
+
+def user_id_ranges(chunk_size=None):
+    """Half-open [start, end) id ranges covering every regular user"""
+    chunk_size = chunk_size or Config.FANOUT_CHUNK_SIZE
+    low, high = db.session.query(func.min(User.id), func.max(User.id)).filter(User.role == 'user').one()
+    if low is None:
+        return []
+    return [(start, min(start + chunk_size, high + 1)) for start in range(low, high + 1, chunk_size)]
+
+
+class ChunkCheckpoint:
+    """Redis done/sent markers for one chunk of a fan-out run (no-ops without Redis)"""
+
+    def __init__(self, job, run_key, start_id):
+        self.prefix = f'{MARKER_PREFIX}:{job}:{run_key}'
+        self.done_key = f'{self.prefix}:done:{start_id}'
+        self.enabled = bool(REDIS_AVAILABLE and redis_client)
+
+    def _sent_key(self, user_id, channel):
+        return f'{self.prefix}:sent:{channel}:{user_id}'
+
+    def completed(self):
+        """Counters of an earlier successful run of this chunk, or None"""
+        if not self.enabled:
+            return None
+        value = redis_client.get(self.done_key)
+        return json.loads(value) if value else None
+
+    def already_sent(self, user_ids, channel='email'):
+        """Subset of user_ids that were delivered to on channel by an earlier attempt"""
+        user_ids = list(user_ids)
+        if not self.enabled or not user_ids:
+            return set()
+        values = redis_client.mget([self._sent_key(user_id, channel) for user_id in user_ids])
+        return {user_id for user_id, value in zip(user_ids, values) if value}
+
+    def mark_sent(self, user_id, channel='email'):
+        self.mark_sent_many([user_id], channel)
+
+    def mark_sent_many(self, user_ids, channel='email'):
+        if not self.enabled or not user_ids:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.set(self._sent_key(user_id, channel), 1, ex=Config.FANOUT_MARKER_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Could not record %s delivery to %d users: %s", channel, len(user_ids), e)
+
+    def mark_done(self, counters):
+        if not self.enabled:
+            return
+        try:
+            redis_client.set(self.done_key, json.dumps(counters), ex=Config.FANOUT_MARKER_TTL)
+        except Exception as e:
+            logger.warning("Could not checkpoint %s: %s", self.done_key, e)
+
+
+@celery_app.task(name='tasks.aggregate_fanout', ignore_result=True, **queue_options(BULK_QUEUE))
+def aggregate_chunks(results, job, run_key, ledger_task=None):
+    """Chord callback: sum the numeric counters returned by every chunk"""
+    totals = {}
+    for counters in results:
+        for key, value in (counters or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+    logger.info("Fan-out %s run %s finished: %d chunks, %s", job, run_key, len(results), totals)
+    summary = {
+        'status': 'completed',
+        'job': job,
+        'run': run_key,
+        'chunks': len(results),
+        **totals
+    }
+    if ledger_task:
+        finish_run(ledger_task, run_key, 'completed', summary)
+    return summary
+
+
+def dispatch_chunks(job, chunk_task, run_key, *args, ledger_task=None):
+    """
+    Run chunk_task(run_key, start_id, end_id, *args) for every user-id range
+    as a chord; the callback marks the ledger_task run completed if given.
+    """
+    ranges = user_id_ranges()
+    if not ranges:
+        return 0
+    header = [chunk_task.s(run_key, start, end, *args) for start, end in ranges]
+    chord(header)(aggregate_chunks.s(job, run_key, ledger_task=ledger_task))
+    logger.info("Fan-out %s run %s dispatched as %d chunks", job, run_key, len(ranges))
+    return len(ranges)
@@ -0,0 +1,31 @@
+from tasks.celery_app import celery_app, queue_options, BULK_QUEUE
+from utils.lot_import import ImportAborted, import_lots_file
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name='tasks.import_parking_lots', bind=True, acks_late=True, **queue_options(BULK_QUEUE))
+def import_parking_lots_task(self, path, chunk_size=None):
+    """
+    Import lots and spots from an uploaded CSV saved at path, reporting
+    progress as the PROGRESS state; the file is removed afterwards. A
+    redelivered run skips the lots the first attempt already created.
+    """
+    def progress(summary):
+        self.update_state(state='PROGRESS', meta=summary)
+
+    try:
+        summary = import_lots_file(path, chunk_size, progress)
+        return {'status': 'completed', **summary}
+    except ImportAborted as e:
+        if not e.bad_input:
+            logger.exception("Error in import_parking_lots")
+        return {'status': 'failed', 'error': str(e), **e.summary}
+    except Exception as e:
+        logger.exception("Error in import_parking_lots")
+        return {'status': 'failed', 'error': str(e)}
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,128 @@
+"""
+Celery task instrumentation
+
+Signal handlers record, per task name: publish count, enqueue->start latency
+(from an 'enqueued_at' header stamped at publish time), run time by final
+state, retries and serialized result size. The metrics live in the shared
+registry, so they show up in /metrics next to the web tier and are summarised
+by /api/admin/tasks/stats.
+"""
+import json
+import time
+from datetime import datetime, timezone
+from celery.signals import before_task_publish, task_prerun, task_postrun, task_retry
+from utils.metrics import registry, histogram_quantile, TASK_DURATION, DEFAULT_SIZE_BUCKETS
+
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+
+TASKS_PUBLISHED = registry.counter(
+    'vpms_task_published_total', 'Celery tasks published', ('task',))
+TASK_QUEUE_WAIT = registry.histogram(
+    'vpms_task_queue_wait_seconds', 'Time from publish (or ETA) to task start', ('task',), QUEUE_WAIT_BUCKETS)
+TASK_RETRIES = registry.counter(
+    'vpms_task_retries_total', 'Celery task retries', ('task',))
+TASK_RESULT_SIZE = registry.histogram(
+    'vpms_task_result_size_bytes', 'Serialized task result size', ('task',), DEFAULT_SIZE_BUCKETS)
+
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+_task_started = {}
+
+
+@before_task_publish.connect
+def _stamp_enqueue_time(sender=None, headers=None, **kwargs):
+    registry.ensure_pusher()
+    if headers is not None:
+        headers[ENQUEUED_AT_HEADER] = time.time()
+    TASKS_PUBLISHED.inc((sender or 'unknown',))
+
+
+def _to_timestamp(value):
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _enqueued_at(request):
+    value = getattr(request, ENQUEUED_AT_HEADER, None)
+    if value is None:
+        value = (getattr(request, 'headers', None) or {}).get(ENQUEUED_AT_HEADER)
+    eta = getattr(request, 'eta', None)
+    if eta:
+        # Scheduled tasks are only "waiting" once their ETA has passed
+        try:
+            value = max(value or 0, _to_timestamp(eta))
+        except (TypeError, ValueError):
+            pass
+    return value
+
+
+@task_prerun.connect
+def _record_task_start(task_id=None, task=None, **kwargs):
+    registry.ensure_pusher()
+    _task_started[task_id] = time.perf_counter()
+    enqueued_at = _enqueued_at(task.request)
+    if enqueued_at:
+        TASK_QUEUE_WAIT.observe(max(0.0, time.time() - enqueued_at), (task.name,))
+
+
+@task_postrun.connect
+def _record_task_end(task_id=None, task=None, retval=None, state=None, **kwargs):
+    start = _task_started.pop(task_id, None)
+    if start is not None:
+        TASK_DURATION.observe(time.perf_counter() - start, (task.name, state or 'UNKNOWN'))
+    if state == 'SUCCESS':
+        try:
+            size = len(json.dumps(retval, default=str))
+        except (TypeError, ValueError):
+            size = 0
+        TASK_RESULT_SIZE.observe(size, (task.name,))
+
+
+@task_retry.connect
+def _record_task_retry(sender=None, **kwargs):
+    TASK_RETRIES.inc((getattr(sender, 'name', None) or 'unknown',))
+
+
+def _histogram_summary(data, labels):
+    if not data or labels not in data['samples']:
+        return None
+    counts, total, count = data['samples'][labels]
+    return {
+        'count': count,
+        'avg': round(total / count, 4) if count else 0.0,
+        'p50': round(histogram_quantile(data['buckets'], counts, 0.50), 4),
+        'p95': round(histogram_quantile(data['buckets'], counts, 0.95), 4)
+    }
+
+
+def get_task_stats():
+    """Per-task summary across all processes, built from the merged metrics"""
+    merged = registry.collect()
+    durations = merged.get(TASK_DURATION.name)
+    waits = merged.get(TASK_QUEUE_WAIT.name)
+    sizes = merged.get(TASK_RESULT_SIZE.name)
+    published = merged.get(TASKS_PUBLISHED.name, {}).get('samples', {})
+    retries = merged.get(TASK_RETRIES.name, {}).get('samples', {})
+
+    names = {labels[0] for labels in published} | {labels[0] for labels in retries}
+    for data in (durations, waits, sizes):
+        if data:
+            names |= {labels[0] for labels in data['samples']}
+
+    stats = {}
+    for name in sorted(names):
+        states = {}
+        if durations:
+            for labels in durations['samples']:
+                if labels[0] == name:
+                    states[labels[1]] = _histogram_summary(durations, labels)
+        stats[name] = {
+            'published': published.get((name,), 0),
+            'retries': retries.get((name,), 0),
+            'run_seconds': states,
+            'queue_wait_seconds': _histogram_summary(waits, (name,)),
+            'result_size_bytes': _histogram_summary(sizes, (name,))
+        }
+    return stats
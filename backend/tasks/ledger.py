@@ -0,0 +1,89 @@
+"""
+Run ledger for scheduled jobs
+
+Each (task, period) pair - e.g. ('tasks.send_monthly_reports', '2024-05') -
+gets one TaskRun row, protected by a unique constraint. Together with a Redis
+lock around the claim this makes a second invocation for the same period
+(a redundant beat instance, a redelivered or retried task) exit immediately.
+"""
+import json
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_, and_
+from sqlalchemy.exc import IntegrityError
+from config import Config
+from database import TaskRun, db
+from utils.locks import RedisLock
+
+logger = logging.getLogger(__name__)
+
+
+def claim_run(task_name, period):
+    """
+    Record a new run of task_name for period and return its TaskRun, or None
+    if the period already ran. Failed runs, and 'running' rows older than the
+    lock TTL (their worker died), are taken over.
+    """
+    now = datetime.utcnow()
+    db.session.add(TaskRun(task_name=task_name, period=period, status='running', started_at=now))
+    try:
+        db.session.commit()
+        return TaskRun.query.filter_by(task_name=task_name, period=period).one()
+    except IntegrityError:
+        db.session.rollback()
+
+    stale_before = now - timedelta(seconds=Config.TASK_LOCK_TTL)
+    result = db.session.execute(
+        update(TaskRun)
+        .where(
+            TaskRun.task_name == task_name,
+            TaskRun.period == period,
+            or_(
+                TaskRun.status == 'failed',
+                and_(TaskRun.status == 'running', TaskRun.started_at < stale_before)
+            )
+        )
+        .values(status='running', attempts=TaskRun.attempts + 1, started_at=now,
+                finished_at=None, result=None)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return None
+    return TaskRun.query.filter_by(task_name=task_name, period=period).one()
+
+
+def finish_run(task_name, period, status, result=None, from_status=None):
+    """
+    Set the final (or 'dispatched') status of a run and store its summary.
+    With from_status, only a run still in that status is updated (a chord
+    callback may already have marked it completed).
+    """
+    if result is not None and not isinstance(result, str):
+        result = json.dumps(result, default=str)
+    query = update(TaskRun).where(TaskRun.task_name == task_name, TaskRun.period == period)
+    if from_status:
+        query = query.where(TaskRun.status == from_status)
+    db.session.execute(query.values(status=status, result=result, finished_at=datetime.utcnow()))
+    db.session.commit()
+
+
+@contextmanager
+def exclusive_run(task_name, period):
+    """
+    Yield the claimed TaskRun, or None when another invocation holds the lock
+    or the period was already handled. An exception inside the block marks
+    the run failed so the next invocation may retry it.
+    """
+    with RedisLock(f'{task_name}:{period}') as acquired:
+        run = claim_run(task_name, period) if acquired else None
+        if run is None:
+            logger.info("Skipping %s for %s: already running or done", task_name, period)
+            yield None
+            return
+        try:
+            yield run
+        except Exception as e:
+            db.session.rollback()
+            finish_run(task_name, period, 'failed', str(e))
+            raise
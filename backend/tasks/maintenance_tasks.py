@@ -0,0 +1,89 @@
+from celery.schedules import crontab
+from tasks.celery_app import celery_app, queue_options, BULK_QUEUE
+from database import db
+from utils.locks import RedisLock
+from utils.user_counters import reconcile_user_counters
+from utils.archive import archive_completed
+from utils.db_maintenance import run_maintenance
+from tasks.ledger import exclusive_run, finish_run
+from config import Config
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name='tasks.reconcile_user_counters', ignore_result=True, **queue_options(BULK_QUEUE))
+def reconcile_user_counters_task(batch_size=None):
+    """Recompute users' booking counters from reservations and repair drift"""
+    lock = RedisLock(reconcile_user_counters_task.name)
+    if not lock.acquire():
+        return {'status': 'skipped'}
+    try:
+        summary = reconcile_user_counters(batch_size or Config.COUNTER_RECONCILE_BATCH_SIZE)
+        logger.info("Counter reconciliation checked %d users, repaired %d",
+                    summary['checked'], summary['repaired'])
+        return {'status': 'completed', **summary, 'timestamp': datetime.utcnow().isoformat()}
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error in reconcile_user_counters")
+        return {'status': 'failed', 'error': str(e)}
+    finally:
+        lock.release()
+
+
+@celery_app.task(name='tasks.archive_reservations', ignore_result=True, **queue_options(BULK_QUEUE))
+def archive_reservations_task(horizon_days=None, batch_size=None):
+    """Move reservations completed before the archive horizon to reservations_archive"""
+    lock = RedisLock(archive_reservations_task.name)
+    if not lock.acquire():
+        return {'status': 'skipped'}
+    try:
+        summary = archive_completed(horizon_days, batch_size)
+        return {'status': 'completed', **summary, 'timestamp': datetime.utcnow().isoformat()}
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error in archive_reservations")
+        return {'status': 'failed', 'error': str(e)}
+    finally:
+        lock.release()
+
+
+@celery_app.task(name='tasks.database_maintenance', ignore_result=True, **queue_options(BULK_QUEUE))
+def database_maintenance_task(run_key=None, backup=None):
+    """
+    ANALYZE, incremental vacuum and an online backup of the SQLite file; the
+    summary (durations, reclaimed pages, backup file) is stored in task_runs
+    """
+    now = datetime.utcnow()
+    run_key = run_key or now.strftime('%Y-%m-%d')
+    backup = Config.DB_BACKUP_ENABLED if backup is None else backup
+    if db.engine.dialect.name != 'sqlite':
+        return {'status': 'skipped', 'reason': f'not a SQLite database ({db.engine.dialect.name})'}
+    try:
+        with exclusive_run(database_maintenance_task.name, run_key) as run:
+            if run is None:
+                return {'status': 'skipped', 'run': run_key}
+            summary = run_maintenance(backup_db=backup)
+            result = {'status': 'completed', 'run': run_key, **summary, 'timestamp': now.isoformat()}
+            finish_run(database_maintenance_task.name, run_key, 'completed', result)
+            return result
+    except Exception as e:
+        logger.exception("Error in database_maintenance")
+        return {'status': 'failed', 'error': str(e)}
+
+
+celery_app.conf.beat_schedule.update({
+    'reconcile-user-counters': {
+        'task': 'tasks.reconcile_user_counters',
+        'schedule': crontab(hour=Config.COUNTER_RECONCILE_HOUR, minute=30),
+    },
+    'archive-reservations': {
+        'task': 'tasks.archive_reservations',
+        'schedule': crontab(hour=Config.ARCHIVE_HOUR, minute=0),
+    },
+    'database-maintenance': {
+        'task': 'tasks.database_maintenance',
+        'schedule': crontab(hour=Config.DB_MAINTENANCE_HOUR, minute=15),
+    },
+})
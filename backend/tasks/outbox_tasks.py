@@ -0,0 +1,68 @@
+from tasks.celery_app import celery_app, queue_options, DEFAULT_QUEUE
+from database import db
+from utils.cache import delete_cached_many, booking_cache_keys
+from utils.locks import RedisLock
+from utils.outbox import consume, consumer_groups, publish_pending, purge_published, register_consumer
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def invalidate_booking_caches(events):
+    """Consumer: drop the cached listings and stats a batch of booking events made stale"""
+    user_ids = {event['user_id'] for event in events}
+    lot_ids = {event['lot_id'] for event in events if event.get('lot_id')}
+    if not delete_cached_many(booking_cache_keys(user_ids, lot_ids)):
+        raise RuntimeError('cache invalidation failed')
+
+
+register_consumer('cache-invalidation', invalidate_booking_caches)
+
+
+@celery_app.task(name='tasks.relay_booking_events', ignore_result=True, **queue_options(DEFAULT_QUEUE))
+def relay_booking_events():
+    """Publish outbox rows to the booking event stream"""
+    # One relay at a time keeps the stream in id order
+    lock = RedisLock(relay_booking_events.name, ttl=60)
+    if not lock.acquire():
+        return {'status': 'skipped'}
+    try:
+        published = publish_pending()
+        purged = purge_published()
+        return {'status': 'completed', 'published': published, 'purged': purged}
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error relaying booking events")
+        return {'status': 'failed', 'error': str(e)}
+    finally:
+        lock.release()
+
+
+@celery_app.task(name='tasks.consume_booking_events', ignore_result=True, **queue_options(DEFAULT_QUEUE))
+def consume_booking_events(group):
+    """Run one consumer group's handler over new and stale-pending stream entries"""
+    try:
+        return {'status': 'completed', 'group': group, 'handled': consume(group)}
+    except Exception as e:
+        logger.exception("Error consuming booking events for %s", group)
+        return {'status': 'failed', 'group': group, 'error': str(e)}
+
+
+# Short-lived entries: a run missed while workers are down is simply superseded
+celery_app.conf.beat_schedule.update({
+    'relay-booking-events': {
+        'task': 'tasks.relay_booking_events',
+        'schedule': Config.OUTBOX_RELAY_INTERVAL,
+        'options': {'expires': Config.OUTBOX_RELAY_INTERVAL * 5},
+    },
+    **{
+        f'consume-booking-events-{group}': {
+            'task': 'tasks.consume_booking_events',
+            'schedule': Config.OUTBOX_RELAY_INTERVAL,
+            'args': (group,),
+            'options': {'expires': Config.OUTBOX_RELAY_INTERVAL * 5},
+        }
+        for group in consumer_groups()
+    },
+})
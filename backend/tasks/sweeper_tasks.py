@@ -0,0 +1,166 @@
+from celery.schedules import crontab
+from sqlalchemy import select, update, exists, bindparam, func
+from tasks.celery_app import celery_app, queue_options, DEFAULT_QUEUE
+from database import ParkingLot, ParkingSpot, Reservation, db, compute_parking_cost
+from utils.locks import RedisLock
+from utils.user_counters import record_releases
+from utils.outbox import record_events
+from config import Config
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+AUTO_CLOSE_REMARK = 'Automatically closed by the overstay sweeper'
+
+reservations = Reservation.__table__
+spots = ParkingSpot.__table__
+lots = ParkingLot.__table__
+
+
+def _candidate_columns():
+    return select(
+        reservations.c.id,
+        reservations.c.user_id,
+        reservations.c.spot_id,
+        reservations.c.parking_timestamp,
+        reservations.c.price_per_hour,
+        spots.c.lot_id,
+        lots.c.price.label('lot_price')
+    ).select_from(
+        reservations.join(spots, spots.c.id == reservations.c.spot_id)
+                    .join(lots, lots.c.id == spots.c.lot_id)
+    ).where(reservations.c.leaving_timestamp.is_(None))
+
+
+def _candidate_queries(now):
+    """One query per lot with a maximum stay, plus admin-flagged sessions"""
+    limits = db.session.execute(
+        select(lots.c.id, lots.c.max_stay_hours).where(lots.c.max_stay_hours.isnot(None))
+    ).all()
+    for lot_id, max_stay_hours in limits:
+        cutoff = now - timedelta(hours=max_stay_hours)
+        yield _candidate_columns().where(
+            spots.c.lot_id == lot_id,
+            reservations.c.parking_timestamp <= cutoff
+        ).order_by(reservations.c.parking_timestamp)
+    yield _candidate_columns().where(
+        reservations.c.closeout_requested.is_(True)
+    ).order_by(reservations.c.id)
+
+
+def close_reservations(rows, now):
+    """
+    Close a batch of active reservations in set-based statements: one
+    executemany UPDATE for the reservations (cost via compute_parking_cost, the
+    same rule as Reservation.calculate_cost), one for the owners' booking
+    counters, one outbox insert of 'closed' events and one UPDATE freeing
+    their spots. Runs inside the caller's transaction.
+    """
+    params = [{
+        'uid': row.user_id,
+        'rid': row.id,
+        'cost': compute_parking_cost(row.parking_timestamp, now, row.lot_price or row.price_per_hour)
+    } for row in rows]
+    result = db.session.execute(
+        update(reservations)
+        .where(reservations.c.id == bindparam('rid'), reservations.c.leaving_timestamp.is_(None))
+        .values(
+            leaving_timestamp=now,
+            parking_cost=bindparam('cost'),
+            closeout_requested=False,
+            remarks=func.coalesce(reservations.c.remarks, AUTO_CLOSE_REMARK),
+            updated_at=now
+        ),
+        params
+    )
+    record_releases(params, now)
+    # Events only for the sessions this batch closed (not ones released meanwhile)
+    closed_ids = set(db.session.execute(
+        select(reservations.c.id).where(
+            reservations.c.id.in_([row.id for row in rows]),
+            reservations.c.leaving_timestamp == now
+        )
+    ).scalars())
+    record_events([{
+        'event_type': 'closed',
+        'reservation_id': row.id,
+        'user_id': row.user_id,
+        'lot_id': row.lot_id,
+        'spot_id': row.spot_id,
+        'cost': param['cost']
+    } for row, param in zip(rows, params) if row.id in closed_ids])
+    # Only free spots that no longer have an active session (a concurrent
+    # release + rebook must not be undone)
+    spot_ids = sorted({row.spot_id for row in rows})
+    db.session.execute(
+        update(spots)
+        .where(
+            spots.c.id.in_(spot_ids),
+            ~exists().where(reservations.c.spot_id == spots.c.id, reservations.c.leaving_timestamp.is_(None))
+        )
+        .values(status='A')
+    )
+    return result.rowcount
+
+
+@celery_app.task(name='tasks.sweep_overstays', ignore_result=True, **queue_options(DEFAULT_QUEUE))
+def sweep_overstays(batch_size=None):
+    """
+    Close reservations that exceeded their lot's maximum stay or were flagged
+    by an admin, in batched transactions (caches are invalidated by the
+    consumer of the 'closed' events).
+    """
+    batch_size = batch_size or Config.OVERSTAY_SWEEP_BATCH_SIZE
+    now = datetime.utcnow()
+    closed = 0
+    batches = 0
+    user_ids = set()
+    lot_ids = set()
+    # Overlapping sweeps (slow run, redundant beat) would just race each other
+    lock = RedisLock(sweep_overstays.name)
+    if not lock.acquire():
+        return {'status': 'skipped', 'closed': 0}
+    try:
+        for query in _candidate_queries(now):
+            while True:
+                rows = db.session.execute(query.limit(batch_size)).all()
+                if not rows:
+                    break
+                closed += close_reservations(rows, now)
+                db.session.commit()
+                batches += 1
+                user_ids.update(row.user_id for row in rows)
+                lot_ids.update(row.lot_id for row in rows)
+                if len(rows) < batch_size:
+                    break
+
+        if closed:
+            logger.info("Overstay sweep closed %d reservations in %d batches", closed, batches)
+
+        return {
+            'status': 'completed',
+            'closed': closed,
+            'batches': batches,
+            'users': len(user_ids),
+            'lots': len(lot_ids),
+            'timestamp': now.isoformat()
+        }
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error in sweep_overstays")
+        return {
+            'status': 'failed',
+            'closed': closed,
+            'error': str(e)
+        }
+    finally:
+        lock.release()
+
+
+celery_app.conf.beat_schedule.update({
+    'sweep-overstays': {
+        'task': 'tasks.sweep_overstays',
+        'schedule': crontab(minute=f'*/{Config.OVERSTAY_SWEEP_INTERVAL_MINUTES}'),
+    },
+})
@@ -0,0 +1,39 @@
+"""
+Shared fixtures: one app per test session on a scratch SQLite file (the
+checked-in vpms.db is never opened)
+
+    cd backend
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('db') / 'vpms-test.db')
+    mp = pytest.MonkeyPatch()
+    mp.setattr(database, 'DATABASE_PATH', path)
+    mp.setattr(database, 'DATABASE_URI', f'sqlite:///{path}')
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    mp.undo()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def admin_headers(app):
+    response = app.test_client().post('/api/admin/login', json={'username': 'admin', 'password': 'admin123'})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
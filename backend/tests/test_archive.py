@@ -0,0 +1,73 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import ParkingLot, ParkingSpot, Reservation, ReservationArchive, User, db
+from utils.archive import archive_completed, reservation_history
+
+
+def _register(client, username):
+    client.post('/api/user/register', json={
+        'username': username, 'email': f'{username}@example.com', 'password': 'secret123'})
+    response = client.post('/api/user/login', json={'username': username, 'password': 'secret123'})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+@pytest.fixture(scope='module')
+def archived(app):
+    """A user with one booking moved to the archive and one recent booking left active"""
+    headers = _register(app.test_client(), 'archived_user')
+    with app.app_context():
+        lot = ParkingLot(prime_location_name='Archive Lot', address='9 Old Road', pin_code='500009',
+                         price=10.0, number_of_spots=1)
+        db.session.add(lot)
+        db.session.flush()
+        spot = ParkingSpot(lot_id=lot.id, status='A')
+        db.session.add(spot)
+        db.session.flush()
+        user = User.query.filter_by(username='archived_user').one()
+        now = datetime.utcnow()
+        old = Reservation(spot_id=spot.id, user_id=user.id, parking_timestamp=now - timedelta(days=400, hours=2),
+                          leaving_timestamp=now - timedelta(days=400), parking_cost=20.0, price_per_hour=10.0)
+        recent = Reservation(spot_id=spot.id, user_id=user.id, parking_timestamp=now - timedelta(hours=3),
+                             leaving_timestamp=now - timedelta(hours=2), parking_cost=10.0, price_per_hour=10.0)
+        db.session.add_all([old, recent])
+        db.session.commit()
+        old_id, recent_id = old.id, recent.id
+        archive_completed(horizon_days=30)
+        assert db.session.get(ReservationArchive, old_id) is not None
+        assert db.session.get(Reservation, recent_id) is not None
+    return headers, old_id, recent_id
+
+
+def test_archived_bookings_are_listed(client, archived):
+    headers, old_id, recent_id = archived
+    response = client.get('/api/user/bookings', headers=headers)
+    assert response.status_code == 200
+    bookings = {booking['id']: booking for booking in response.get_json()}
+    assert set(bookings) == {old_id, recent_id}
+    assert bookings[old_id]['lot_name'] == 'Archive Lot'
+    assert bookings[old_id]['status'] == 'completed'
+
+
+def test_archived_bookings_are_exported(client, archived):
+    headers, old_id, recent_id = archived
+    response = client.get('/api/user/export-csv', headers=headers)
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))[1:]
+    assert {int(row[0]) for row in rows} == {old_id, recent_id}
+
+
+def test_history_rows_stay_out_of_the_session(app, archived):
+    _, old_id, _ = archived
+    with app.app_context():
+        history = reservation_history(lambda table: [table.c.id == old_id])
+        booking = db.session.query(history).one()
+        assert booking.id == old_id and booking not in db.session
+        # The archived id is not in reservations, and the lookup must say so
+        assert db.session.get(Reservation, old_id) is None
+        booking.remarks = 'edited'
+        db.session.commit()
+        assert db.session.get(ReservationArchive, old_id).remarks != 'edited'
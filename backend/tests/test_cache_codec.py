@@ -0,0 +1,43 @@
+from datetime import date, datetime
+
+import pytest
+
+from utils import cache_codec
+from utils.cache_codec import decode, encode
+from utils.json_provider import dumps_bytes, loads
+
+VALUES = [
+    [{}, {}],
+    [{}, {'a': 1}],
+    [{'a': 1, 'b': 2}, {'b': 3, 'a': 4}],
+    [{'id': 1, 'name': 'x'}, {'id': 2, 'name': 'y'}, {'id': 3, 'name': None}],
+    [{'id': 1}, {'id': 2, 'extra': True}],
+    [{'id': 1}, 'not a dict'],
+    {'lots': [[{'id': 1, 'spots': [{'s': 1}, {'s': 2}]}, {'id': 2, 'spots': []}], [], [[]]]},
+    [{'at': datetime(2026, 10, 19, 8, 30, 5, 120), 'day': date(2026, 10, 19)},
+     {'at': datetime(2026, 10, 20, 9, 0), 'day': date(2026, 10, 20)}],
+    {'users': [{'id': i, 'email': f'user{i}@example.com', 'created_at': datetime(2026, 1, 1, i % 24)}
+               for i in range(200)]},
+    [],
+    {},
+    None,
+]
+
+
+@pytest.fixture(params=['msgpack', 'json'])
+def codec(request, monkeypatch):
+    monkeypatch.setattr(cache_codec.Config, 'CACHE_CODEC', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_round_trip_matches_json(codec, value):
+    expected = loads(dumps_bytes(value))
+    decoded = decode(encode(value))
+    assert decoded == expected
+
+
+def test_empty_dicts_are_not_column_packed(monkeypatch):
+    monkeypatch.setattr(cache_codec.Config, 'CACHE_CODEC', 'msgpack')
+    assert decode(encode([{}, {}])) == [{}, {}]
+    assert decode(encode({'rows': [{}, {}, {}]})) == {'rows': [{}, {}, {}]}
@@ -0,0 +1,37 @@
+import sqlite3
+from datetime import datetime
+
+from utils import db_maintenance
+
+
+def _database(path):
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.execute('CREATE TABLE t (x TEXT)')
+    conn.executemany('INSERT INTO t VALUES (?)', [('x' * 500,)] * 200)
+    return conn
+
+
+def test_backups_in_the_same_second_are_kept_apart(tmp_path):
+    conn = _database(tmp_path / 'source.db')
+    backup_dir = tmp_path / 'backups'
+    second = datetime(2026, 10, 19, 5, 15, 0)
+    paths = [
+        db_maintenance.backup(conn, str(backup_dir), step_pause=0, keep=2, now=second.replace(microsecond=ms))['path']
+        for ms in (1, 2, 3)
+    ]
+    conn.close()
+    assert len(set(paths)) == 3
+    assert sorted(p.name for p in backup_dir.iterdir()) == [
+        'vpms-20261019-051500-000002.db', 'vpms-20261019-051500-000003.db'
+    ]
+
+
+def test_vacuum_skips_a_file_that_is_not_converted(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_maintenance.Config, 'DB_VACUUM_CONVERT', False)
+    conn = _database(tmp_path / 'source.db')
+    summary = db_maintenance.incremental_vacuum(conn)
+    assert 'skipped' in summary and not summary['converted']
+    assert db_maintenance.convert_to_incremental(conn) is not None
+    assert db_maintenance.file_stats(conn)['auto_vacuum'] == 'incremental'
+    assert db_maintenance.convert_to_incremental(conn) is None
+    conn.close()
@@ -0,0 +1,33 @@
+import pytest
+from utils.email_templates import render_email
+
+CONTEXTS = {
+    'reminder': {'username': 'alice', 'available_lots_count': 3, 'new_lots_today': 1},
+    'monthly_report': {
+        'username': 'alice', 'month_label': 'September 2026', 'year': 2026, 'total_bookings': 2,
+        'total_spent': 40.0, 'avg_cost': 20.0, 'total_hours': 3.5, 'most_used_lot': 'Central',
+        'most_used_count': 2, 'lot_breakdown': [('Central', 2)]
+    },
+    'export_ready': {
+        'username': 'alice', 'export_date': '2026-10-01', 'year': 2026, 'total_bookings': 2,
+        'total_cost': 40.0, 'total_hours': 3.5
+    }
+}
+
+
+@pytest.mark.parametrize('name', sorted(CONTEXTS))
+def test_email_css_is_inlined(app, name):
+    with app.app_context():
+        rendered = render_email(name, **CONTEXTS[name])
+    assert '<style' not in rendered.html
+    assert 'style="' in rendered.html
+    assert 'alice' in rendered.html and 'alice' in rendered.text
+    assert '__jinja_' not in rendered.html
+
+
+def test_email_block_tags_survive_inlining(app):
+    with app.app_context():
+        with_new = render_email('reminder', **dict(CONTEXTS['reminder'], new_lots_today=2))
+        without_new = render_email('reminder', **dict(CONTEXTS['reminder'], new_lots_today=0))
+    assert '2 new parking lot(s)' in with_new.html
+    assert 'New Parking Lots Available' not in without_new.html
@@ -0,0 +1,30 @@
+import io
+
+from config import Config
+
+HEADER = b'prime_location_name,address,pin_code,price,number_of_spots\n'
+
+
+def _upload(client, headers, body):
+    return client.post(
+        '/api/admin/parking-lots/import', headers=headers,
+        data={'file': (io.BytesIO(body), 'lots.csv')}, content_type='multipart/form-data'
+    )
+
+
+def test_decode_error_after_committed_chunks_returns_partial_summary(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(Config, 'IMPORT_CHUNK_SIZE', 50)
+    # Enough valid rows that several chunks commit before the decoder reaches the bad byte
+    rows = b''.join(b'Decode Lot %d,1 Import Street,56%04d,20,2\n' % (i, i) for i in range(400))
+    response = _upload(client, admin_headers, HEADER + rows + b'Bad \xff Lot,Street,560999,20,2\n')
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['message'].startswith('Import stopped:')
+    assert 0 < body['lots_created'] < 401
+    assert body['spots_created'] == 2 * body['lots_created']
+
+
+def test_missing_columns_is_a_bad_request(client, admin_headers):
+    response = _upload(client, admin_headers, b'name,address\nx,y\n')
+    assert response.status_code == 400
+    assert 'missing columns' in response.get_json()['message']
@@ -0,0 +1,6 @@
+def test_metrics_content_type_has_one_charset(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    content_type = response.headers['Content-Type']
+    assert content_type.startswith('text/plain; version=0.0.4')
+    assert content_type.count('charset=') == 1
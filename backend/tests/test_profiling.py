@@ -0,0 +1,21 @@
+import pytest
+
+from utils.profiling import _requested_by_admin
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('?__profile=1', True),
+    ('?__profile=true', True),
+    ('?__profile=0', False),
+    ('?__profile=', False),
+    ('?__profile', False),
+    ('', False),
+])
+def test_profile_param_value_is_checked(app, admin_headers, query, expected):
+    with app.test_request_context(f'/api/admin/stats{query}', headers=admin_headers):
+        assert _requested_by_admin() is expected
+
+
+def test_profile_param_needs_an_admin(app):
+    with app.test_request_context('/api/admin/stats?__profile=1'):
+        assert _requested_by_admin() is False
@@ -0,0 +1,96 @@
+"""
+Query budgets for listing endpoints: each is one joined query (plus the
+auth lookups), however many rows it returns. An N+1 loop fails these.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import ParkingLot, ParkingSpot, Reservation, User, db
+from utils.query_stats import assert_max_queries
+
+BOOKINGS_PER_USER = 5
+
+
+def _register(client, username):
+    client.post('/api/user/register', json={
+        'username': username, 'email': f'{username}@example.com', 'password': 'secret123'})
+    response = client.post('/api/user/login', json={'username': username, 'password': 'secret123'})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+@pytest.fixture(scope='module')
+def seeded(app):
+    """Three users with BOOKINGS_PER_USER completed bookings each, spread over two lots"""
+    client = app.test_client()
+    headers = [_register(client, f'budget{i}') for i in range(3)]
+    with app.app_context():
+        lots = [ParkingLot(prime_location_name=f'Budget Lot {i}', address='1 Test St', pin_code='500001',
+                           price=20.0, number_of_spots=BOOKINGS_PER_USER) for i in range(2)]
+        db.session.add_all(lots)
+        db.session.flush()
+        spots = [ParkingSpot(lot_id=lot.id, status='A') for lot in lots for _ in range(BOOKINGS_PER_USER)]
+        db.session.add_all(spots)
+        db.session.flush()
+        started = datetime.utcnow() - timedelta(days=3)
+        for i in range(3):
+            user = User.query.filter_by(username=f'budget{i}').one()
+            for j in range(BOOKINGS_PER_USER):
+                parked = started + timedelta(hours=j)
+                db.session.add(Reservation(
+                    spot_id=spots[(i + j) % len(spots)].id, user_id=user.id, parking_timestamp=parked,
+                    leaving_timestamp=parked + timedelta(hours=1), parking_cost=20.0, price_per_hour=20.0))
+        db.session.commit()
+    return headers
+
+
+def test_user_bookings_query_budget(client, seeded):
+    with assert_max_queries(3):
+        response = client.get('/api/user/bookings', headers=seeded[0])
+    assert response.status_code == 200
+    assert len(response.get_json()) == BOOKINGS_PER_USER
+
+
+def test_user_export_csv_query_budget(client, seeded):
+    with assert_max_queries(3):
+        response = client.get('/api/user/export-csv', headers=seeded[1])
+    assert response.status_code == 200
+    # header row plus one row per booking
+    assert len(response.get_data(as_text=True).strip().splitlines()) == BOOKINGS_PER_USER + 1
+
+
+def test_admin_users_query_budget(client, seeded, admin_headers):
+    with assert_max_queries(3):
+        response = client.get('/api/admin/users?q=budget', headers=admin_headers)
+    assert response.status_code == 200
+    users = response.get_json()
+    assert len(users) == 3
+    assert all(user['total_bookings'] == BOOKINGS_PER_USER for user in users)
+
+
+def test_available_lots_query_budget(client, seeded):
+    with assert_max_queries(3):
+        response = client.get('/api/user/parking-lots/available', headers=seeded[0])
+    assert response.status_code == 200
+    lots = {lot['prime_location_name']: lot for lot in response.get_json()}
+    for i in range(2):
+        assert lots[f'Budget Lot {i}']['available_spots'] == BOOKINGS_PER_USER
+        assert lots[f'Budget Lot {i}']['occupied_spots'] == 0
+
+
+def test_active_booking_query_budget(app, client, seeded):
+    headers = _register(client, 'active_budget')
+    with app.app_context():
+        user = User.query.filter_by(username='active_budget').one()
+        lot = ParkingLot.query.filter_by(prime_location_name='Budget Lot 1').one()
+        db.session.add(Reservation(spot_id=lot.spots[0].id, user_id=user.id, parking_timestamp=datetime.utcnow(),
+                                   price_per_hour=20.0))
+        db.session.commit()
+    # Tighter than the others: the separate reservation, spot and lot lookups took three
+    with assert_max_queries(2):
+        response = client.get('/api/user/active-booking', headers=headers)
+    assert response.status_code == 200
+    booking = response.get_json()
+    assert booking['lot_name'] == 'Budget Lot 1'
+    assert booking['address'] == '1 Test St'
+    assert booking['status'] == 'active'
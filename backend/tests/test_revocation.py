@@ -0,0 +1,40 @@
+import pytest
+
+from utils import revocation
+
+
+def _login(client, username):
+    client.post('/api/user/register', json={
+        'username': username, 'email': f'{username}@example.com', 'password': 'secret123'})
+    response = client.post('/api/user/login', json={'username': username, 'password': 'secret123'})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+def _assert_logout_revokes(client, username):
+    headers = _login(client, username)
+    assert client.get('/api/user/stats', headers=headers).status_code == 200
+    assert client.post('/api/logout', headers=headers).status_code == 200
+    assert client.get('/api/user/stats', headers=headers).status_code == 401
+    # A fresh login is unaffected
+    assert client.get('/api/user/stats', headers=_login(client, username)).status_code == 200
+
+
+def test_logout_revokes_token_without_redis(client, monkeypatch):
+    monkeypatch.setattr(revocation, 'REDIS_AVAILABLE', False)
+    monkeypatch.setattr(revocation, 'redis_client', None)
+    store = revocation.RevocationStore()
+    monkeypatch.setattr(revocation, 'revocation_store', store)
+    _assert_logout_revokes(client, 'revoke_local')
+    assert len(store._local) == 1
+
+
+def test_logout_revokes_token_with_redis(client, monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(revocation, 'REDIS_AVAILABLE', True)
+    monkeypatch.setattr(revocation, 'redis_client', fake)
+    store = revocation.RevocationStore()
+    monkeypatch.setattr(revocation, 'revocation_store', store)
+    _assert_logout_revokes(client, 'revoke_redis')
+    assert not store._local
+    assert len(list(fake.scan_iter(match=f'{revocation.REVOKED_KEY_PREFIX}*'))) == 1
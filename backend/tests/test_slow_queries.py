@@ -0,0 +1,31 @@
+import logging
+import threading
+
+from utils import slow_queries
+from utils.log import _PreparedQueueHandler
+
+
+def test_slow_log_is_set_up_once_across_threads(tmp_path, monkeypatch):
+    logger = logging.getLogger('vpms.slow_queries')
+    monkeypatch.setattr(logger, 'handlers', [])
+    monkeypatch.setattr(slow_queries, '_slow_log', None)
+    monkeypatch.setattr(slow_queries, '_slow_log_handler', None)
+    monkeypatch.setattr(slow_queries.Config, 'SLOW_QUERY_LOG', str(tmp_path / 'slow.log'))
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def start():
+        barrier.wait()
+        results.append(slow_queries._get_slow_log())
+
+    threads = [threading.Thread(target=start) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(map(id, results))) == 1
+    assert len(logger.handlers) == 1
+    assert isinstance(logger.handlers[0], _PreparedQueueHandler)
+    assert slow_queries.get_slow_query_report()['log_dropped'] == 0
@@ -0,0 +1,162 @@
+"""
+Webhook delivery against a local HTTP stub. Each path has a script of
+(status, headers) responses, served in order and then 200; a payload whose
+text contains "reject" gets a 400.
+"""
+import json
+import threading
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils import webhooks
+from utils.webhooks import DIGEST_SEPARATOR, WebhookClient, build_digests, deliver_messages
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.received[self.path].append(payload)
+            script = server.scripts[self.path]
+            status, headers = script.popleft() if script else (200, {})
+        if 'reject' in payload.get('text', ''):
+            status, headers = 400, {}
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.scripts = defaultdict(deque)
+    server.received = defaultdict(list)
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry delays instead of sleeping"""
+    delays = []
+    monkeypatch.setattr(webhooks.time, 'sleep', delays.append)
+    return delays
+
+
+def _client(url, **options):
+    options = {'max_workers': 2, 'timeout': 2, 'max_retries': 3, 'backoff_base': 0.01, 'backoff_max': 0.2, **options}
+    return WebhookClient(url, **options)
+
+
+def test_429_is_retried_after_retry_after(stub, sleeps):
+    stub.scripts['/limited'].extend([(429, {'Retry-After': '0.05'}), (429, {'Retry-After': '0.05'})])
+    client = _client(stub.url + '/limited')
+    try:
+        assert client.post({'text': 'hi'}) is True
+    finally:
+        client.close()
+    assert len(stub.received['/limited']) == 3
+    assert sleeps == [0.05, 0.05]
+
+
+def test_retry_after_is_capped_by_backoff_max(stub, sleeps):
+    stub.scripts['/slow'].append((429, {'Retry-After': '120'}))
+    client = _client(stub.url + '/slow')
+    try:
+        assert client.post({'text': 'hi'}) is True
+    finally:
+        client.close()
+    assert sleeps == [0.2]
+
+
+def test_503_is_retried_then_succeeds(stub, sleeps):
+    stub.scripts['/flaky'].extend([(503, {}), (503, {})])
+    client = _client(stub.url + '/flaky')
+    try:
+        assert client.post({'text': 'hi'}) is True
+    finally:
+        client.close()
+    assert len(stub.received['/flaky']) == 3
+    # Exponential backoff with jitter: within [delay / 2, delay] for delay = base * 2 ** attempt
+    assert 0.005 <= sleeps[0] <= 0.01 and 0.01 <= sleeps[1] <= 0.02
+
+
+def test_gives_up_after_max_retries(stub, sleeps):
+    stub.scripts['/down'].extend([(503, {})] * 5)
+    client = _client(stub.url + '/down', max_retries=2)
+    try:
+        assert client.post({'text': 'hi'}) is False
+    finally:
+        client.close()
+    assert len(stub.received['/down']) == 3
+    assert len(sleeps) == 2
+
+
+def test_400_is_not_retried(stub, sleeps):
+    stub.scripts['/bad'].append((400, {}))
+    client = _client(stub.url + '/bad')
+    try:
+        assert client.post({'text': 'hi'}) is False
+    finally:
+        client.close()
+    assert len(stub.received['/bad']) == 1
+    assert sleeps == []
+
+
+def test_build_digests_respects_size_and_chars():
+    messages = [(i, 'x' * 10) for i in range(5)]
+    assert [keys for keys, _ in build_digests(messages, digest_size=2, max_chars=1000)] == [[0, 1], [2, 3], [4]]
+
+    # Two texts plus one separator fit; a third would not
+    max_chars = 20 + len(DIGEST_SEPARATOR)
+    digests = build_digests(messages, digest_size=10, max_chars=max_chars)
+    assert [keys for keys, _ in digests] == [[0, 1], [2, 3], [4]]
+    assert all(len(text) <= max_chars for _, text in digests)
+    assert digests[0][1] == 'x' * 10 + DIGEST_SEPARATOR + 'x' * 10
+
+    # A single message longer than max_chars still goes out on its own
+    assert build_digests([('long', 'y' * 50), ('short', 'z')], digest_size=10, max_chars=20) == [
+        (['long'], 'y' * 50), (['short'], 'z')]
+
+
+@pytest.fixture
+def fast_config(monkeypatch):
+    monkeypatch.setattr(webhooks.Config, 'WEBHOOK_BACKOFF_BASE', 0.01)
+    monkeypatch.setattr(webhooks.Config, 'WEBHOOK_BACKOFF_MAX', 0.2)
+    monkeypatch.setattr(webhooks, '_clients', {})
+    monkeypatch.setattr(webhooks, '_clients_pid', None)
+    yield
+    for client in webhooks._clients.values():
+        client.close()
+
+
+def test_deliver_messages_returns_only_delivered_keys(stub, sleeps, fast_config):
+    stub.scripts['/chat'].append((503, {}))
+    messages = [('a', 'hello a'), ('b', 'reject b'), ('c', 'hello c')]
+    delivered = deliver_messages(stub.url + '/chat', messages, digest=False)
+    assert sorted(delivered) == ['a', 'c']
+    texts = [payload['text'] for payload in stub.received['/chat']]
+    assert texts.count('reject b') == 1
+
+
+def test_deliver_messages_digest_reports_keys_per_post(stub, sleeps, fast_config, monkeypatch):
+    monkeypatch.setattr(webhooks.Config, 'WEBHOOK_DIGEST_SIZE', 2)
+    messages = [('a', 'hello a'), ('b', 'hello b'), ('c', 'reject c'), ('d', 'hello d'), ('e', 'hello e')]
+    delivered = deliver_messages(stub.url + '/digest', messages)
+    assert sorted(delivered) == ['a', 'b', 'e']
+    assert len(stub.received['/digest']) == 3
+    assert sleeps == []
@@ -0,0 +1,123 @@
+"""
+Reservation archive
+
+archive_completed() moves reservations that were completed more than
+ARCHIVE_HORIZON_DAYS ago from reservations into reservations_archive, one
+INSERT ... SELECT and one DELETE per batch of ids in a single transaction,
+so the active table (and its indexes) only holds open sessions and recent
+history. Ids are kept; the reservation with the highest id is never moved,
+so SQLite cannot hand its id out again.
+
+Paths that show a user's full history (bookings, CSV exports, monthly
+reports, counter reconciliation, the admin users listing) read through
+history_subquery(), a UNION ALL of both tables with the filter pushed into
+each side so each uses its own indexes. reservation_history() selects it as
+transient Reservation objects: archived rows have no row in reservations,
+so they must never enter the session's identity map.
+"""
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, literal, select, union_all
+from sqlalchemy.orm import Bundle
+from config import Config
+from database import Reservation, ReservationArchive, db
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+reservations = Reservation.__table__
+archive = ReservationArchive.__table__
+
+HISTORY_COLUMNS = tuple(column.name for column in reservations.columns)
+
+RESERVATIONS_ARCHIVED_TOTAL = registry.counter(
+    'vpms_reservations_archived_total', 'Completed reservations moved to reservations_archive')
+
+
+# ----------------- READING -----------------
+
+def history_subquery(where=None):
+    """
+    UNION ALL of active and archived reservations as a subquery with the
+    reservations columns; where(table) returns the criteria for one side
+    """
+    parts = []
+    for table in (reservations, archive):
+        part = select(*(table.c[name] for name in HISTORY_COLUMNS))
+        if where is not None:
+            part = part.where(*where(table))
+        parts.append(part)
+    return union_all(*parts).subquery('reservation_history')
+
+
+class HistoryBundle(Bundle):
+    """Loads each row as a transient Reservation, outside the session"""
+
+    def create_row_processor(self, query, procs, labels):
+        def proc(row):
+            return Reservation(**dict(zip(labels, (p(row) for p in procs))))
+        return proc
+
+
+def reservation_history(where=None):
+    """
+    Bundle of the history_subquery(where) columns, used in place of
+    Reservation in queries (columns are history.c.<name>); rows load as
+    read-only Reservation objects that are not part of the session
+    """
+    subquery = history_subquery(where)
+    # single_entity: queried alone, it yields objects rather than 1-tuples, like an entity
+    return HistoryBundle('reservation_history', *subquery.c, single_entity=True)
+
+
+# ----------------- ARCHIVING -----------------
+
+def _batch_ids(cutoff, batch_size):
+    newest_id = select(func.max(reservations.c.id)).scalar_subquery()
+    return db.session.execute(
+        select(reservations.c.id)
+        .where(
+            reservations.c.leaving_timestamp.isnot(None),
+            reservations.c.leaving_timestamp < cutoff,
+            reservations.c.id < newest_id
+        )
+        .order_by(reservations.c.id)
+        .limit(batch_size)
+    ).scalars().all()
+
+
+def archive_completed(horizon_days=None, batch_size=None, max_batches=None, now=None):
+    """
+    Move reservations completed before now - horizon_days to the archive in
+    batches of batch_size ids, committing after each; returns a summary dict
+    """
+    now = now or datetime.utcnow()
+    horizon_days = horizon_days if horizon_days is not None else Config.ARCHIVE_HORIZON_DAYS
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+    max_batches = max_batches or Config.ARCHIVE_MAX_BATCHES
+    cutoff = now - timedelta(days=horizon_days)
+
+    archived = batches = 0
+    while batches < max_batches:
+        ids = _batch_ids(cutoff, batch_size)
+        if not ids:
+            break
+        db.session.execute(
+            insert(archive).from_select(
+                HISTORY_COLUMNS + ('archived_at',),
+                select(*(reservations.c[name] for name in HISTORY_COLUMNS), literal(now, archive.c.archived_at.type))
+                .where(reservations.c.id.in_(ids))
+            )
+        )
+        result = db.session.execute(delete(reservations).where(reservations.c.id.in_(ids)))
+        db.session.commit()
+        archived += result.rowcount
+        batches += 1
+        RESERVATIONS_ARCHIVED_TOTAL.inc(amount=result.rowcount)
+        if len(ids) < batch_size:
+            break
+
+    if archived:
+        logger.info("Archived %d reservations completed before %s in %d batches",
+                    archived, cutoff.isoformat(), batches)
+    return {'archived': archived, 'batches': batches, 'cutoff': cutoff.isoformat()}
@@ -1,24 +1,45 @@
-from extensions import redis_client, REDIS_AVAILABLE
-import json
+from flask import g, has_request_context
+from extensions import redis_client, redis_binary_client, REDIS_AVAILABLE
+from utils.metrics import CACHE_REQUESTS_TOTAL, CACHE_VALUE_SIZE
+from utils.cache_codec import encode, decode
+import re
+
+_ID_PATTERN = re.compile(r'\d+')
+
+def key_family(key):
+    """Collapse ids in a cache key, e.g. user_12_bookings -> user_{id}_bookings"""
+    return _ID_PATTERN.sub('{id}', key)
+
+def _mark_request(flag):
+    """Tell the compression hook this response is built from cached data"""
+    if has_request_context():
+        setattr(g, flag, True)
 
 def get_cached(key):
     """Get value from cache"""
-    if not REDIS_AVAILABLE or not redis_client:
+    if not REDIS_AVAILABLE or not redis_binary_client:
         return None
     try:
-        value = redis_client.get(key)
+        value = redis_binary_client.get(key)
         if value:
-            return json.loads(value)
+            CACHE_REQUESTS_TOTAL.inc((key_family(key), 'hit'))
+            _mark_request('cache_hit')
+            return decode(value)
+        CACHE_REQUESTS_TOTAL.inc((key_family(key), 'miss'))
         return None
     except Exception:
+        CACHE_REQUESTS_TOTAL.inc((key_family(key), 'error'))
         return None
 
 def set_cached(key, value, timeout=300):
-    """Set value in cache with timeout (seconds)"""
-    if not REDIS_AVAILABLE or not redis_client:
+    """Set value in cache with timeout (seconds), in the compact cache_codec encoding"""
+    if not REDIS_AVAILABLE or not redis_binary_client:
         return False
     try:
-        redis_client.setex(key, timeout, json.dumps(value))
+        encoded = encode(value)
+        redis_binary_client.setex(key, timeout, encoded)
+        CACHE_VALUE_SIZE.observe(len(encoded), (key_family(key),))
+        _mark_request('cache_fill')
         return True
     except Exception:
         return False
@@ -33,6 +54,25 @@ def delete_cached(key):
     except Exception:
         return False
 
+def delete_cached_many(keys):
+    """Delete several keys in a single round trip"""
+    if not REDIS_AVAILABLE or not redis_client or not keys:
+        return False
+    try:
+        redis_client.delete(*keys)
+        return True
+    except Exception:
+        return False
+
+def booking_cache_keys(user_ids=(), lot_ids=()):
+    """Cache keys made stale by reservation changes for the given users and lots"""
+    keys = ['available_lots', 'admin_stats', 'all_users_with_stats', 'all_parking_lots']
+    for user_id in user_ids:
+        keys.append(f'user_{user_id}_bookings')
+    for lot_id in lot_ids:
+        keys.append(f'lot_{lot_id}_spots')
+    return keys
+
 def cache_response(timeout=300):
     """Decorator to cache API responses"""
     def decorator(f):
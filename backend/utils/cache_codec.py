@@ -0,0 +1,150 @@
+"""
+Compact encoding for cached values
+
+Values are serialized with msgpack (JSON when msgpack is not installed).
+Lists of non-empty dicts that share the same keys, such as the user, booking
+and spot listings, are packed by column: the keys are written once, followed
+by one array per key. Encodings above CACHE_COMPRESS_MIN_SIZE bytes are also
+compressed with lz4 or zlib.
+
+The first byte of every stored value is a header:
+
+    0x80 | compression << 4 | serializer
+
+Serializers: 1 = JSON, 2 = msgpack. Compression: 0 = none, 1 = zlib,
+2 = lz4. A JSON document never starts with a byte >= 0x80, so values written
+before this codec existed (plain JSON text) are still read.
+"""
+import zlib
+from datetime import date, datetime
+from config import Config
+from utils.json_provider import dumps_bytes, loads, encode_default
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON serializer
+    msgpack = None
+
+try:
+    import lz4.frame
+except ImportError:  # optional: zlib only
+    lz4 = None
+
+HEADER_FLAG = 0x80
+
+SERIALIZER_JSON = 1
+SERIALIZER_MSGPACK = 2
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+
+COMPRESSION_NAMES = {'none': COMPRESSION_NONE, 'zlib': COMPRESSION_ZLIB, 'lz4': COMPRESSION_LZ4}
+
+# msgpack extension type of a column-packed list of dicts
+COLUMNS_EXT = 1
+COLUMNAR_MIN_ROWS = 2
+
+_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+
+
+# ----------------- COLUMN PACKING -----------------
+
+def _same_keys(rows):
+    """True when every row is a dict with the first row's (non-empty) set of keys"""
+    keys = rows[0].keys()
+    # Rows without keys would pack to zero columns, which unpack to zero rows
+    return bool(keys) and all(isinstance(row, dict) and row.keys() == keys for row in rows)
+
+
+def _prepare(value):
+    """
+    Copy of value with homogeneous lists of dicts replaced by COLUMNS_EXT
+    extension objects, and datetimes in the ISO form JSON would give them
+    """
+    if isinstance(value, dict):
+        return {key: _prepare(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if len(value) >= COLUMNAR_MIN_ROWS and isinstance(value[0], dict) and _same_keys(value):
+            keys = list(value[0])
+            columns = [[item if type(item) in _SCALAR_TYPES else _prepare(item)
+                        for item in [row[key] for row in value]] for key in keys]
+            return msgpack.ExtType(COLUMNS_EXT, _pack_prepared([keys, columns]))
+        return [_prepare(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _pack_prepared(value):
+    return msgpack.packb(value, default=encode_default, use_bin_type=True)
+
+
+def _packb(value):
+    return _pack_prepared(_prepare(value))
+
+
+def _ext_hook(code, data):
+    if code == COLUMNS_EXT:
+        keys, columns = _unpackb(data)
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+    return msgpack.ExtType(code, data)
+
+
+def _unpackb(data):
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+# ----------------- ENCODE / DECODE -----------------
+
+def _compression():
+    compression = COMPRESSION_NAMES.get(Config.CACHE_COMPRESSION.lower(), COMPRESSION_ZLIB)
+    if compression == COMPRESSION_LZ4 and lz4 is None:
+        return COMPRESSION_ZLIB
+    return compression
+
+
+def _serializer():
+    if Config.CACHE_CODEC.lower() == 'msgpack' and msgpack is not None:
+        return SERIALIZER_MSGPACK
+    return SERIALIZER_JSON
+
+
+def encode(value):
+    """Header byte plus the serialized (and, if large enough, compressed) value"""
+    serializer = _serializer()
+    body = _packb(value) if serializer == SERIALIZER_MSGPACK else dumps_bytes(value)
+    compression = COMPRESSION_NONE
+    if len(body) >= Config.CACHE_COMPRESS_MIN_SIZE:
+        compression = _compression()
+        if compression == COMPRESSION_LZ4:
+            compressed = lz4.frame.compress(body)
+        elif compression == COMPRESSION_ZLIB:
+            compressed = zlib.compress(body, 6)
+        else:
+            compressed = body
+        if len(compressed) < len(body):
+            body = compressed
+        else:
+            compression = COMPRESSION_NONE
+    return bytes((HEADER_FLAG | compression << 4 | serializer,)) + body
+
+
+def decode(data):
+    """Inverse of encode(); plain JSON values from before the codec are accepted"""
+    if not data or data[0] < HEADER_FLAG:
+        return loads(data)
+    header = data[0]
+    serializer, compression = header & 0x0F, (header >> 4) & 0x07
+    body = memoryview(data)[1:]
+    if compression == COMPRESSION_ZLIB:
+        body = zlib.decompress(body)
+    elif compression == COMPRESSION_LZ4:
+        body = lz4.frame.decompress(body)
+    elif compression != COMPRESSION_NONE:
+        raise ValueError(f'Unknown cache compression {compression}')
+    if serializer == SERIALIZER_MSGPACK:
+        return _unpackb(body)
+    if serializer == SERIALIZER_JSON:
+        return loads(bytes(body))
+    raise ValueError(f'Unknown cache serializer {serializer}')
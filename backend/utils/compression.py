@@ -0,0 +1,141 @@
+"""
+Negotiated response compression
+
+An after_request hook compresses JSON, CSV and other text bodies with brotli
+(when the optional Brotli package is installed) or gzip, whichever the
+client's Accept-Encoding prefers. Small bodies, bodies that already carry a
+Content-Encoding and streamed responses (files sent from disk) are left
+alone.
+
+Responses built from a cache hit are usually byte-identical between
+requests, so their compressed variants are stored in Redis keyed by a hash of
+the uncompressed body (content-addressed): a cache hit then serves the stored
+variant instead of recompressing.
+"""
+import gzip
+import hashlib
+from flask import g, request
+from config import Config
+from extensions import redis_binary_client, REDIS_AVAILABLE
+from utils.metrics import registry
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+VARIANT_KEY_PREFIX = 'respz:'
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+})
+
+HTTP_COMPRESSED_RESPONSES = registry.counter(
+    'vpms_http_compressed_responses_total', 'Compressed responses by encoding and variant source',
+    ('encoding', 'source'))
+HTTP_COMPRESSION_SAVED_BYTES = registry.counter(
+    'vpms_http_compression_saved_bytes_total', 'Bytes saved by response compression', ('encoding',))
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick 'br' or 'gzip' from an Accept-Encoding header (None = identity)"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    best, best_q = None, 0.0
+    for coding in supported_encodings():  # server preference breaks ties
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=Config.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=Config.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _is_compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def _variant_key(body, encoding):
+    return f'{VARIANT_KEY_PREFIX}{encoding}:{hashlib.blake2b(body, digest_size=16).hexdigest()}'
+
+
+def _compressed_variant(body, encoding):
+    """Compressed body and where it came from ('store' or 'fresh')"""
+    # Only responses served from (or just written to) the cache repeat exactly
+    reusable = g.get('cache_hit') or g.get('cache_fill')
+    if not (reusable and REDIS_AVAILABLE and redis_binary_client):
+        return compress(body, encoding), 'fresh'
+    key = _variant_key(body, encoding)
+    try:
+        stored = redis_binary_client.get(key)
+        if stored is not None:
+            redis_binary_client.expire(key, Config.COMPRESSION_VARIANT_TTL)
+            return stored, 'store'
+    except Exception:
+        return compress(body, encoding), 'fresh'
+    compressed = compress(body, encoding)
+    try:
+        redis_binary_client.setex(key, Config.COMPRESSION_VARIANT_TTL, compressed)
+    except Exception:
+        pass
+    return compressed, 'fresh'
+
+
+def compress_response(response):
+    """after_request hook"""
+    if response.direct_passthrough or response.is_streamed or not _is_compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers or request.method == 'HEAD'):
+        return response
+
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < Config.COMPRESSION_MIN_SIZE:
+        return response
+
+    compressed, source = _compressed_variant(body, encoding)
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if response.headers.get('ETag'):
+        # Same entity, different bytes
+        response.headers['ETag'] = response.headers['ETag'].rstrip('"') + f'-{encoding}"'
+    HTTP_COMPRESSED_RESPONSES.inc((encoding, source))
+    HTTP_COMPRESSION_SAVED_BYTES.inc((encoding,), len(body) - len(compressed))
+    return response
+
+
+def init_compression(app):
+    """Register the compression hook (no-op when COMPRESSION_ENABLED is off)"""
+    if not Config.COMPRESSION_ENABLED:
+        return
+    app.after_request(compress_response)
@@ -0,0 +1,220 @@
+"""
+SQLite maintenance: planner statistics, incremental vacuum and online backup
+
+The steps share one autocommit sqlite3 connection to the database file,
+outside the app's pools, so none of them holds a long transaction:
+
+- analyze: ANALYZE limited to DB_ANALYZE_LIMIT rows per index
+  (PRAGMA analysis_limit), then PRAGMA optimize.
+- vacuum: PRAGMA incremental_vacuum(DB_VACUUM_BATCH_PAGES) repeated until
+  the freelist is empty or DB_VACUUM_MAX_PAGES pages were reclaimed. Needs
+  auto_vacuum=INCREMENTAL, which init_db sets on new databases. An existing
+  file needs one full VACUUM, which rewrites it under an exclusive lock:
+  run `flask db-convert-incremental` in a maintenance window (or set
+  DB_VACUUM_CONVERT to let the nightly run do it).
+- backup: the SQLite online backup API copies DB_BACKUP_PAGES_PER_STEP
+  pages per step and sleeps DB_BACKUP_STEP_PAUSE seconds between steps, so
+  writers get the file in between. The copy is written next to its final
+  name and renamed when complete; the newest DB_BACKUP_KEEP copies are kept.
+"""
+import glob
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from config import Config
+from database import DATABASE_PATH
+from utils.metrics import DEFAULT_TASK_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+AUTO_VACUUM_INCREMENTAL = 2
+
+BACKUP_PREFIX = 'vpms-'
+
+DB_MAINTENANCE_DURATION = registry.histogram(
+    'vpms_db_maintenance_duration_seconds', 'Database maintenance step run time', ('step',), DEFAULT_TASK_BUCKETS)
+DB_VACUUM_RECLAIMED_PAGES = registry.counter(
+    'vpms_db_vacuum_reclaimed_pages_total', 'Free pages returned to the filesystem by incremental vacuum')
+
+
+def connect():
+    """Autocommit connection to the database file for maintenance statements"""
+    return sqlite3.connect(DATABASE_PATH, timeout=Config.DB_MAINTENANCE_BUSY_TIMEOUT, isolation_level=None)
+
+
+def _pragma(conn, name):
+    return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def file_stats(conn):
+    """Page size and counts of the database file"""
+    page_size = _pragma(conn, 'page_size')
+    page_count = _pragma(conn, 'page_count')
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': _pragma(conn, 'freelist_count'),
+        'size_bytes': page_size * page_count,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(_pragma(conn, 'auto_vacuum'), 'unknown')
+    }
+
+
+# ----------------- STEPS -----------------
+
+def analyze(conn):
+    """Refresh the query planner statistics"""
+    started = time.perf_counter()
+    conn.execute(f'PRAGMA analysis_limit={int(Config.DB_ANALYZE_LIMIT)}')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    seconds = time.perf_counter() - started
+    DB_MAINTENANCE_DURATION.observe(seconds, ('analyze',))
+    return {'seconds': round(seconds, 3)}
+
+
+def convert_to_incremental(conn):
+    """
+    Switch the file to auto_vacuum=INCREMENTAL with one full VACUUM; returns
+    the free pages dropped, or None when it already was incremental
+    """
+    if _pragma(conn, 'auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+        return None
+    # auto_vacuum only changes on a VACUUM; this also drops every free page
+    freed = _pragma(conn, 'freelist_count')
+    conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    conn.execute('VACUUM')
+    logger.info("Converted %s to auto_vacuum=INCREMENTAL", DATABASE_PATH)
+    return freed
+
+
+def incremental_vacuum(conn, max_pages=None, batch_pages=None):
+    """
+    Return free pages to the filesystem in batches of batch_pages, at most
+    max_pages per run; a file that is not auto_vacuum=INCREMENTAL is skipped
+    unless DB_VACUUM_CONVERT allows converting it here
+    """
+    max_pages = max_pages or Config.DB_VACUUM_MAX_PAGES
+    batch_pages = batch_pages or Config.DB_VACUUM_BATCH_PAGES
+    started = time.perf_counter()
+    summary = {'converted': False, 'reclaimed_pages': 0, 'batches': 0}
+
+    if _pragma(conn, 'auto_vacuum') != AUTO_VACUUM_INCREMENTAL:
+        if not Config.DB_VACUUM_CONVERT:
+            summary['skipped'] = 'auto_vacuum is not incremental; run flask db-convert-incremental'
+            return summary
+        summary.update(converted=True, reclaimed_pages=convert_to_incremental(conn))
+    else:
+        while summary['reclaimed_pages'] < max_pages:
+            free = _pragma(conn, 'freelist_count')
+            if not free:
+                break
+            pages = min(batch_pages, free, max_pages - summary['reclaimed_pages'])
+            # executescript steps the pragma to completion (execute() frees one page)
+            conn.executescript(f'PRAGMA incremental_vacuum({pages})')
+            reclaimed = free - _pragma(conn, 'freelist_count')
+            if reclaimed <= 0:
+                break
+            summary['reclaimed_pages'] += reclaimed
+            summary['batches'] += 1
+
+    seconds = time.perf_counter() - started
+    DB_MAINTENANCE_DURATION.observe(seconds, ('vacuum',))
+    DB_VACUUM_RECLAIMED_PAGES.inc(amount=summary['reclaimed_pages'])
+    summary['seconds'] = round(seconds, 3)
+    return summary
+
+
+def _prune_backups(backup_dir, keep):
+    backups = sorted(glob.glob(os.path.join(backup_dir, f'{BACKUP_PREFIX}*.db')))
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return len(removed)
+
+
+def backup(conn, backup_dir=None, pages_per_step=None, step_pause=None, keep=None, now=None):
+    """Copy the database to backup_dir with the online backup API, in steps"""
+    backup_dir = backup_dir or Config.DB_BACKUP_DIR
+    pages_per_step = pages_per_step or Config.DB_BACKUP_PAGES_PER_STEP
+    step_pause = Config.DB_BACKUP_STEP_PAUSE if step_pause is None else step_pause
+    keep = Config.DB_BACKUP_KEEP if keep is None else keep
+    now = now or datetime.utcnow()
+
+    os.makedirs(backup_dir, exist_ok=True)
+    # Microseconds keep two runs in the same second from sharing a file name
+    path = os.path.join(backup_dir, f'{BACKUP_PREFIX}{now.strftime("%Y%m%d-%H%M%S-%f")}.db')
+    partial = path + '.part'
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if remaining and step_pause:
+            time.sleep(step_pause)
+
+    started = time.perf_counter()
+    target = sqlite3.connect(partial)
+    try:
+        conn.backup(target, pages=pages_per_step, progress=progress)
+    except Exception:
+        target.close()
+        os.remove(partial)
+        raise
+    target.close()
+    os.replace(partial, path)
+    seconds = time.perf_counter() - started
+    DB_MAINTENANCE_DURATION.observe(seconds, ('backup',))
+    return {
+        'path': path,
+        'size_bytes': os.path.getsize(path),
+        'steps': steps,
+        'pruned': _prune_backups(backup_dir, keep),
+        'seconds': round(seconds, 3)
+    }
+
+
+# ----------------- RUN -----------------
+
+def run_maintenance(analyze_db=True, vacuum=True, backup_db=True):
+    """Run the enabled steps in order (backup last, of the compacted file); returns a summary dict"""
+    conn = connect()
+    try:
+        summary = {'before': file_stats(conn)}
+        if analyze_db:
+            summary['analyze'] = analyze(conn)
+        if vacuum:
+            summary['vacuum'] = incremental_vacuum(conn)
+        if backup_db:
+            summary['backup'] = backup(conn)
+        summary['after'] = file_stats(conn)
+    finally:
+        conn.close()
+    logger.info(
+        "Database maintenance: %d -> %d pages, %d reclaimed",
+        summary['before']['page_count'], summary['after']['page_count'],
+        summary.get('vacuum', {}).get('reclaimed_pages', 0)
+    )
+    return summary
+
+
+def init_db_maintenance_cli(app):
+    """Register `flask db-convert-incremental`"""
+    import click
+
+    @app.cli.command('db-convert-incremental')
+    def convert_command():
+        """Convert the database to auto_vacuum=INCREMENTAL (full VACUUM; run in a maintenance window)"""
+        conn = connect()
+        try:
+            freed = convert_to_incremental(conn)
+            stats = file_stats(conn)
+        finally:
+            conn.close()
+        if freed is None:
+            click.echo('auto_vacuum is already incremental')
+        else:
+            click.echo(f"Converted to auto_vacuum=INCREMENTAL; dropped {freed} free pages, "
+                       f"{stats['page_count']} pages now")
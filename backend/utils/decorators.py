@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import jsonify
+from flask import g, jsonify
 from flask_jwt_extended import get_jwt
 
 def admin_required(f):
@@ -23,5 +23,17 @@ def user_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-
-
+def read_only(f):
+    """
+    Decorator to run a route (or task) against the read-only database engine;
+    writes inside it still go to the primary
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        previous = g.get('db_read_only', False)
+        g.db_read_only = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.db_read_only = previous
+    return decorated_function
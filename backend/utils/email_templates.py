@@ -0,0 +1,153 @@
+"""
+Email templates
+
+Templates live in templates/email/ and are compiled once per process by
+Jinja2. Compilation also does the expensive parts: the template's <style>
+block is inlined into style="" attributes (mail clients ignore <head> CSS),
+and a plain-text variant is derived from the same HTML source. Rendering a
+message for one recipient then only substitutes variables.
+
+Inlining is done by css-inline, so any selector it supports may be used.
+"""
+import html
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email import encoders
+import css_inline
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, TemplateNotFound
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'email')
+
+RenderedEmail = namedtuple('RenderedEmail', ['html', 'text'])
+
+# Jinja tags are swapped for these placeholders while the HTML is inlined
+_JINJA_TAG = re.compile(r'\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\}', re.DOTALL)
+_JINJA_PLACEHOLDER = re.compile(r'__jinja_(\d+)__')
+
+_inliner = css_inline.CSSInliner(keep_style_tags=False, load_remote_stylesheets=False)
+
+
+# ----------------- CSS INLINING -----------------
+
+def inline_css(source):
+    """
+    Move the rules of every <style> block into matching elements' style
+    attributes. The HTML parser would escape or move Jinja syntax, so tags
+    are replaced by placeholders first (keep them out of table-row context,
+    where an HTML5 parser relocates stray text).
+    """
+    tags = []
+
+    def shield(match):
+        tags.append(match.group(0))
+        return f'__jinja_{len(tags) - 1}__'
+
+    inlined = _inliner.inline(_JINJA_TAG.sub(shield, source))
+    return _JINJA_PLACEHOLDER.sub(lambda match: tags[int(match.group(1))], inlined)
+
+
+# ----------------- PLAIN-TEXT VARIANT -----------------
+
+def html_to_text_source(source):
+    """Derive a plain-text template from an HTML template (Jinja tags are kept)"""
+    text = re.sub(r'<head[^>]*>.*?</head>', '', source, flags=re.DOTALL | re.IGNORECASE)
+    text = re.sub(r'<!DOCTYPE[^>]*>', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'<a\s[^>]*href="(?!#)([^"]+)"[^>]*>(.*?)</a>', r'\2 (\1)', text, flags=re.DOTALL | re.IGNORECASE)
+    text = re.sub(r'^[ \t]*<li[^>]*>', '- ', text, flags=re.IGNORECASE | re.MULTILINE)
+    text = re.sub(r'<li[^>]*>', '\n- ', text, flags=re.IGNORECASE)
+    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'</(p|div|h[1-6]|tr|ul|table)>', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'</td>', ' ', text, flags=re.IGNORECASE)
+    text = re.sub(r'<[^>]+>', '', text)
+    text = html.unescape(text)
+    lines = [' '.join(line.split()) for line in text.splitlines()]
+    text = '\n'.join(lines)
+    return re.sub(r'\n{3,}', '\n\n', text).strip() + '\n'
+
+
+# ----------------- LOADING / RENDERING -----------------
+
+class EmailTemplateLoader(FileSystemLoader):
+    """
+    Serves 'name.html' with CSS inlined, and 'name.txt' derived from
+    'name.html' when no hand-written text template exists
+    """
+
+    def get_source(self, environment, template):
+        if template.endswith('.txt'):
+            try:
+                return super().get_source(environment, template)
+            except TemplateNotFound:
+                source, filename, uptodate = super().get_source(environment, template[:-4] + '.html')
+                return html_to_text_source(source), filename, uptodate
+        source, filename, uptodate = super().get_source(environment, template)
+        if template.endswith('.html'):
+            source = inline_css(source)
+        return source, filename, uptodate
+
+
+_environment = None
+_environment_lock = threading.Lock()
+
+
+def get_environment():
+    """Jinja environment with an unbounded template cache (compiled once per process)"""
+    global _environment
+    if _environment is None:
+        with _environment_lock:
+            if _environment is None:
+                _environment = Environment(
+                    loader=EmailTemplateLoader(TEMPLATE_DIR),
+                    autoescape=lambda name: bool(name and name.endswith('.html')),
+                    undefined=StrictUndefined,
+                    trim_blocks=True,
+                    lstrip_blocks=True,
+                    cache_size=-1,
+                    auto_reload=False
+                )
+    return _environment
+
+
+def render_email(name, **context):
+    """Render templates/email/<name>.html and its plain-text variant"""
+    environment = get_environment()
+    return RenderedEmail(
+        html=environment.get_template(f'{name}.html').render(**context),
+        text=environment.get_template(f'{name}.txt').render(**context)
+    )
+
+
+def build_message(name, subject, sender, recipient, attachments=(), **context):
+    """
+    MIME message with text and HTML alternatives rendered from one template.
+    attachments: (filename, mime subtype, bytes) tuples, sent as text/<subtype>
+    """
+    rendered = render_email(name, **context)
+    alternative = MIMEMultipart('alternative')
+    alternative.attach(MIMEText(rendered.text, 'plain', 'utf-8'))
+    alternative.attach(MIMEText(rendered.html, 'html', 'utf-8'))
+
+    if attachments:
+        msg = MIMEMultipart('mixed')
+        msg.attach(alternative)
+        for filename, subtype, payload in attachments:
+            part = MIMEBase('text', subtype)
+            part.set_payload(payload)
+            encoders.encode_base64(part)
+            part.add_header('Content-Disposition', 'attachment', filename=filename)
+            msg.attach(part)
+    else:
+        msg = alternative
+
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient
+    return msg
@@ -0,0 +1,123 @@
+"""
+Password hashing service
+
+Hashing and verification run in a bounded process pool so that login and
+registration requests do not pin the web thread (and the GIL) for the whole
+key-derivation time. The algorithm and cost come from config, and stored
+hashes that use older parameters are flagged for rehash on the next login.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from config import Config
+from utils.metrics import registry
+
+# Werkzeug's scrypt defaults, used to normalise a bare 'scrypt' method
+DEFAULT_SCRYPT_PARAMS = '32768:8:1'
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+PASSWORD_HASH_DURATION = registry.histogram(
+    'vpms_password_hash_duration_seconds', 'Password hash/verify latency including pool wait', ('operation',))
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'hash': {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0},
+    'verify': {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0},
+}
+
+
+def normalize_method(method):
+    """Expand a method string to the exact prefix Werkzeug stores in the hash"""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        if len(parts) == 1:
+            parts.append('sha256')
+        if len(parts) == 2:
+            parts.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    elif parts[0] == 'scrypt' and len(parts) == 1:
+        parts.extend(DEFAULT_SCRYPT_PARAMS.split(':'))
+    return ':'.join(parts)
+
+
+def _get_executor():
+    """Return the process pool, creating it lazily (once per process, fork-safe)"""
+    global _executor, _executor_pid
+    if Config.PASSWORD_HASH_WORKERS <= 0:
+        return None
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ProcessPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS)
+                _executor_pid = pid
+    return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def _run(operation, func, *args):
+    """Run func in the pool (inline if the pool is disabled or broken) and time it"""
+    start = time.perf_counter()
+    try:
+        executor = _get_executor()
+        if executor is None:
+            result = func(*args)
+        else:
+            try:
+                result = executor.submit(func, *args).result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+            except BrokenProcessPool:
+                _reset_executor()
+                result = func(*args)
+    finally:
+        _record(operation, time.perf_counter() - start)
+    return result
+
+
+def _record(operation, elapsed):
+    PASSWORD_HASH_DURATION.observe(elapsed, (operation,))
+    with _metrics_lock:
+        stats = _metrics[operation]
+        stats['count'] += 1
+        stats['total_seconds'] += elapsed
+        if elapsed > stats['max_seconds']:
+            stats['max_seconds'] = elapsed
+
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return _run('hash', generate_password_hash, password, normalize_method(Config.PASSWORD_HASH_METHOD))
+
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash"""
+    return _run('verify', check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True if the stored hash was produced with different method/cost parameters"""
+    stored_method = password_hash.split('$', 1)[0]
+    return stored_method != normalize_method(Config.PASSWORD_HASH_METHOD)
+
+
+def get_hash_metrics():
+    """Snapshot of hashing latency metrics"""
+    with _metrics_lock:
+        snapshot = {}
+        for operation, stats in _metrics.items():
+            count = stats['count']
+            snapshot[operation] = {
+                'count': count,
+                'avg_ms': round(stats['total_seconds'] / count * 1000, 2) if count else 0.0,
+                'max_ms': round(stats['max_seconds'] * 1000, 2)
+            }
+        return snapshot
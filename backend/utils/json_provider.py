@@ -0,0 +1,93 @@
+"""
+Fast JSON encoding
+
+FastJSONProvider replaces Flask's default JSON provider, and dumps/loads are
+used by the cache layer. Both use orjson when it is installed and fall back
+to the standard library otherwise, with the same output: keys sorted (so
+cached bodies are byte-identical between requests), UTF-8 text left
+unescaped, and datetimes, dates and times written natively in ISO 8601 -
+models return them as datetime objects and never format them by hand.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: standard library fallback
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def encode_default(obj):
+    """Types neither encoder handles natively (orjson covers datetimes, UUIDs and dataclasses itself)"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def backend_name():
+    return 'orjson' if orjson is not None else 'json'
+
+
+def dumps_bytes(obj):
+    """Serialize obj to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=encode_default, sort_keys=True, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj):
+    """Serialize obj to a compact JSON string"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS).decode('utf-8')
+    return json.dumps(obj, default=encode_default, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(s):
+    """Deserialize JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by dumps/loads above. Calls passing stdlib
+    options (indent, cls, ...) are honoured through the standard library.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', encode_default)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Register FastJSONProvider as the app's JSON provider"""
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,67 @@
+"""
+Distributed locks in Redis
+
+A lock is a key set with NX and an expiry, holding a random token. Only the
+holder of the token can release it (compare-and-delete in a Lua script), and
+a holder that dies simply lets the key expire.
+"""
+import logging
+import uuid
+from config import Config
+from extensions import redis_client, REDIS_AVAILABLE
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY_PREFIX = 'lock:'
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock:
+    """
+    Token-based, auto-expiring lock. Usable as a context manager that yields
+    whether the lock was acquired:
+
+        with RedisLock('tasks.sweep_overstays') as acquired:
+            if not acquired:
+                return
+    """
+
+    def __init__(self, name, ttl=None):
+        self.key = f'{LOCK_KEY_PREFIX}{name}'
+        self.ttl = ttl or Config.TASK_LOCK_TTL
+        self.token = None
+
+    def acquire(self):
+        if not (REDIS_AVAILABLE and redis_client):
+            # Single-node setups without Redis have nobody to race with
+            return True
+        token = uuid.uuid4().hex
+        if redis_client.set(self.key, token, nx=True, ex=self.ttl):
+            self.token = token
+            return True
+        return False
+
+    def release(self):
+        """Delete the key only if it still holds our token"""
+        if self.token is None:
+            return False
+        token, self.token = self.token, None
+        try:
+            return bool(redis_client.eval(_RELEASE_SCRIPT, 1, self.key, token))
+        except Exception as e:
+            # The key expires on its own
+            logger.warning("Could not release %s: %s", self.key, e)
+            return False
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
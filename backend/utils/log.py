@@ -0,0 +1,181 @@
+"""
+Structured, non-blocking logging
+
+Records are emitted as JSON lines carrying request id, route, user id and
+(for access logs) latency. Loggers only enqueue records through a
+QueueHandler; a QueueListener thread does the formatting and stream I/O, so a
+burst of errors never blocks request threads on stdout. Repeated error
+messages are rate limited per (logger, message template), and levels can be
+set per module with LOG_LEVELS, e.g. "routes=DEBUG,sqlalchemy.engine=WARNING".
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from config import Config
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+_listener = None
+_configured_pid = None
+_configure_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    CONTEXT_FIELDS = ('request_id', 'route', 'method', 'user_id', 'status', 'latency_ms', 'suppressed')
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in self.CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach request id, route and user id (runs on the emitting thread)"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            if not hasattr(record, 'route'):
+                record.route = request.url_rule.rule if request.url_rule is not None else request.path
+            if not hasattr(record, 'user_id'):
+                try:
+                    record.user_id = get_jwt_identity()
+                except Exception:
+                    record.user_id = None
+        return True
+
+
+class ErrorRateLimitFilter(logging.Filter):
+    """Let through at most `limit` ERROR+ records per message template per window"""
+
+    def __init__(self, limit, window):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.ERROR or self.limit <= 0:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, suppressed = self._buckets.get(key, (now, 0, 0))
+            if now - window_start >= self.window:
+                window_start, count = now, 0
+            if count >= self.limit:
+                self._buckets[key] = (window_start, count, suppressed + 1)
+                return False
+            self._buckets[key] = (window_start, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _PreparedQueueHandler(QueueHandler):
+    """Merge args and render tracebacks before the record crosses threads"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        # Never block or spill to stderr when the listener falls behind
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Install the queue-based JSON logging on the root logger (once per process)"""
+    global _listener, _configured_pid
+    pid = os.getpid()
+    with _configure_lock:
+        if _configured_pid == pid:
+            return
+        _configured_pid = pid
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        queue_handler = _PreparedQueueHandler(log_queue)
+        queue_handler.addFilter(RequestContextFilter())
+        queue_handler.addFilter(ErrorRateLimitFilter(Config.LOG_ERROR_RATE_LIMIT, Config.LOG_ERROR_RATE_WINDOW))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(Config.LOG_LEVEL.upper())
+        for name, level in _parse_levels(Config.LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def init_request_logging(app):
+    """Assign request ids and write one access-log record per request"""
+    configure_logging()
+    access_logger = logging.getLogger('vpms.access')
+
+    @app.before_request
+    def _assign_request_id():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        g._log_start = time.perf_counter()
+
+    @app.after_request
+    def _log_request(response):
+        start = g.pop('_log_start', None)
+        response.headers[REQUEST_ID_HEADER] = g.get('request_id', '')
+        if start is not None:
+            access_logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+                'method': request.method,
+                'status': response.status_code,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 2)
+            })
+        return response
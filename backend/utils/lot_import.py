@@ -0,0 +1,239 @@
+"""
+Bulk import of parking lots and their spots from CSV
+
+The CSV is read row by row (never loaded whole) with the columns of
+POST /api/admin/parking-lots: prime_location_name, address, pin_code,
+price, number_of_spots and optionally max_stay_hours. Valid rows are
+written in chunks of IMPORT_CHUNK_SIZE lots, one transaction per chunk:
+one multi-row INSERT ... RETURNING for the lots (ids matched to rows by
+sort_by_parameter_order) and one executemany INSERT for all of their spots.
+Invalid rows, and lots already present with the same name and PIN code,
+are reported by line number and skipped, so an interrupted import can be
+run again with the same file. An error that stops the import part way
+through (an undecodable byte, a database failure) is raised as
+ImportAborted, carrying the summary of the chunks already committed.
+"""
+import csv
+import io
+import logging
+from datetime import datetime
+from sqlalchemy import insert, select, tuple_
+from config import Config
+from database import ParkingLot, ParkingSpot, db
+from extensions import redis_client
+
+logger = logging.getLogger(__name__)
+
+lots = ParkingLot.__table__
+spots = ParkingSpot.__table__
+
+REQUIRED_COLUMNS = ('prime_location_name', 'address', 'pin_code', 'price', 'number_of_spots')
+OPTIONAL_COLUMNS = ('max_stay_hours',)
+
+
+def parse_max_stay_hours(value):
+    """None/'' disables the limit; anything else must be a positive number"""
+    if value is None or value == '':
+        return None
+    hours = float(value)
+    if hours <= 0:
+        raise ValueError('max_stay_hours must be positive')
+    return hours
+
+
+def validate_row(row):
+    """Column values for one CSV row as a lots insert dict; raises ValueError listing the problems"""
+    values = {name: (row.get(name) or '').strip() for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+    problems = [f'{name} is required' for name in REQUIRED_COLUMNS if not values[name]]
+    if len(values['prime_location_name']) > lots.c.prime_location_name.type.length:
+        problems.append('prime_location_name is too long')
+    if len(values['pin_code']) > lots.c.pin_code.type.length:
+        problems.append('pin_code is too long')
+    try:
+        price = float(values['price'] or 0)
+        if price < 0:
+            raise ValueError
+    except ValueError:
+        problems.append('price must be a non-negative number')
+    try:
+        number_of_spots = int(values['number_of_spots'] or 1)
+        if not 0 < number_of_spots <= Config.IMPORT_MAX_SPOTS_PER_LOT:
+            raise ValueError
+    except ValueError:
+        problems.append(f'number_of_spots must be an integer from 1 to {Config.IMPORT_MAX_SPOTS_PER_LOT}')
+    try:
+        max_stay_hours = parse_max_stay_hours(values['max_stay_hours'])
+    except ValueError:
+        problems.append('max_stay_hours must be a positive number or empty')
+    if problems:
+        raise ValueError('; '.join(problems))
+    return {
+        'prime_location_name': values['prime_location_name'],
+        'address': values['address'],
+        'pin_code': values['pin_code'],
+        'price': price,
+        'number_of_spots': number_of_spots,
+        'max_stay_hours': max_stay_hours
+    }
+
+
+class ImportSummary:
+    """Running totals of an import; errors beyond IMPORT_MAX_ERRORS are counted but not kept"""
+
+    def __init__(self):
+        self.rows = 0
+        self.lots_created = 0
+        self.spots_created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < Config.IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'lots_created': self.lots_created,
+            'spots_created': self.spots_created,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.error_count > len(self.errors)
+        }
+
+
+class ImportAborted(Exception):
+    """
+    An import stopped part way through; summary is the summary dict of what
+    earlier chunks committed, bad_input tells a faulty file from a failure
+    of our own
+    """
+
+    def __init__(self, error, summary):
+        super().__init__(str(error))
+        self.summary = summary
+        self.bad_input = isinstance(error, (ValueError, csv.Error))
+
+
+def _existing_lots(chunk):
+    keys = {(row['prime_location_name'], row['pin_code']) for _, row in chunk}
+    return set(db.session.execute(
+        select(lots.c.prime_location_name, lots.c.pin_code)
+        .where(tuple_(lots.c.prime_location_name, lots.c.pin_code).in_(keys))
+    ).all())
+
+
+def _write_chunk(chunk, summary):
+    """Insert one chunk of (line, values) pairs and their spots, then commit"""
+    existing = _existing_lots(chunk)
+    now = datetime.utcnow()
+    rows = []
+    for line, values in chunk:
+        key = (values['prime_location_name'], values['pin_code'])
+        if key in existing:
+            summary.add_error(line, 'a lot with this prime_location_name and pin_code already exists')
+            continue
+        existing.add(key)  # also rejects repeats later in the file
+        rows.append(dict(values, created_at=now, updated_at=now))
+    if not rows:
+        return
+    lot_ids = db.session.execute(
+        insert(lots).returning(lots.c.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    spot_rows = [
+        {'lot_id': lot_id, 'status': 'A', 'created_at': now}
+        for lot_id, row in zip(lot_ids, rows)
+        for _ in range(row['number_of_spots'])
+    ]
+    db.session.execute(insert(spots), spot_rows)
+    db.session.commit()
+    summary.lots_created += len(rows)
+    summary.spots_created += len(spot_rows)
+
+
+def import_lots(stream, chunk_size=None, progress=None):
+    """
+    Import lots from a text stream of CSV; progress(summary_dict) is called
+    after every chunk. Returns the summary dict; raises ValueError for a
+    header without the required columns and ImportAborted for a later error.
+    """
+    chunk_size = chunk_size or Config.IMPORT_CHUNK_SIZE
+    summary = ImportSummary()
+    reader = csv.DictReader(stream)
+    missing = [name for name in REQUIRED_COLUMNS if name not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f'CSV is missing columns: {", ".join(missing)}')
+
+    chunk = []
+    try:
+        for row in reader:
+            summary.rows += 1
+            try:
+                chunk.append((reader.line_num, validate_row(row)))
+            except ValueError as e:
+                summary.add_error(reader.line_num, str(e))
+            if len(chunk) >= chunk_size:
+                _write_chunk(chunk, summary)
+                chunk = []
+                if progress:
+                    progress(summary.to_dict())
+        if chunk:
+            _write_chunk(chunk, summary)
+    except Exception as e:
+        db.session.rollback()
+        raise ImportAborted(e, summary.to_dict()) from e
+    finally:
+        if summary.lots_created:
+            invalidate_lot_caches()
+
+    logger.info("Imported %d lots with %d spots from %d rows (%d errors)",
+                summary.lots_created, summary.spots_created, summary.rows, summary.error_count)
+    return summary.to_dict()
+
+
+def import_lots_file(path, chunk_size=None, progress=None):
+    """import_lots() for a CSV file on disk (UTF-8, with or without a BOM)"""
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        return import_lots(stream, chunk_size, progress)
+
+
+def text_stream(binary):
+    """Text view of an uploaded (binary) file for import_lots()"""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def invalidate_lot_caches():
+    """Drop the cached lot listings and dashboard stats after lots were created"""
+    try:
+        if redis_client:
+            redis_client.delete('admin_stats', 'all_parking_lots', 'available_lots')
+    except Exception:
+        pass
+
+
+def init_import_cli(app):
+    """Register `flask import-lots FILE`"""
+    import click
+
+    @app.cli.command('import-lots')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--chunk-size', type=int, default=None, help='Lots per transaction')
+    def import_lots_command(path, chunk_size):
+        """Import parking lots and their spots from a CSV file"""
+        def report(summary):
+            click.echo(f"{summary['rows']} rows read, {summary['lots_created']} lots created", err=True)
+
+        aborted = None
+        try:
+            summary = import_lots_file(path, chunk_size, report)
+        except ImportAborted as e:
+            aborted, summary = e, e.summary
+        for error in summary['errors']:
+            click.echo(f"line {error['line']}: {error['error']}", err=True)
+        click.echo(f"Created {summary['lots_created']} lots and {summary['spots_created']} spots "
+                   f"from {summary['rows']} rows; {summary['error_count']} rows rejected")
+        if aborted:
+            click.echo(f"Import stopped: {aborted}", err=True)
+        if aborted or summary['error_count']:
+            raise SystemExit(1)
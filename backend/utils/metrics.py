@@ -0,0 +1,320 @@
+"""
+Lightweight Prometheus-style metrics
+
+Counters, gauges and histograms are kept in plain per-process dicts, so
+recording a sample is a lock plus a dict update. Each process (web worker or
+Celery worker) periodically pushes a snapshot to Redis; GET /metrics merges the
+snapshots of all live processes and renders the Prometheus text format, so
+multi-worker deployments aggregate correctly.
+"""
+import bisect
+import json
+import os
+import socket
+import threading
+import time
+from flask import g, request, Response
+from config import Config
+from extensions import redis_client, REDIS_AVAILABLE
+
+SNAPSHOT_KEY_PREFIX = 'metrics:proc:'
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DEFAULT_TASK_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(labels), value] for labels, value in self._values.items()]
+        return {
+            'type': self.type_name,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'samples': samples
+        }
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, +Inf last, then sum and count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(labels), [list(state[0]), state[1], state[2]]]
+                       for labels, state in self._values.items()]
+        data = super().snapshot()
+        data['samples'] = samples
+        data['buckets'] = list(self.buckets)
+        return data
+
+
+class Registry:
+    """Holds this process's metrics and syncs snapshots through Redis"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._pusher_pid = None
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    # ----------------- cross-process sync -----------------
+    @property
+    def process_key(self):
+        return f'{SNAPSHOT_KEY_PREFIX}{socket.gethostname()}:{os.getpid()}'
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {'ts': time.time(), 'metrics': {m.name: m.snapshot() for m in metrics}}
+
+    def push(self):
+        if not REDIS_AVAILABLE or not redis_client:
+            return
+        try:
+            redis_client.setex(self.process_key, Config.METRICS_SNAPSHOT_TTL, json.dumps(self.snapshot()))
+        except Exception:
+            pass
+
+    def ensure_pusher(self):
+        """Start the snapshot thread once per process (cheap pid check, fork-safe)"""
+        pid = os.getpid()
+        if self._pusher_pid == pid:
+            return
+        with self._lock:
+            if self._pusher_pid == pid:
+                return
+            self._pusher_pid = pid
+        if REDIS_AVAILABLE and redis_client:
+            threading.Thread(target=self._push_loop, name='metrics-pusher', daemon=True).start()
+
+    def _push_loop(self):
+        while True:
+            time.sleep(Config.METRICS_PUSH_INTERVAL)
+            self.push()
+
+    def collect(self):
+        """Merged snapshot of every live process (or just this one without Redis)"""
+        own = self.snapshot()
+        snapshots = [own]
+        if REDIS_AVAILABLE and redis_client:
+            self.push()
+            try:
+                keys = [k for k in redis_client.scan_iter(match=f'{SNAPSHOT_KEY_PREFIX}*', count=500)
+                        if k != self.process_key]
+                if keys:
+                    snapshots.extend(json.loads(raw) for raw in redis_client.mget(keys) if raw)
+            except Exception:
+                pass
+        return merge_snapshots(snapshots, stale_after=Config.METRICS_PUSH_INTERVAL * 3)
+
+
+def merge_snapshots(snapshots, stale_after=None):
+    """Sum samples across process snapshots (gauges from stale processes are skipped)"""
+    now = time.time()
+    merged = {}
+    for snap in snapshots:
+        stale = stale_after is not None and now - snap.get('ts', now) > stale_after
+        for name, data in snap['metrics'].items():
+            if stale and data['type'] == 'gauge':
+                continue
+            target = merged.setdefault(name, {
+                'type': data['type'], 'help': data['help'], 'labelnames': data['labelnames'],
+                'buckets': data.get('buckets'), 'samples': {}
+            })
+            samples = target['samples']
+            for labels, value in data['samples']:
+                labels = tuple(labels)
+                if data['type'] == 'histogram':
+                    current = samples.get(labels)
+                    if current is None or len(current[0]) != len(value[0]):
+                        samples[labels] = [list(value[0]), value[1], value[2]]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], value[0])]
+                        current[1] += value[1]
+                        current[2] += value[2]
+                else:
+                    samples[labels] = samples.get(labels, 0) + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_str(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_prometheus(merged):
+    """Render merged metrics in the Prometheus text exposition format"""
+    lines = []
+    for name in sorted(merged):
+        data = merged[name]
+        lines.append(f'# HELP {name} {data["help"]}')
+        lines.append(f'# TYPE {name} {data["type"]}')
+        names = data['labelnames']
+        for labels, value in sorted(data['samples'].items()):
+            if data['type'] == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(data['buckets'] + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    le = f'le="{bound}"'
+                    lines.append(f'{name}_bucket{_label_str(names, labels, le)} {cumulative}')
+                lines.append(f'{name}_sum{_label_str(names, labels)} {total}')
+                lines.append(f'{name}_count{_label_str(names, labels)} {count}')
+            else:
+                lines.append(f'{name}{_label_str(names, labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def histogram_quantile(buckets, counts, quantile):
+    """Estimate a quantile from (non-cumulative) bucket counts, like PromQL does"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = quantile * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(list(buckets) + [None], counts):
+        if cumulative + count >= rank:
+            if bound is None:
+                return lower
+            fraction = (rank - cumulative) / count if count else 0
+            return lower + (bound - lower) * fraction
+        cumulative += count
+        lower = bound if bound is not None else lower
+    return lower
+
+
+registry = Registry()
+
+# ----------------- HTTP metrics -----------------
+HTTP_REQUEST_DURATION = registry.histogram(
+    'vpms_http_request_duration_seconds', 'HTTP request latency', ('method', 'route'))
+HTTP_REQUESTS_TOTAL = registry.counter(
+    'vpms_http_requests_total', 'HTTP requests by status', ('method', 'route', 'status'))
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    'vpms_http_requests_in_flight', 'HTTP requests currently being served')
+HTTP_REQUEST_SIZE = registry.histogram(
+    'vpms_http_request_size_bytes', 'HTTP request body size', ('method', 'route'), DEFAULT_SIZE_BUCKETS)
+HTTP_RESPONSE_SIZE = registry.histogram(
+    'vpms_http_response_size_bytes', 'HTTP response body size', ('method', 'route'), DEFAULT_SIZE_BUCKETS)
+
+# ----------------- Cache metrics -----------------
+CACHE_REQUESTS_TOTAL = registry.counter(
+    'vpms_cache_requests_total', 'Cache lookups by key family and result', ('family', 'result'))
+CACHE_VALUE_SIZE = registry.histogram(
+    'vpms_cache_value_size_bytes', 'Encoded size of values written to the cache', ('family',), DEFAULT_SIZE_BUCKETS)
+
+# ----------------- Celery metrics -----------------
+TASK_DURATION = registry.histogram(
+    'vpms_task_duration_seconds', 'Celery task run time', ('task', 'state'), DEFAULT_TASK_BUCKETS)
+
+
+def _route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else '<unmatched>'
+
+
+def init_metrics(app):
+    """Register request instrumentation and the /metrics endpoint"""
+
+    @app.before_request
+    def _metrics_before_request():
+        registry.ensure_pusher()
+        g._metrics_start = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _metrics_after_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        labels = (request.method, _route_label())
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, labels)
+        HTTP_REQUESTS_TOTAL.inc(labels + (str(response.status_code),))
+        if request.content_length:
+            HTTP_REQUEST_SIZE.observe(request.content_length, labels)
+        if not response.is_streamed:
+            HTTP_RESPONSE_SIZE.observe(response.calculate_content_length() or 0, labels)
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        # after_request was skipped (unhandled error); keep the gauge balanced
+        if g.pop('_metrics_start', None) is not None:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_prometheus(registry.collect()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
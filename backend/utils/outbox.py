@@ -0,0 +1,201 @@
+"""
+Transactional outbox for booking events
+
+Request handlers and the sweeper add a BookingEvent row in the same
+transaction as the reservation change and do nothing else. The relay
+publishes unpublished rows, in id order, to the Redis Stream
+OUTBOX_STREAM and then marks them published. Consumers read the stream
+through consumer groups (one group per consumer, e.g. cache invalidation)
+and XACK an entry only after handling it. Delivery is at-least-once: an
+event may be published twice if the relay dies between XADD and its
+commit, and an unacknowledged entry is claimed again after
+OUTBOX_CLAIM_IDLE_SECONDS, so handlers must be idempotent.
+"""
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, update
+from config import Config
+from database import BookingEvent, db
+from extensions import redis_client, REDIS_AVAILABLE
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+events = BookingEvent.__table__
+
+OUTBOX_EVENTS_TOTAL = registry.counter(
+    'vpms_outbox_events_total', 'Booking events by stage (published, or handled per consumer group)',
+    ('stage',))
+
+_consumers = {}
+
+
+# ----------------- WRITING -----------------
+
+def _event_row(event_type, reservation_id, user_id, lot_id=None, spot_id=None, **payload):
+    return {
+        'event_type': event_type,
+        'reservation_id': reservation_id,
+        'user_id': user_id,
+        'lot_id': lot_id,
+        'spot_id': spot_id,
+        'payload': json.dumps(payload, default=str) if payload else None,
+        'created_at': datetime.utcnow()
+    }
+
+
+def record_event(event_type, reservation, lot_id=None, **payload):
+    """Add an event for reservation to the current transaction (the caller commits)"""
+    db.session.add(BookingEvent(**_event_row(
+        event_type, reservation.id, reservation.user_id, lot_id, reservation.spot_id, **payload)))
+
+
+def record_events(rows):
+    """Insert many events at once; rows are dicts of _event_row's arguments"""
+    if rows:
+        db.session.execute(insert(events), [_event_row(**row) for row in rows])
+
+
+# ----------------- RELAY -----------------
+
+def _stream_fields(row):
+    fields = {
+        'event_id': row.id,
+        'type': row.event_type,
+        'reservation_id': row.reservation_id,
+        'user_id': row.user_id,
+        'created_at': row.created_at.isoformat()
+    }
+    for name in ('lot_id', 'spot_id', 'payload'):
+        value = getattr(row, name)
+        if value is not None:
+            fields[name] = value
+    return fields
+
+
+def publish_pending(batch_size=None):
+    """
+    Publish unpublished events to the stream in id order, one pipeline and
+    one UPDATE per batch; returns the number published
+    """
+    if not REDIS_AVAILABLE or not redis_client:
+        return 0
+    batch_size = batch_size or Config.OUTBOX_BATCH_SIZE
+    published = 0
+    while True:
+        rows = db.session.execute(
+            select(events).where(events.c.published_at.is_(None)).order_by(events.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        pipe = redis_client.pipeline(transaction=False)
+        for row in rows:
+            pipe.xadd(Config.OUTBOX_STREAM, _stream_fields(row),
+                      maxlen=Config.OUTBOX_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+        db.session.execute(
+            update(events).where(events.c.id.in_([row.id for row in rows])).values(published_at=datetime.utcnow())
+        )
+        db.session.commit()
+        published += len(rows)
+        OUTBOX_EVENTS_TOTAL.inc(('published',), len(rows))
+        if len(rows) < batch_size:
+            break
+    return published
+
+
+def purge_published(retention_hours=None):
+    """Delete published events older than the retention window"""
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours or Config.OUTBOX_RETENTION_HOURS)
+    result = db.session.execute(
+        delete(events).where(events.c.published_at.isnot(None), events.c.published_at < cutoff)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+# ----------------- CONSUMING -----------------
+
+def register_consumer(group, handler):
+    """
+    Register handler(events) for consumer group; events is a list of dicts
+    with the stream fields. Raising leaves the batch unacknowledged (retried).
+    """
+    _consumers[group] = handler
+    return handler
+
+
+def consumer_groups():
+    return sorted(_consumers)
+
+
+def consumer_name():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def _ensure_group(group):
+    try:
+        redis_client.xgroup_create(Config.OUTBOX_STREAM, group, id='0', mkstream=True)
+    except Exception as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def _decode_entries(entries):
+    decoded = []
+    for entry_id, fields in entries:
+        if not fields:  # trimmed from the stream while pending
+            continue
+        event = dict(fields)
+        for name in ('event_id', 'reservation_id', 'user_id', 'lot_id', 'spot_id'):
+            if name in event:
+                event[name] = int(event[name])
+        event['payload'] = json.loads(event['payload']) if event.get('payload') else {}
+        decoded.append((entry_id, event))
+    return decoded
+
+
+def _handle(group, handler, entries):
+    entry_ids = [entry_id for entry_id, _ in entries]
+    decoded = _decode_entries(entries)
+    if decoded:
+        handler([event for _, event in decoded])
+    if entry_ids:
+        redis_client.xack(Config.OUTBOX_STREAM, group, *entry_ids)
+    OUTBOX_EVENTS_TOTAL.inc((group,), len(decoded))
+    return len(decoded)
+
+
+def consume(group, batch_size=None, max_batches=None):
+    """
+    Handle new entries for group, after first claiming entries another
+    consumer left pending longer than OUTBOX_CLAIM_IDLE_SECONDS; returns the
+    number of events handled
+    """
+    if not REDIS_AVAILABLE or not redis_client:
+        return 0
+    handler = _consumers[group]
+    batch_size = batch_size or Config.OUTBOX_BATCH_SIZE
+    max_batches = max_batches or Config.OUTBOX_MAX_BATCHES
+    name = consumer_name()
+    _ensure_group(group)
+
+    handled = 0
+    _, claimed, *_ = redis_client.xautoclaim(
+        Config.OUTBOX_STREAM, group, name, Config.OUTBOX_CLAIM_IDLE_SECONDS * 1000, '0-0', count=batch_size)
+    if claimed:
+        logger.info("Consumer group %s reclaimed %d pending events", group, len(claimed))
+        handled += _handle(group, handler, claimed)
+
+    for _ in range(max_batches):
+        response = redis_client.xreadgroup(group, name, {Config.OUTBOX_STREAM: '>'}, count=batch_size)
+        if not response:
+            break
+        entries = response[0][1]
+        handled += _handle(group, handler, entries)
+        if len(entries) < batch_size:
+            break
+    return handled
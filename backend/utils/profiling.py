@@ -0,0 +1,182 @@
+"""
+On-demand request profiling
+
+A request is profiled when an admin adds ?__profile=1 (with a valid admin JWT)
+or when it is picked by PROFILE_SAMPLE_RATE. A background thread samples the
+request thread's stack every PROFILE_INTERVAL_MS and the result is saved in
+collapsed-stack format (one "frame;frame;frame count" line per stack), which
+speedscope and flamegraph.pl open directly. With PROFILING_ENABLED off no hooks
+are registered at all.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import g, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from config import Config
+
+PROFILE_QUERY_PARAM = '__profile'
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class SamplingProfiler:
+    """Samples one thread's call stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+        return label.replace(';', ':')
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common()) + '\n'
+
+
+def _profile_dir():
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    return Config.PROFILE_DIR
+
+
+def _requested_by_admin():
+    # ?__profile=0 or an empty value must not start the profiler
+    if request.args.get(PROFILE_QUERY_PARAM, '').lower() not in ('1', 'true'):
+        return False
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt().get('role') == 'admin'
+    except Exception:
+        return False
+
+
+def _save_profile(profiler, trigger):
+    """Write the collapsed stacks plus a small metadata file; prune old profiles"""
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    name = _SAFE_NAME.sub('_', f'{stamp}_{request.method}_{rule}').strip('_')
+    directory = _profile_dir()
+    with open(os.path.join(directory, f'{name}.collapsed'), 'w') as f:
+        f.write(profiler.collapsed())
+    meta = {
+        'id': name,
+        'method': request.method,
+        'path': request.path,
+        'route': rule,
+        'trigger': trigger,
+        'duration_ms': round(profiler.duration * 1000, 2),
+        'samples': profiler.samples,
+        'interval_ms': Config.PROFILE_INTERVAL_MS,
+        'created_at': datetime.utcnow().isoformat()
+    }
+    with open(os.path.join(directory, f'{name}.json'), 'w') as f:
+        json.dump(meta, f)
+    _prune(directory)
+    return name
+
+
+def _prune(directory):
+    metas = sorted(n for n in os.listdir(directory) if n.endswith('.json'))
+    for old in metas[:-Config.PROFILE_KEEP] if len(metas) > Config.PROFILE_KEEP else []:
+        base = old[:-len('.json')]
+        for suffix in ('.json', '.collapsed'):
+            try:
+                os.remove(os.path.join(directory, base + suffix))
+            except OSError:
+                pass
+
+
+def list_profiles(limit=50):
+    """Metadata of the most recent profiles, newest first"""
+    if not os.path.isdir(Config.PROFILE_DIR):
+        return []
+    names = sorted((n for n in os.listdir(Config.PROFILE_DIR) if n.endswith('.json')), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(Config.PROFILE_DIR, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_file(profile_id):
+    """Absolute path of a stored collapsed-stack file, or None"""
+    if _SAFE_NAME.search(profile_id):
+        return None
+    path = os.path.join(Config.PROFILE_DIR, f'{profile_id}.collapsed')
+    return path if os.path.isfile(path) else None
+
+
+def init_profiling(app):
+    """Register the profiling hooks (nothing is registered when disabled)"""
+    if not Config.PROFILING_ENABLED:
+        return
+
+    sample_rate = Config.PROFILE_SAMPLE_RATE
+
+    @app.before_request
+    def _maybe_start_profiler():
+        if sample_rate > 0 and random.random() < sample_rate:
+            trigger = 'sampled'
+        elif _requested_by_admin():
+            trigger = 'admin'
+        else:
+            return
+        profiler = SamplingProfiler(threading.get_ident(), Config.PROFILE_INTERVAL_MS / 1000.0)
+        profiler.start()
+        g._profiler = (profiler, trigger)
+
+    @app.after_request
+    def _finish_profiler(response):
+        active = g.pop('_profiler', None)
+        if active is None:
+            return response
+        profiler, trigger = active
+        profiler.stop()
+        try:
+            response.headers['X-Profile-Id'] = _save_profile(profiler, trigger)
+        except OSError as e:
+            app.logger.warning('Could not save request profile: %s', e)
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        active = g.pop('_profiler', None)
+        if active is not None:
+            active[0].stop()
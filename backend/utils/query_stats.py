@@ -0,0 +1,108 @@
+"""
+Per-request SQL query counting
+
+SQLAlchemy cursor events count statements and DB time for whatever collectors
+are active on the current thread: one per HTTP request (reported as a
+Server-Timing header and a debug log line) plus any opened by
+count_queries()/assert_max_queries(), which tests use to pin N+1 budgets, e.g.
+
+    with assert_max_queries(3):
+        client.get('/api/user/bookings', headers=headers)
+"""
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+
+class QueryCollector:
+    """Accumulates statement count and DB time"""
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = [] if keep_statements else None
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        if self.statements is not None:
+            self.statements.append(statement)
+
+
+def _collectors():
+    stack = getattr(_local, 'collectors', None)
+    if stack is None:
+        stack = _local.collectors = []
+    return stack
+
+
+@contextmanager
+def count_queries(keep_statements=True):
+    """Count the SQL statements executed on this thread inside the block"""
+    collector = QueryCollector(keep_statements=keep_statements)
+    stack = _collectors()
+    stack.append(collector)
+    try:
+        yield collector
+    finally:
+        stack.remove(collector)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """Fail if the block executes more than max_queries SQL statements"""
+    with count_queries() as collector:
+        yield collector
+    if collector.count > max_queries:
+        statements = '\n'.join(f'  {i + 1}. {s}' for i, s in enumerate(collector.statements))
+        raise AssertionError(
+            f'Expected at most {max_queries} queries, {collector.count} were executed:\n{statements}')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    for collector in getattr(_local, 'collectors', ()):
+        collector.record(statement, elapsed)
+
+
+def init_query_stats(app):
+    """Count queries per request; expose them via Server-Timing and debug logs"""
+
+    @app.before_request
+    def _start_query_collector():
+        collector = QueryCollector()
+        _collectors().append(collector)
+        g._query_collector = collector
+
+    @app.after_request
+    def _report_query_stats(response):
+        collector = g.get('_query_collector')
+        if collector is not None:
+            duration_ms = collector.duration * 1000
+            response.headers.add(
+                'Server-Timing', f'db;dur={duration_ms:.2f};desc="{collector.count} queries"')
+            app.logger.debug('%s %s: %d queries, %.2f ms DB time',
+                             request.method, request.path, collector.count, duration_ms)
+        return response
+
+    @app.teardown_request
+    def _stop_query_collector(exc):
+        collector = g.pop('_query_collector', None)
+        if collector is not None:
+            stack = _collectors()
+            if collector in stack:
+                stack.remove(collector)
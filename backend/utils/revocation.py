@@ -0,0 +1,150 @@
+"""
+JWT revocation (logout) with a local Bloom filter fast path
+
+Revoked token ids (jti) are written to Redis with a TTL equal to the token's
+remaining lifetime and announced over pub/sub. Every worker keeps an in-memory
+Bloom filter of revoked jtis, so the common "not revoked" answer needs no
+network call; only Bloom hits are confirmed against Redis.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from config import Config
+from extensions import redis_client, REDIS_AVAILABLE
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY_PREFIX = 'revoked_jti:'
+REVOCATION_CHANNEL = 'jwt_revocations'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on a blake2b digest)"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationStore:
+    """Per-process view of revoked tokens, kept in sync through Redis pub/sub"""
+
+    def __init__(self):
+        self._bloom = self._new_filter()
+        self._local = {}  # jti -> exp, used only when Redis is unavailable
+        self._lock = threading.Lock()
+        self._pid = None
+        self._rebuilt_at = 0.0
+
+    @staticmethod
+    def _new_filter():
+        return BloomFilter(Config.REVOCATION_BLOOM_CAPACITY, Config.REVOCATION_BLOOM_ERROR_RATE)
+
+    def _ensure_started(self):
+        """Seed the filter and start the subscriber once per process (fork-safe)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            if REDIS_AVAILABLE and redis_client:
+                self._rebuild()
+                thread = threading.Thread(target=self._listen, name='jwt-revocation-sync', daemon=True)
+                thread.start()
+
+    def _rebuild(self):
+        """Rebuild the filter from Redis, dropping jtis whose keys have expired"""
+        bloom = self._new_filter()
+        try:
+            for key in redis_client.scan_iter(match=f'{REVOKED_KEY_PREFIX}*', count=1000):
+                bloom.add(key[len(REVOKED_KEY_PREFIX):])
+        except Exception as e:
+            logger.warning("Could not seed revocation filter: %s", e)
+            bloom = self._bloom  # keep what we had rather than forgetting revocations
+        self._bloom = bloom
+        self._rebuilt_at = time.monotonic()
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REVOCATION_CHANNEL)
+                # Anything published while we were disconnected is picked up here
+                self._rebuild()
+                backoff = 1
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._bloom.add(message['data'])
+                    if time.monotonic() - self._rebuilt_at > Config.REVOCATION_BLOOM_REBUILD_SECONDS:
+                        self._rebuild()
+            except Exception as e:
+                logger.warning("Revocation subscriber disconnected: %s", e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def revoke(self, jti, expires_at):
+        """Revoke a token id until its expiry (unix timestamp)"""
+        self._ensure_started()
+        ttl = int(expires_at - time.time()) + 1
+        if ttl <= 0:
+            return
+        self._bloom.add(jti)
+        if REDIS_AVAILABLE and redis_client:
+            pipe = redis_client.pipeline()
+            pipe.set(f'{REVOKED_KEY_PREFIX}{jti}', 1, ex=ttl)
+            pipe.publish(REVOCATION_CHANNEL, jti)
+            pipe.execute()
+        else:
+            with self._lock:
+                self._local[jti] = expires_at
+
+    def is_revoked(self, jti):
+        self._ensure_started()
+        if jti not in self._bloom:
+            return False
+        if REDIS_AVAILABLE and redis_client:
+            try:
+                return bool(redis_client.exists(f'{REVOKED_KEY_PREFIX}{jti}'))
+            except Exception:
+                # Fail closed: a Bloom hit with Redis down is treated as revoked
+                return True
+        expires_at = self._local.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+
+revocation_store = RevocationStore()
+
+
+def revoke_token(jwt_payload):
+    """Revoke the token described by a decoded JWT payload"""
+    revocation_store.revoke(jwt_payload['jti'], jwt_payload.get('exp') or time.time())
+
+
+def is_token_revoked(jwt_payload):
+    """Check used by flask_jwt_extended's token_in_blocklist_loader"""
+    jti = jwt_payload.get('jti')
+    if not jti:
+        return False
+    return revocation_store.is_revoked(jti)
@@ -0,0 +1,204 @@
+"""
+Slow-query recorder
+
+Every statement is timed through SQLAlchemy cursor events and grouped by a
+normalized fingerprint (literals and IN-lists collapsed) with p50/p99 over a
+bounded window. Statements slower than SLOW_QUERY_THRESHOLD_MS are written to
+a rotating JSON-lines log together with their parameters, and the first
+offender of each fingerprint gets its EXPLAIN plan captured.
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler, QueueListener
+import queue
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+from utils.log import _PreparedQueueHandler
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:''|[^'])*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'\?|%s|%\(\w+\)s|:\w+')
+_IN_LISTS = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_VALUES_LISTS = re.compile(r'(VALUES\s*\([^)]*\))(?:\s*,\s*\([^)]*\))+', re.I)
+_WHITESPACE = re.compile(r'\s+')
+
+MAX_FINGERPRINTS = 1000
+WINDOW_SIZE = 1000
+MAX_SLOW_SAMPLES = 5
+
+_fingerprint_cache = {}
+_stats = {}
+_stats_lock = threading.Lock()
+_slow_log = None
+_slow_log_handler = None
+_slow_log_lock = threading.Lock()
+
+
+def fingerprint(statement):
+    """Normalize a statement so that queries differing only in literals group together"""
+    cached = _fingerprint_cache.get(statement)
+    if cached is not None:
+        return cached
+    fp = _COMMENTS.sub(' ', statement)
+    fp = _STRINGS.sub('?', fp)
+    fp = _NUMBERS.sub('?', fp)
+    fp = _PLACEHOLDERS.sub('?', fp)
+    fp = _IN_LISTS.sub('IN (...)', fp)
+    fp = _VALUES_LISTS.sub(r'\1, ...', fp)
+    fp = _WHITESPACE.sub(' ', fp).strip()
+    if len(_fingerprint_cache) < MAX_FINGERPRINTS * 10:
+        _fingerprint_cache[statement] = fp
+    return fp
+
+
+class FingerprintStats:
+    """Timing window and slow samples for one fingerprint"""
+
+    def __init__(self, fp):
+        self.fingerprint = fp
+        self.count = 0
+        self.slow_count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+        self.slow_samples = deque(maxlen=MAX_SLOW_SAMPLES)
+        self.plan = None
+
+    def percentile(self, q):
+        if not self.window:
+            return 0.0
+        ordered = sorted(self.window)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'count': self.count,
+            'slow_count': self.slow_count,
+            'total_ms': round(self.total * 1000, 2),
+            'max_ms': round(self.max * 1000, 2),
+            'p50_ms': round(self.percentile(0.50) * 1000, 2),
+            'p99_ms': round(self.percentile(0.99) * 1000, 2),
+            'plan': self.plan,
+            'slow_samples': list(self.slow_samples)
+        }
+
+
+def _get_slow_log():
+    global _slow_log, _slow_log_handler
+    if _slow_log is not None:
+        return _slow_log
+    with _slow_log_lock:
+        # Another thread may have set it up while we waited
+        if _slow_log is not None:
+            return _slow_log
+        logger = logging.getLogger('vpms.slow_queries')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if Config.SLOW_QUERY_LOG:
+            os.makedirs(os.path.dirname(os.path.abspath(Config.SLOW_QUERY_LOG)), exist_ok=True)
+            handler = RotatingFileHandler(Config.SLOW_QUERY_LOG, maxBytes=Config.SLOW_QUERY_LOG_MAX_BYTES,
+                                          backupCount=Config.SLOW_QUERY_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            # File writes happen on a listener thread, not the querying thread;
+            # when it falls behind, records are dropped and counted, never raised
+            log_queue = queue.Queue(maxsize=10000)
+            listener = QueueListener(log_queue, handler)
+            listener.start()
+            atexit.register(listener.stop)
+            _slow_log_handler = _PreparedQueueHandler(log_queue)
+            logger.addHandler(_slow_log_handler)
+        _slow_log = logger
+    return _slow_log
+
+
+def _explain(conn, cursor, statement, parameters):
+    """Capture the query plan on the same DBAPI connection (SELECTs only)"""
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(prefix + statement, parameters)
+        return [' | '.join(str(col) for col in row) for row in explain_cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        explain_cursor.close()
+
+
+def _safe_params(parameters):
+    try:
+        return json.loads(json.dumps(parameters, default=str))
+    except Exception:
+        return str(parameters)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('slow_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    fp = fingerprint(statement)
+    slow = elapsed * 1000 >= Config.SLOW_QUERY_THRESHOLD_MS
+    with _stats_lock:
+        stats = _stats.get(fp)
+        if stats is None:
+            if len(_stats) >= MAX_FINGERPRINTS:
+                return
+            stats = _stats[fp] = FingerprintStats(fp)
+        stats.count += 1
+        stats.total += elapsed
+        stats.window.append(elapsed)
+        if elapsed > stats.max:
+            stats.max = elapsed
+        if not slow:
+            return
+        stats.slow_count += 1
+        needs_plan = stats.plan is None and not executemany
+        if needs_plan:
+            stats.plan = []  # claim it so concurrent offenders don't all EXPLAIN
+    record = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'duration_ms': round(elapsed * 1000, 2),
+        'fingerprint': fp,
+        'statement': statement,
+        'parameters': _safe_params(parameters)
+    }
+    if needs_plan:
+        stats.plan = _explain(conn, cursor, statement, parameters)
+        record['plan'] = stats.plan
+    stats.slow_samples.append(record)
+    _get_slow_log().info(json.dumps(record))
+
+
+def get_slow_query_report(order_by='p99_ms', limit=50, slow_only=True):
+    """Per-fingerprint stats for this process, worst first"""
+    with _stats_lock:
+        rows = [s.to_dict() for s in _stats.values() if s.slow_count or not slow_only]
+    rows.sort(key=lambda r: r.get(order_by, 0), reverse=True)
+    return {
+        'threshold_ms': Config.SLOW_QUERY_THRESHOLD_MS,
+        'log_dropped': _slow_log_handler.dropped if _slow_log_handler else 0,
+        'fingerprints': rows[:limit]
+    }
+
+
+def reset_slow_query_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,179 @@
+"""
+Denormalized per-user booking counters
+
+users.total_bookings, active_booking_id, total_spent, month_bookings and
+month_key are updated with single atomic UPDATE statements inside the same
+transaction that books or releases a spot, so a user's stats are one
+primary-key read. reconcile_user_counters() recomputes them from the
+reservations and reservations_archive tables and repairs any rows that drifted (reservations deleted
+with their lot, writes made outside these helpers).
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import and_, bindparam, case, exists, func, select, update
+from database import Reservation, User, db
+from utils.archive import history_subquery
+
+logger = logging.getLogger(__name__)
+
+users = User.__table__
+reservations = Reservation.__table__
+
+COUNTER_COLUMNS = ('total_bookings', 'active_booking_id', 'total_spent', 'month_bookings', 'month_key')
+
+
+def month_key(when=None):
+    return (when or datetime.utcnow()).strftime('%Y-%m')
+
+
+def record_booking(user_id, reservation_id, when):
+    """Count a new active reservation (runs in the caller's transaction)"""
+    key = month_key(when)
+    db.session.execute(
+        update(users)
+        .where(users.c.id == user_id)
+        .values(
+            total_bookings=users.c.total_bookings + 1,
+            active_booking_id=reservation_id,
+            month_bookings=case((users.c.month_key == key, users.c.month_bookings + 1), else_=1),
+            month_key=key
+        )
+    )
+
+
+def record_release(user_id, reservation_id, cost):
+    """Add a closed reservation's cost and clear it as the active booking"""
+    db.session.execute(
+        update(users)
+        .where(users.c.id == user_id)
+        .values(
+            total_spent=users.c.total_spent + cost,
+            active_booking_id=case(
+                (users.c.active_booking_id == reservation_id, None),
+                else_=users.c.active_booking_id
+            )
+        )
+    )
+
+
+def record_releases(closed, leaving_timestamp):
+    """
+    record_release for a batch of {'uid', 'rid', 'cost'} dicts closed at
+    leaving_timestamp, as one executemany UPDATE. A row is only counted if
+    its reservation was really closed by that batch (leaving_timestamp
+    matches), so a session released concurrently is not counted twice.
+    """
+    if not closed:
+        return
+    db.session.execute(
+        update(users)
+        .where(
+            users.c.id == bindparam('uid'),
+            exists().where(
+                reservations.c.id == bindparam('rid'),
+                reservations.c.leaving_timestamp == leaving_timestamp
+            )
+        )
+        .values(
+            total_spent=users.c.total_spent + bindparam('cost'),
+            active_booking_id=case(
+                (users.c.active_booking_id == bindparam('rid'), None),
+                else_=users.c.active_booking_id
+            )
+        ),
+        closed
+    )
+
+
+def user_stats(user, now=None):
+    """Dashboard stats from the counters of one User row"""
+    current = user.month_key == month_key(now)
+    return {
+        'totalBookings': user.total_bookings or 0,
+        'activeBookings': 1 if user.active_booking_id else 0,
+        'totalSpent': round(user.total_spent or 0, 2),
+        'monthlyBookings': (user.month_bookings or 0) if current else 0
+    }
+
+
+def _actual_counters(start_id, end_id, now):
+    """Counters recomputed from active and archived reservations for users with start_id <= id < end_id"""
+    key = month_key(now)
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    history = history_subquery(lambda table: [table.c.user_id >= start_id, table.c.user_id < end_id])
+    rows = db.session.execute(
+        select(
+            users.c.id,
+            func.count(history.c.id),
+            func.max(case((and_(history.c.id.isnot(None), history.c.leaving_timestamp.is_(None)),
+                           history.c.id))),
+            func.coalesce(func.sum(history.c.parking_cost), 0),
+            func.coalesce(func.sum(case((history.c.parking_timestamp >= start_of_month, 1), else_=0)), 0)
+        )
+        .select_from(users.outerjoin(history, history.c.user_id == users.c.id))
+        .where(users.c.id >= start_id, users.c.id < end_id)
+        .group_by(users.c.id)
+    ).all()
+    return {
+        user_id: (total, active_id, round(spent, 2), month_count, key)
+        for user_id, total, active_id, spent, month_count in rows
+    }
+
+
+def _stored_counters(start_id, end_id):
+    rows = db.session.execute(
+        select(users.c.id, *(users.c[name] for name in COUNTER_COLUMNS))
+        .where(users.c.id >= start_id, users.c.id < end_id)
+    ).all()
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def _drifted(stored, actual):
+    total, active_id, spent, month_count, key = stored
+    a_total, a_active_id, a_spent, a_month_count, a_key = actual
+    if (total, active_id) != (a_total, a_active_id) or abs((spent or 0) - a_spent) > 0.005:
+        return True
+    # An old month_key with no bookings this month is equivalent to a zero count
+    month_count = month_count if key == a_key else 0
+    return month_count != a_month_count
+
+
+def reconcile_user_counters(batch_size=1000, now=None):
+    """
+    Compare every user's counters with their reservation history in id ranges of
+    batch_size and rewrite the ones that differ; returns a summary dict
+    """
+    now = now or datetime.utcnow()
+    low, high = db.session.query(func.min(User.id), func.max(User.id)).one()
+    checked = repaired = 0
+    if low is not None:
+        for start in range(low, high + 1, batch_size):
+            end = start + batch_size
+            # Stored values first: a booking committed in between then shows up
+            # in the recomputed values too, or fails the guard below
+            stored = _stored_counters(start, end)
+            actual = _actual_counters(start, end, now)
+            fixes = []
+            for user_id, counters in actual.items():
+                if user_id in stored and _drifted(stored[user_id], counters):
+                    fix = {f'new_{name}': value for name, value in zip(COUNTER_COLUMNS, counters)}
+                    fix.update(uid=user_id, seen_total=stored[user_id][0], seen_spent=stored[user_id][2])
+                    fixes.append(fix)
+            if fixes:
+                # Skip users whose counters changed since they were read (the next run catches them)
+                result = db.session.execute(
+                    update(users)
+                    .where(
+                        users.c.id == bindparam('uid'),
+                        users.c.total_bookings == bindparam('seen_total'),
+                        users.c.total_spent == bindparam('seen_spent')
+                    )
+                    .values({name: bindparam(f'new_{name}') for name in COUNTER_COLUMNS}),
+                    fixes
+                )
+                repaired += result.rowcount
+            db.session.commit()
+            checked += len(actual)
+    if repaired:
+        logger.warning("Repaired drifted booking counters for %d of %d users", repaired, checked)
+    return {'checked': checked, 'repaired': repaired}
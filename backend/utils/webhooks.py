@@ -0,0 +1,158 @@
+"""
+Webhook delivery
+
+Posts JSON messages (Google Chat reminders) through one pooled
+requests.Session per process, with bounded concurrency from a thread pool.
+429 and 5xx responses, timeouts and connection errors are retried with
+exponential backoff and jitter, honouring Retry-After. In digest mode several
+messages are merged into one post, which keeps large runs under the
+endpoint's rate limit.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SEPARATOR = '\n\n―――――\n\n'
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+WEBHOOK_REQUESTS_TOTAL = registry.counter(
+    'vpms_webhook_requests_total', 'Webhook HTTP attempts by outcome', ('outcome',))
+WEBHOOK_DELIVERY_DURATION = registry.histogram(
+    'vpms_webhook_delivery_seconds', 'Webhook delivery time including retries')
+
+
+class WebhookClient:
+    """Pooled, retrying poster for a single webhook URL"""
+
+    def __init__(self, url, max_workers=None, timeout=None, max_retries=None,
+                 backoff_base=None, backoff_max=None):
+        self.url = url
+        self.max_workers = max_workers or Config.WEBHOOK_MAX_WORKERS
+        self.timeout = timeout or Config.WEBHOOK_TIMEOUT
+        self.max_retries = Config.WEBHOOK_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = backoff_base or Config.WEBHOOK_BACKOFF_BASE
+        self.backoff_max = backoff_max or Config.WEBHOOK_BACKOFF_MAX
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='webhook')
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass  # HTTP-date form; fall back to backoff
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def post(self, payload):
+        """POST one JSON payload, retrying transient failures; returns True on 2xx"""
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                response = None
+                try:
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                    if response.status_code < 300:
+                        WEBHOOK_REQUESTS_TOTAL.inc(('ok',))
+                        return True
+                    if response.status_code not in RETRYABLE_STATUSES:
+                        WEBHOOK_REQUESTS_TOTAL.inc(('rejected',))
+                        logger.error("Webhook rejected message: HTTP %s", response.status_code)
+                        return False
+                    WEBHOOK_REQUESTS_TOTAL.inc(('retryable',))
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    WEBHOOK_REQUESTS_TOTAL.inc(('error',))
+                    logger.warning("Webhook request failed: %s", e)
+                if attempt < self.max_retries:
+                    time.sleep(self._retry_delay(attempt, response))
+            logger.error("Webhook delivery gave up after %d attempts", self.max_retries + 1)
+            return False
+        finally:
+            WEBHOOK_DELIVERY_DURATION.observe(time.perf_counter() - start)
+
+    def post_many(self, payloads):
+        """POST payloads concurrently; returns a list of booleans in input order"""
+        return list(self._executor.map(self.post, payloads))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+def build_digests(messages, digest_size=None, max_chars=None):
+    """
+    Group (key, text) messages into digests of at most digest_size messages
+    and max_chars characters; returns a list of (keys, text)
+    """
+    digest_size = digest_size or Config.WEBHOOK_DIGEST_SIZE
+    max_chars = max_chars or Config.WEBHOOK_DIGEST_MAX_CHARS
+    digests = []
+    keys, texts, length = [], [], 0
+    for key, text in messages:
+        added = len(text) + (len(DIGEST_SEPARATOR) if texts else 0)
+        if texts and (len(texts) >= digest_size or length + added > max_chars):
+            digests.append((keys, DIGEST_SEPARATOR.join(texts)))
+            keys, texts, length = [], [], 0
+            added = len(text)
+        keys.append(key)
+        texts.append(text)
+        length += added
+    if texts:
+        digests.append((keys, DIGEST_SEPARATOR.join(texts)))
+    return digests
+
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_webhook_client(url):
+    """Shared client for url, created lazily (once per process, fork-safe)"""
+    global _clients_pid
+    pid = os.getpid()
+    with _clients_lock:
+        if _clients_pid != pid:
+            _clients.clear()
+            _clients_pid = pid
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = WebhookClient(url)
+        return client
+
+
+def deliver_messages(url, messages, digest=None):
+    """
+    Deliver (key, text) messages to a Google Chat style webhook ({'text': ...}).
+    With digest mode (WEBHOOK_DIGEST_SIZE > 1) messages are merged into
+    batched posts. Returns the keys whose message was delivered.
+    """
+    if not messages:
+        return []
+    client = get_webhook_client(url)
+    if digest is None:
+        digest = Config.WEBHOOK_DIGEST_SIZE > 1
+    if digest:
+        groups = build_digests(messages)
+    else:
+        groups = [([key], text) for key, text in messages]
+    results = client.post_many([{'text': text} for _, text in groups])
+    delivered = []
+    for (keys, _), ok in zip(groups, results):
+        if ok:
+            delivered.extend(keys)
+    return delivered
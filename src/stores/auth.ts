@@ -48,6 +48,10 @@ export const useAuthStore = defineStore('auth', () => {
   }
 
   const logout = () => {
+    if (token.value) {
+      // Revoke the token server-side; local state is cleared regardless
+      api.post('/logout', null, { headers: { Authorization: `Bearer ${token.value}` } }).catch(() => {})
+    }
     token.value = null
     role.value = null
     user.value = null